@@ -0,0 +1,579 @@
+"""
+Benchmark suite for the Excel to MySQL pipeline.
+
+Generates synthetic workbooks, times every pipeline stage and the full
+sync against a local MySQL server and writes the results as JSON:
+
+    docker compose up -d mysql
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --output before.json
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --output after.json \
+        --compare before.json
+
+The header-only stages are also timed on a workbook of about
+--target-mb megabytes and must finish within --target-seconds.
+
+Each stage runs in a fresh process so peak RSS is measured per stage and
+no in-process cache carries over between stages. Sync stages are skipped
+when the MySQL server cannot be reached.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+DATA_DIR = os.path.join(tempfile.gettempdir(), 'xls2mysql_bench')
+DEFAULT_SIZES = [1000, 10000, 100000]
+# .xls sheets cannot hold more rows than this
+XLS_MAX_ROWS = 65535
+
+# One column of each generated type; wide workbooks repeat the group
+_COLUMN_TYPES = [
+    ('int', 'INT'),
+    ('float', 'DOUBLE'),
+    ('text', 'VARCHAR(32)'),
+    ('date', 'DATETIME'),
+    ('flag', 'TINYINT(1)'),
+]
+_WIDTHS = {'narrow': 1, 'wide': 8}
+_WORDS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf',
+          'hotel', 'india', 'juliet', 'kilo', 'lima', 'mike', 'november']
+
+STAGES = ['count', 'validate', 'columns', 'preview', 'read', 'prepare',
+          'prepare_loop', 'infer']
+# Stages that read only the header and first rows, so their latency must
+# not grow with the workbook
+TARGET_STAGES = ['validate', 'columns', 'preview']
+DEFAULT_TARGET_MB = 50
+DEFAULT_TARGET_SECONDS = 1.0
+SYNC_STAGES = {
+    # stage: (prefill the table first, perform_sync options)
+    'sync_insert': (False, {}),
+    'sync_bulk_load': (False, {'bulk_load': True}),
+    'sync_upsert': (True, {}),
+    'sync_upsert_pipelined': (True, {'pipeline': True}),
+    'sync_staging_merge': (True, {'staging_merge': True}),
+    'sync_parallel': (True, {'concurrency': 4}),
+    'sync_incremental': (True, {'incremental': True}),
+}
+
+
+def column_layout(width):
+    """Return [(name, kind, mysql type)] for a workbook variant."""
+    layout = [('id', 'id', 'BIGINT')]
+    for group in range(_WIDTHS[width]):
+        for kind, db_type in _COLUMN_TYPES:
+            layout.append((f"{kind}_{group}", kind, db_type))
+    return layout
+
+
+def _generate_rows(rows, layout, seed):
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    for row_id in range(1, rows + 1):
+        values = []
+        for _, kind, _ in layout:
+            if kind == 'id':
+                values.append(row_id)
+            elif rng.random() < 0.05:
+                values.append(None)
+            elif kind == 'int':
+                values.append(rng.randint(-100000, 100000))
+            elif kind == 'float':
+                values.append(round(rng.uniform(-1000, 1000), 4))
+            elif kind == 'text':
+                values.append(f"{rng.choice(_WORDS)}-{rng.randint(0, 9999)}")
+            elif kind == 'date':
+                values.append(start + timedelta(minutes=rng.randint(0, 10**6)))
+            else:
+                values.append(rng.random() < 0.5)
+        yield values
+
+
+def _add_dimension(path, rows, columns):
+    """
+    Record the sheet's used range the way Excel does. Write-only openpyxl
+    leaves it out, and without it openpyxl reads the whole sheet before
+    returning the first row, which real uploads do not pay for.
+    """
+    from openpyxl.utils import get_column_letter
+
+    ref = f"A1:{get_column_letter(columns)}{rows + 1}"
+    tmp_path = f"{path}.dimension"
+    with zipfile.ZipFile(path) as source, zipfile.ZipFile(
+            tmp_path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            with source.open(item) as src, target.open(item.filename,
+                                                       'w') as dst:
+                if item.filename == 'xl/worksheets/sheet1.xml':
+                    head = src.read(4096)
+                    dst.write(head.replace(
+                        b'<sheetViews>',
+                        f'<dimension ref="{ref}" /><sheetViews>'.encode(), 1))
+                shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, path)
+
+
+def generate_workbook(rows, width, extension, seed=42):
+    """Create (or reuse) a deterministic synthetic workbook and return its path."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"bench_{width}_{rows}_{seed}.{extension}")
+    if os.path.exists(path):
+        return path
+
+    layout = column_layout(width)
+    header = [name for name, _, _ in layout]
+    partial = f"{path}.partial"
+    if extension == 'xlsx':
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(header)
+        for values in _generate_rows(rows, layout, seed):
+            sheet.append(values)
+        workbook.save(partial)
+        _add_dimension(partial, rows, len(layout))
+    else:
+        import xlwt
+        workbook = xlwt.Workbook()
+        sheet = workbook.add_sheet('Sheet1')
+        date_style = xlwt.easyxf(num_format_str='YYYY-MM-DD HH:MM:SS')
+        for col, name in enumerate(header):
+            sheet.write(0, col, name)
+        for row_idx, values in enumerate(_generate_rows(rows, layout, seed), 1):
+            for col, value in enumerate(values):
+                if isinstance(value, datetime):
+                    sheet.write(row_idx, col, value, date_style)
+                elif value is not None:
+                    sheet.write(row_idx, col, value)
+        workbook.save(partial)
+    os.replace(partial, path)
+    return path
+
+
+def rows_for_size(megabytes, width, extension='xlsx'):
+    """Estimate the row count that makes a generated workbook this large."""
+    probe_rows = 2000
+    probe = generate_workbook(probe_rows, width, extension)
+    per_row = os.path.getsize(probe) / probe_rows
+    return max(int(megabytes * 1024 * 1024 / per_row), probe_rows)
+
+
+def _fresh_table(db_config, table_name, layout):
+    from db_operations import get_pooled_connection, create_table
+
+    conn = get_pooled_connection(db_config)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS `{table_name}`")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    create_table(db_config, table_name,
+                 {name: db_type for name, _, db_type in layout}, 'id')
+
+
+def _run_once(stage, path, rows):
+    """Run one stage once and return (rows handled, extra details)."""
+    import excel_operations as excel
+    import db_operations as db
+
+    excel.clear_workbook_cache(path)
+    if stage == 'count':
+        return rows, {'counted': excel.count_workbook_rows(path)}
+    if stage == 'validate':
+        excel.validate_excel_file(path)
+        return rows, {}
+    if stage == 'columns':
+        excel.get_excel_columns(path)
+        return rows, {}
+    if stage == 'preview':
+        excel.get_excel_preview(path)
+        return rows, {}
+    if stage == 'read':
+        return sum(len(chunk) for chunk in excel.iter_workbook_chunks(
+            path, chunk_size=db.DEFAULT_BATCH_SIZE)), {}
+    if stage == 'infer':
+        excel.profile_columns(path, sample_size=10000)
+        return rows, {}
+    raise ValueError(f"Unknown stage {stage}")
+
+
+def _workbook_width(path):
+    return 'wide' if os.path.basename(path).startswith('bench_wide') else 'narrow'
+
+
+def _prepare_rows_loop(df):
+    """
+    The per-cell conversion perform_sync used before rows were prepared
+    column-wise, kept as the baseline of the 'prepare' stage.
+    """
+    rows = []
+    for _, row in df.iterrows():
+        row_dict = {}
+        row_values_debug = []
+        for k, v in row.items():
+            if pd.isna(v):
+                row_dict[k] = None
+                row_values_debug.append(f"{k}=NULL")
+            elif isinstance(v, (int, float)):
+                row_dict[k] = v
+                row_values_debug.append(f"{k}={v}")
+            else:
+                val_str = str(v)
+                if len(val_str) > 250:
+                    val_str = val_str[:250]
+                row_dict[k] = val_str
+                row_values_debug.append(f"{k}={val_str[:20]}...")
+        # The debug line was formatted for every row, logged or not
+        _ = f"Processing row: {', '.join(row_values_debug[:3])}..."
+        rows.append(tuple(row_dict.values()))
+    return rows
+
+
+def _run_prepare(path, repeat, loop=False):
+    """
+    Time row conversion alone, on chunks read beforehand: column-wise, or
+    with the old per-cell loop when loop is set.
+    """
+    import excel_operations as excel
+    import db_operations as db
+
+    layout = column_layout(_workbook_width(path))
+    column_types = {name: db_type.lower() for name, _, db_type in layout}
+    chunks = list(excel.iter_workbook_chunks(
+        path, chunk_size=db.DEFAULT_BATCH_SIZE))
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for chunk in chunks:
+            if loop:
+                _prepare_rows_loop(chunk)
+            else:
+                db._prepare_rows(chunk, column_types)
+        seconds.append(time.perf_counter() - start)
+    return seconds, sum(len(chunk) for chunk in chunks), {}
+
+
+def _run_sync(stage, path, repeat, db_config):
+    import db_operations as db
+
+    prefill, options = SYNC_STAGES[stage]
+    layout = column_layout(_workbook_width(path))
+    mapping = {name: name for name, _, _ in layout}
+    table_name = f"bench_{stage}"
+    seconds, batch_latencies, details = [], [], {}
+    rows = 0
+    for _ in range(repeat):
+        _fresh_table(db_config, table_name, layout)
+        if prefill:
+            db.perform_sync(db_config, path, table_name, mapping, 'id')
+            if options.get('incremental'):
+                # Record fingerprints so the measured run skips every row
+                db.perform_sync(db_config, path, table_name, mapping, 'id',
+                                incremental=True)
+
+        marks = []
+        start = time.perf_counter()
+        result = db.perform_sync(
+            db_config, path, table_name, mapping, 'id',
+            progress_callback=lambda _r, _n: marks.append(time.perf_counter()),
+            **options)
+        seconds.append(time.perf_counter() - start)
+        previous = start
+        for mark in marks:
+            batch_latencies.append(mark - previous)
+            previous = mark
+        rows = result['total_rows']
+        details = {
+            'inserted': result['inserted'],
+            'updated': result['updated'],
+            'unchanged': result.get('unchanged', 0),
+            'errors': result['errors'],
+            'metrics': result.get('metrics'),
+        }
+    details['batch_latency_ms'] = _percentiles(
+        [latency * 1000 for latency in batch_latencies])
+    return seconds, rows, details
+
+
+def _child(stage, path, rows, repeat, db_config, results):
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        if stage in ('prepare', 'prepare_loop'):
+            seconds, handled, details = _run_prepare(
+                path, repeat, loop=stage == 'prepare_loop')
+        elif stage in SYNC_STAGES:
+            seconds, handled, details = _run_sync(stage, path, repeat,
+                                                  db_config)
+        else:
+            seconds = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                handled, details = _run_once(stage, path, rows)
+                seconds.append(time.perf_counter() - start)
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            peak /= 1024
+        results.put({'seconds': seconds, 'rows': handled,
+                     'peak_rss_mb': round(peak / 1024, 1), **details})
+    except Exception as e:
+        results.put({'error': str(e)})
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    return {
+        'p50': round(float(np.percentile(values, 50)), 4),
+        'p95': round(float(np.percentile(values, 95)), 4),
+        'p99': round(float(np.percentile(values, 99)), 4),
+    }
+
+
+def run_stage(stage, path, rows, repeat, db_config):
+    """Run a stage in a fresh process and summarize its timings."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_child,
+                              args=(stage, path, rows, repeat, db_config,
+                                    results))
+    process.start()
+    outcome = results.get()
+    process.join()
+    if 'error' in outcome:
+        return outcome
+
+    seconds = outcome.pop('seconds')
+    median = float(np.median(seconds))
+    outcome.update({
+        'runs': len(seconds),
+        'seconds': [round(s, 4) for s in seconds],
+        'latency_seconds': _percentiles(seconds),
+        'rows_per_second': round(outcome['rows'] / median, 1) if median else None,
+    })
+    return outcome
+
+
+def _check_database(db_config):
+    from db_operations import test_connection
+    try:
+        test_connection(db_config)
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def _environment():
+    import pandas
+    import openpyxl
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                                capture_output=True, text=True,
+                                cwd=SRC_DIR).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'pandas': pandas.__version__,
+        'openpyxl': openpyxl.__version__,
+    }
+
+
+def _print_speedup(cases, workbook):
+    """Print how much faster column-wise preparation is than the old loop."""
+    medians = {
+        case['stage']: case['latency_seconds']['p50']
+        for case in cases
+        if case['workbook'] == workbook and case.get('latency_seconds')
+    }
+    if medians.get('prepare') and 'prepare_loop' in medians:
+        print(f"  prepare is {medians['prepare_loop'] / medians['prepare']:.1f}x "
+              f"faster than the per-row loop")
+
+
+def check_target(megabytes, budget, repeat, db_config):
+    """
+    Time the header-only stages on a workbook of about megabytes and
+    return (cases, stages over the budget).
+    """
+    rows = rows_for_size(megabytes, 'wide')
+    started = time.perf_counter()
+    path = generate_workbook(rows, 'wide', 'xlsx')
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print(f"{os.path.basename(path)} ({size_mb:.0f} MB): ready in "
+          f"{time.perf_counter() - started:.1f}s")
+
+    cases, misses = [], []
+    for stage in TARGET_STAGES:
+        outcome = run_stage(stage, path, rows, repeat, db_config)
+        case = {'workbook': os.path.basename(path), 'format': 'xlsx',
+                'width': 'wide', 'size': rows, 'size_mb': round(size_mb, 1),
+                'stage': stage, 'budget_seconds': budget, **outcome}
+        cases.append(case)
+        if 'latency_seconds' not in outcome:
+            print(f"  {stage:<20} {outcome.get('error')}")
+            misses.append(case)
+            continue
+        p50 = outcome['latency_seconds']['p50']
+        flag = '' if p50 <= budget else ' OVER BUDGET'
+        print(f"  {stage:<20} p50 {p50:.4f}s (budget {budget:.2f}s) "
+              f"peak {outcome['peak_rss_mb']} MB{flag}")
+        if flag:
+            misses.append(case)
+    return cases, misses
+
+
+def compare(results, baseline, threshold):
+    """Print median time changes against a baseline; return the regressions."""
+    base = {(c['workbook'], c['stage']): c for c in baseline['cases']}
+    regressions = []
+    print(f"\n{'workbook':<32} {'stage':<20} {'before':>10} {'after':>10} {'change':>8}")
+    for case in results['cases']:
+        before = base.get((case['workbook'], case['stage']))
+        if not before or not before.get('latency_seconds') or not case.get(
+                'latency_seconds'):
+            continue
+        old = before['latency_seconds']['p50']
+        new = case['latency_seconds']['p50']
+        change = (new - old) / old if old else 0.0
+        flag = ''
+        if change > threshold:
+            flag = ' REGRESSION'
+            regressions.append(case)
+        print(f"{case['workbook']:<32} {case['stage']:<20} {old:>10.4f} "
+              f"{new:>10.4f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='row counts to generate (e.g. 1000 10000 100000 1000000)')
+    parser.add_argument('--widths', nargs='+', default=list(_WIDTHS),
+                        choices=list(_WIDTHS))
+    parser.add_argument('--formats', nargs='+', default=['xlsx', 'xls'],
+                        choices=['xlsx', 'xls'])
+    parser.add_argument('--stages', nargs='+',
+                        default=STAGES + list(SYNC_STAGES),
+                        choices=STAGES + list(SYNC_STAGES))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per stage used for the latency percentiles')
+    parser.add_argument('--output', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'results',
+        f"{datetime.now():%Y%m%d-%H%M%S}.json"))
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='slowdown of the median reported as a regression')
+    parser.add_argument('--target-mb', type=float, default=DEFAULT_TARGET_MB,
+                        help='size of the workbook for the header-only '
+                        'latency target (0 to skip)')
+    parser.add_argument('--target-seconds', type=float,
+                        default=DEFAULT_TARGET_SECONDS,
+                        help='median latency allowed for '
+                        f"{', '.join(TARGET_STAGES)} on that workbook")
+    parser.add_argument('--host', default=os.environ.get('MYSQL_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int,
+                        default=int(os.environ.get('MYSQL_PORT', 3306)))
+    parser.add_argument('--user', default=os.environ.get('MYSQL_USER', 'excel_user'))
+    parser.add_argument('--password',
+                        default=os.environ.get('MYSQL_PASSWORD', 'excel_password'))
+    parser.add_argument('--database',
+                        default=os.environ.get('MYSQL_DATABASE', 'excel_sync_db'))
+    args = parser.parse_args()
+
+    db_config = {'host': args.host, 'port': args.port, 'user': args.user,
+                 'password': args.password, 'database': args.database}
+    stages = [s for s in args.stages if s not in SYNC_STAGES]
+    sync_stages = [s for s in args.stages if s in SYNC_STAGES]
+    db_error = _check_database(db_config) if sync_stages else None
+    if db_error:
+        print(f"MySQL unavailable, skipping sync stages: {db_error}")
+
+    formats = list(args.formats)
+    if 'xls' in formats:
+        try:
+            import xlwt  # noqa: F401
+        except ImportError:
+            print("xlwt is not installed, skipping .xls workbooks")
+            formats.remove('xls')
+
+    results = {'environment': _environment(), 'cases': []}
+    for extension in formats:
+        for width in args.widths:
+            for rows in args.sizes:
+                if extension == 'xls' and rows > XLS_MAX_ROWS:
+                    continue
+                started = time.perf_counter()
+                path = generate_workbook(rows, width, extension)
+                print(f"{os.path.basename(path)}: ready in "
+                      f"{time.perf_counter() - started:.1f}s")
+                for stage in stages + sync_stages:
+                    if stage in sync_stages and db_error:
+                        outcome = {'skipped': db_error}
+                    else:
+                        outcome = run_stage(stage, path, rows, args.repeat,
+                                            db_config)
+                    case = {'workbook': os.path.basename(path),
+                            'format': extension, 'width': width,
+                            'size': rows, 'stage': stage, **outcome}
+                    results['cases'].append(case)
+                    if 'latency_seconds' in outcome:
+                        print(f"  {stage:<20} p50 {outcome['latency_seconds']['p50']:.4f}s "
+                              f"{outcome['rows_per_second'] or 0:>12,.0f} rows/s "
+                              f"peak {outcome['peak_rss_mb']} MB")
+                    else:
+                        print(f"  {stage:<20} {outcome.get('error') or 'skipped'}")
+                _print_speedup(results['cases'], os.path.basename(path))
+
+    misses = []
+    if args.target_mb:
+        target_cases, misses = check_target(args.target_mb,
+                                            args.target_seconds, args.repeat,
+                                            db_config)
+        results['target'] = target_cases
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Results written to {args.output}")
+
+    status = 0
+    if misses:
+        print(f"{len(misses)} stage(s) missed the {args.target_seconds:.2f}s "
+              f"target on the {args.target_mb:.0f} MB workbook")
+        status = 1
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline by "
+                  f"more than {args.threshold:.0%}")
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,27 +1,39 @@
 import os
+import uuid
 import logging
 import tempfile
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify, send_file
 import mysql.connector
 from werkzeug.utils import secure_filename
 from db_operations import (
     get_connection, test_connection, get_tables, 
-    get_table_columns, create_table, perform_sync
+    get_table_columns, create_table, max_sync_writers
 )
 from excel_operations import (
-    get_excel_columns, validate_excel_file, 
-    get_excel_preview
+    get_excel_columns, validate_excel_file, get_sheet_names,
+    get_excel_preview, clear_workbook_cache, profile_columns
 )
+from job_operations import submit_sync_job, get_job, get_job_group
+from upload_operations import UploadError, create_upload, append_chunk, get_upload
+from metrics_operations import render_metrics
+from session_operations import init_session, session_artifact, drop_session_artifacts
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (DEBUG also logs every SQL statement built)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "a-very-secret-key")
+# Wizard state and what it derives from the upload stay on the server
+init_session(app)
 
-# Set max upload size to 16MB
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+# Set max upload size (the sync streams rows, so large sheets are fine).
+# The browser uploads in chunks; a single-request upload is the fallback
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 1024))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+
+# Rows examined when suggesting column types for a new table
+INFER_SAMPLE_ROWS = 10000
 
 # Create temp directory if it doesn't exist
 UPLOAD_FOLDER = tempfile.gettempdir()
@@ -95,12 +107,26 @@ def file_upload():
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
             filepath = os.path.join(UPLOAD_FOLDER, filename)
+            # Drop any parse cached for a previous upload with the same name
+            clear_workbook_cache(filepath)
             file.save(filepath)
             
-            # Validate Excel file
+            # Validate Excel file; the first sheet with data is selected
             try:
-                validate_excel_file(filepath)
+                sheet_names = get_sheet_names(filepath)
+                first_error = None
+                for sheet_name in sheet_names:
+                    try:
+                        validate_excel_file(filepath, sheet_name)
+                        break
+                    except Exception as e:
+                        first_error = first_error or e
+                else:
+                    raise first_error or Exception("Excel file has no sheets")
                 session['excel_file'] = filepath
+                session['sheet_names'] = sheet_names
+                session['sheet_name'] = sheet_name
+                session['sheet_plans'] = []
                 flash('File uploaded successfully!', 'success')
                 return redirect(url_for('table_selection'))
             except Exception as e:
@@ -110,7 +136,63 @@ def file_upload():
         else:
             flash('Allowed file types are xls and xlsx', 'danger')
             
-    return render_template('file_upload.html')
+    return render_template('file_upload.html', max_upload_mb=MAX_UPLOAD_MB)
+
+@app.route('/uploads', methods=['POST'])
+def create_upload_api():
+    if 'db_config' not in session:
+        return jsonify({'error': 'Database connection not configured'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    if not allowed_file(data.get('filename', '')):
+        return jsonify({'error': 'Allowed file types are xls and xlsx'}), 400
+    
+    try:
+        upload = create_upload(data.get('filename'), int(data.get('size') or 0),
+                               MAX_UPLOAD_MB * 1024 * 1024)
+        return jsonify(upload), 201
+    except (UploadError, ValueError) as e:
+        return jsonify({'error': str(e)}), getattr(e, 'status', 400)
+
+@app.route('/uploads/<upload_id>', methods=['GET', 'PATCH'])
+def upload_api(upload_id):
+    try:
+        if request.method == 'GET':
+            return jsonify(get_upload(upload_id))
+        
+        upload = append_chunk(upload_id,
+                              int(request.headers.get('Upload-Offset', -1)),
+                              request.stream,
+                              request.content_length,
+                              request.headers.get('Upload-Checksum'))
+        return jsonify(upload)
+    except UploadError as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), e.status
+    except ValueError:
+        return jsonify({'error': 'Invalid Upload-Offset header'}), 400
+
+@app.route('/uploads/<upload_id>/select')
+def select_upload(upload_id):
+    if 'db_config' not in session:
+        flash('Please configure database connection first', 'warning')
+        return redirect(url_for('connection'))
+    
+    try:
+        upload = get_upload(upload_id)
+    except UploadError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('file_upload'))
+    
+    if upload['status'] != 'ready':
+        flash(f"Invalid Excel file: {upload.get('error') or upload['status']}", 'danger')
+        return redirect(url_for('file_upload'))
+    
+    session['excel_file'] = upload['path']
+    session['sheet_names'] = upload['sheet_names']
+    session['sheet_name'] = upload['sheet_name']
+    session['sheet_plans'] = []
+    flash('File uploaded successfully!', 'success')
+    return redirect(url_for('table_selection'))
 
 @app.route('/table_selection', methods=['GET', 'POST'])
 def table_selection():
@@ -118,8 +200,18 @@ def table_selection():
         flash('Please upload an Excel file first', 'warning')
         return redirect(url_for('file_upload'))
         
-    excel_preview = get_excel_preview(session['excel_file'])
-    session['excel_columns'] = get_excel_columns(session['excel_file'])
+    # Each sheet is mapped on its own; ?sheet= switches the current one
+    sheet_names = session.get('sheet_names') or []
+    if request.args.get('sheet') in sheet_names:
+        session['sheet_name'] = request.args['sheet']
+    sheet_name = session.get('sheet_name')
+    
+    excel_preview = session_artifact(
+        'preview', lambda: get_excel_preview(session['excel_file'], sheet_name=sheet_name),
+        sheet_name)
+    session['excel_columns'] = session_artifact(
+        'columns', lambda: get_excel_columns(session['excel_file'], sheet_name),
+        sheet_name)
     
     if request.method == 'POST':
         action = request.form.get('action')
@@ -130,6 +222,8 @@ def table_selection():
                 flash('Please select a table', 'danger')
                 return redirect(request.url)
                 
+            # Choosing a table again reloads its structure
+            drop_session_artifacts('table_columns', table_name)
             session['table_name'] = table_name
             session['create_new'] = False
             
@@ -141,8 +235,8 @@ def table_selection():
                 flash('Please enter a table name', 'danger')
                 return redirect(request.url)
                 
-            # Check if table already exists
-            db_tables = get_tables(session['db_config'])
+            # Check if table already exists (bypassing the metadata cache)
+            db_tables = get_tables(session['db_config'], refresh=True)
             if table_name in db_tables:
                 flash(f'Table {table_name} already exists', 'danger')
                 return redirect(request.url)
@@ -157,7 +251,10 @@ def table_selection():
         return render_template('table_selection.html', 
                                tables=tables, 
                                excel_preview=excel_preview,
-                               excel_columns=session['excel_columns'])
+                               excel_columns=session['excel_columns'],
+                               sheet_names=sheet_names,
+                               sheet_name=sheet_name,
+                               sheet_plans=session.get('sheet_plans', []))
     except Exception as e:
         flash(f'Error getting database tables: {str(e)}', 'danger')
         logger.error(f"Error fetching database tables: {str(e)}")
@@ -173,6 +270,7 @@ def column_mapping():
     excel_columns = session['excel_columns']
     table_name = session['table_name']
     create_new = session.get('create_new', False)
+    sheet_name = session.get('sheet_name')
     
     if request.method == 'POST':
         column_mapping = {}
@@ -206,6 +304,17 @@ def column_mapping():
         
         logger.info(f"Row limit settings: enabled={limit_enabled}, limit={row_limit}")
         session['row_limit'] = row_limit
+        session['bulk_load'] = 'bulk_load' in request.form
+        session['staging_merge'] = 'staging_merge' in request.form
+        session['incremental'] = 'incremental' in request.form
+        session['pipeline'] = 'pipeline' in request.form
+        session['duplicates'] = 'first' if request.form.get('duplicates') == 'first' else 'last'
+        try:
+            session['concurrency'] = min(
+                max(int(request.form.get('concurrency') or 1), 1),
+                max_sync_writers())
+        except ValueError:
+            session['concurrency'] = 1
         
         if create_new:
             # Define column types for new table
@@ -219,19 +328,66 @@ def column_mapping():
                 
             session['column_types'] = column_types
         
+        # Remember this sheet's mapping; every planned sheet is synced together
+        plan = {
+            'sheet_name': sheet_name,
+            'table_name': table_name,
+            'create_new': create_new,
+            'column_mapping': column_mapping,
+            'column_types': session.get('column_types', {}) if create_new else {},
+            'primary_key': primary_key
+        }
+        session['sheet_plans'] = [
+            p for p in session.get('sheet_plans', [])
+            if p['sheet_name'] != sheet_name
+        ] + [plan]
+        
+        if request.args.get('next') == 'sheet':
+            # Continue with the next unmapped sheet in workbook order
+            planned = {p['sheet_name'] for p in session['sheet_plans']}
+            sheet_names = session.get('sheet_names', [])
+            position = sheet_names.index(sheet_name) if sheet_name in sheet_names else 0
+            remaining = [name for name in sheet_names[position + 1:] + sheet_names[:position]
+                         if name not in planned]
+            if remaining:
+                session['sheet_name'] = remaining[0]
+                flash(f"Sheet '{sheet_name}' is ready. Choose a table for sheet '{remaining[0]}'.", 'success')
+                return redirect(url_for('table_selection'))
+        
         return redirect(url_for('sync_data'))
     
     try:
         db_columns = []
+        column_profiles = {}
         if not create_new:
-            db_columns = get_table_columns(session['db_config'], table_name)
+            db_columns = session_artifact(
+                'table_columns', lambda: get_table_columns(session['db_config'], table_name),
+                table_name)
+        else:
+            # Suggest a type per column for the new table
+            try:
+                column_profiles = session_artifact(
+                    'profiles', lambda: profile_columns(session['excel_file'],
+                                                        sample_size=INFER_SAMPLE_ROWS,
+                                                        sheet_name=sheet_name),
+                    sheet_name)
+            except Exception as e:
+                logger.warning(f"Could not infer column types: {str(e)}")
             
         return render_template('column_mapping.html',
                               excel_columns=excel_columns,
                               db_columns=db_columns,
+                              column_profiles=column_profiles,
                               table_name=table_name,
                               create_new=create_new,
-                              excel_preview=get_excel_preview(session['excel_file']))
+                              sheet_name=sheet_name,
+                              sheet_names=session.get('sheet_names', []),
+                              sheet_plans=session.get('sheet_plans', []),
+                              max_concurrency=max_sync_writers(),
+                              excel_preview=session_artifact(
+                                  'preview', lambda: get_excel_preview(session['excel_file'],
+                                                                       sheet_name=sheet_name),
+                                  sheet_name))
     except Exception as e:
         flash(f'Error getting table structure: {str(e)}', 'danger')
         logger.error(f"Error fetching table structure: {str(e)}")
@@ -244,46 +400,127 @@ def sync_data():
         flash('Please map columns first', 'warning')
         return redirect(url_for('column_mapping'))
     
+    plans = session.get('sheet_plans') or [{
+        'sheet_name': session.get('sheet_name'),
+        'table_name': session['table_name'],
+        'create_new': session.get('create_new', False),
+        'column_mapping': session['column_mapping'],
+        'column_types': session.get('column_types', {}),
+        'primary_key': session.get('primary_key')
+    }]
+    
     try:
-        # Initialize variables
-        table_name = session['table_name']
-        create_new = session.get('create_new', False)
-        result = None
-        
-        if create_new:
-            # Create new table
-            column_mapping = session['column_mapping']
-            column_types = session.get('column_types', {})
-            primary_key = session.get('primary_key')
-            
-            # Create column definitions for new table
-            column_defs = {}
-            for excel_col, db_col in column_mapping.items():
-                column_defs[db_col] = column_types[excel_col]
-            
+        # Create new tables; sheets sharing a new table get the union of
+        # their columns, with the first sheet's primary key
+        new_tables = {}
+        for plan in plans:
+            if not plan['create_new']:
+                continue
+            column_defs, primary_key = new_tables.setdefault(
+                plan['table_name'], ({}, plan['primary_key']))
+            for excel_col, db_col in plan['column_mapping'].items():
+                column_defs.setdefault(db_col, plan['column_types'][excel_col])
+        for table_name, (column_defs, primary_key) in new_tables.items():
             create_table(session['db_config'], table_name, column_defs, primary_key)
+            drop_session_artifacts('table_columns', table_name)
             flash(f'Table {table_name} created successfully', 'success')
+        # Tables now exist, so a repeated sync must not create them again
+        for plan in plans:
+            plan['create_new'] = False
+        if session.get('sheet_plans'):
+            session['sheet_plans'] = plans
+        session['create_new'] = False
         
-        # Perform sync operation
+        # Run the syncs in the background, one job per sheet, and let the
+        # browser poll for them
         row_limit = session.get('row_limit')
-        logger.info(f"Starting data sync for table '{table_name}' with row limit: {row_limit}")
+        group_id = uuid.uuid4().hex if len(plans) > 1 else None
+        job_ids = []
+        for plan in plans:
+            logger.info(f"Starting data sync of sheet '{plan['sheet_name']}' into table '{plan['table_name']}' with row limit: {row_limit}")
+            job_ids.append(submit_sync_job(
+                session['db_config'],
+                session['excel_file'],
+                plan['table_name'],
+                plan['column_mapping'],
+                plan['primary_key'],
+                row_limit,
+                group_id=group_id,
+                bulk_load=session.get('bulk_load', False),
+                staging_merge=session.get('staging_merge', False),
+                concurrency=session.get('concurrency', 1),
+                pipeline=session.get('pipeline', False),
+                incremental=session.get('incremental', False),
+                duplicates=session.get('duplicates', 'last'),
+                sheet_name=plan['sheet_name']
+            ))
+        session['sync_job_id'] = job_ids[-1]
         
-        result = perform_sync(
-            session['db_config'],
-            session['excel_file'],
-            session['table_name'],
-            session['column_mapping'],
-            session.get('primary_key'),
-            row_limit
-        )
-        
-        return render_template('sync_results.html', result=result)
+        if group_id:
+            return redirect(url_for('sync_group_status', group_id=group_id))
+        return redirect(url_for('sync_status', job_id=job_ids[0]))
         
     except Exception as e:
         flash(f'Error during synchronization: {str(e)}', 'danger')
         logger.error(f"Sync error: {str(e)}")
         return redirect(url_for('column_mapping'))
 
+@app.route('/sync_status/<job_id>')
+def sync_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        flash('Sync job not found', 'danger')
+        return redirect(url_for('column_mapping'))
+    
+    if job['status'] == 'done':
+        return render_template('sync_results.html', result=job['result'], job=job)
+    
+    if job['status'] == 'failed':
+        flash(f"Error during synchronization: {job['error']}", 'danger')
+        return redirect(url_for('column_mapping'))
+    
+    return render_template('sync_progress.html', job=job)
+
+@app.route('/sync_status/<job_id>/rejects')
+def sync_rejects(job_id):
+    job = get_job(job_id)
+    reject_file = (job.get('result') or {}).get('reject_file') if job else None
+    if not reject_file or not os.path.exists(reject_file):
+        flash('No rejected rows to download', 'warning')
+        return redirect(url_for('sync_status', job_id=job_id))
+    
+    return send_file(reject_file, mimetype='text/csv', as_attachment=True,
+                     download_name=f"{job['table_name']}_rejected_rows.csv")
+
+@app.route('/jobs/<job_id>')
+def job_status_api(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/sync_group/<group_id>')
+def sync_group_status(group_id):
+    jobs = get_job_group(group_id)
+    if not jobs:
+        flash('Sync job not found', 'danger')
+        return redirect(url_for('column_mapping'))
+    
+    finished = all(job['status'] in ('done', 'failed') for job in jobs)
+    return render_template('sync_group.html', jobs=jobs, group_id=group_id,
+                           finished=finished)
+
+@app.route('/job_groups/<group_id>')
+def job_group_status_api(group_id):
+    jobs = get_job_group(group_id)
+    if not jobs:
+        return jsonify({'error': 'Job group not found'}), 404
+    return jsonify({'jobs': jobs})
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/get_table_columns', methods=['POST'])
 def get_table_columns_api():
     if 'db_config' not in session:
@@ -294,7 +531,9 @@ def get_table_columns_api():
         return jsonify({'error': 'Table name not provided'}), 400
         
     try:
-        columns = get_table_columns(session['db_config'], table_name)
+        columns = session_artifact(
+            'table_columns', lambda: get_table_columns(session['db_config'], table_name),
+            table_name)
         return jsonify({'columns': columns})
     except Exception as e:
         logger.error(f"Error fetching table columns: {str(e)}")
@@ -302,7 +541,7 @@ def get_table_columns_api():
 
 @app.errorhandler(413)
 def request_entity_too_large(error):
-    flash('File too large. Maximum size is 16MB.', 'danger')
+    flash(f'File too large. Maximum size is {MAX_UPLOAD_MB}MB.', 'danger')
     return redirect(url_for('file_upload'))
 
 if __name__ == '__main__':
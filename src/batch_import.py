@@ -0,0 +1,291 @@
+"""
+Headless batch importer: syncs one or many workbooks with a saved mapping.
+
+    python batch_import.py --spec regions.yaml /data/regions/*.xlsx
+    python batch_import.py --spec regions.json /data/regions --workers 4
+
+The spec (JSON, or YAML when PyYAML is installed) names the target of
+every sheet to import; target tables must already exist:
+
+    connection:                   # MYSQL_* environment variables otherwise
+      host: 127.0.0.1
+      user: excel_user
+      password_env: MYSQL_PASSWORD
+      database: excel_sync_db
+    files: /data/regions/*.xlsx   # used when no paths are given
+    options:                      # perform_sync options for every sheet
+      batch_size: 1000
+      incremental: true
+    sheets:
+      - sheet: Sales              # the first sheet when omitted
+        table: sales              # {file} is replaced by the file name stem
+        primary_key: order_id
+        columns:
+          Order ID: order_id
+          Amount: amount
+
+Files are synced in parallel by a process pool. --connections caps the
+database connections of all workers together; each worker gets at least
+two, so fewer workers run when connections are scarce. Exit status: 0 when every
+row was written, 1 when rows were rejected, 2 for usage or spec errors,
+3 when a file could not be synced.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+logger = logging.getLogger('batch_import')
+
+EXIT_OK = 0
+EXIT_ROW_ERRORS = 1
+EXIT_USAGE = 2
+EXIT_FILE_FAILED = 3
+
+EXCEL_EXTENSIONS = ('.xls', '.xlsx')
+
+# Smallest pool a worker is given: one connection for the sync, one more
+# for metadata lookups and a background writer
+CONNECTIONS_PER_WORKER = 2
+
+# perform_sync keyword options a spec may set
+SYNC_OPTIONS = ('row_limit', 'batch_size', 'bulk_load', 'staging_merge',
+                'concurrency', 'incremental', 'pipeline', 'duplicates')
+
+
+class SpecError(Exception):
+    """The mapping spec or the command line cannot be used."""
+
+
+def load_spec(path):
+    """Read and check a JSON or YAML mapping spec."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            if path.lower().endswith(('.yaml', '.yml')):
+                try:
+                    import yaml
+                except ImportError:
+                    raise SpecError(
+                        "YAML specs need PyYAML (pip install pyyaml)")
+                spec = yaml.safe_load(f)
+            else:
+                spec = json.load(f)
+    except (OSError, ValueError) as e:
+        raise SpecError(f"Cannot read spec {path}: {str(e)}")
+
+    if not isinstance(spec, dict) or not spec.get('sheets'):
+        raise SpecError("The spec must list at least one entry under 'sheets'")
+    unknown = set(spec.get('options') or {}) - set(SYNC_OPTIONS)
+    if unknown:
+        raise SpecError(f"Unknown options: {', '.join(sorted(unknown))}")
+    for target in spec['sheets']:
+        if not isinstance(target, dict) or not target.get(
+                'table') or not target.get('columns'):
+            raise SpecError("Every sheet needs a 'table' and 'columns'")
+    return spec
+
+
+def db_config_from(spec, args):
+    """Connection settings: command line, then spec, then environment."""
+    connection = spec.get('connection') or {}
+    password = connection.get('password')
+    if password is None and connection.get('password_env'):
+        password = os.environ.get(connection['password_env'], '')
+
+    def pick(name, env, default=None):
+        value = getattr(args, name)
+        if value is None:
+            value = connection.get(name)
+        if value is None:
+            value = os.environ.get(env, default)
+        return value
+
+    db_config = {
+        'host': pick('host', 'MYSQL_HOST', '127.0.0.1'),
+        'port': int(pick('port', 'MYSQL_PORT', 3306)),
+        'user': pick('user', 'MYSQL_USER'),
+        'password': (args.password if args.password is not None else
+                     password if password is not None else
+                     os.environ.get('MYSQL_PASSWORD', '')),
+        'database': pick('database', 'MYSQL_DATABASE'),
+    }
+    if not db_config['user'] or not db_config['database']:
+        raise SpecError("A database user and name are required")
+    return db_config
+
+
+def find_files(patterns):
+    """Expand files, directories and glob patterns to Excel workbooks."""
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name)
+                       for name in sorted(os.listdir(pattern))]
+        else:
+            matches = sorted(glob.glob(pattern)) or [pattern]
+        files.extend(path for path in matches
+                     if path.lower().endswith(EXCEL_EXTENSIONS)
+                     and os.path.isfile(path))
+    # A file named twice is synced once
+    return list(dict.fromkeys(os.path.abspath(path) for path in files))
+
+
+def _init_worker(pool_size, log_level):
+    """Give each worker process its share of the connection budget."""
+    logging.basicConfig(level=log_level)
+    import db_operations
+    db_operations.DB_POOL_SIZE = pool_size
+    # A worker syncs one sheet at a time, so its whole pool is that sync's
+    db_operations.SYNC_WORKERS = 1
+
+
+def sync_file(path, spec, db_config):
+    """Sync every sheet of the spec from one workbook; runs in a worker."""
+    from db_operations import perform_sync
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    options = spec.get('options') or {}
+    report = {'file': path, 'status': 'done', 'sheets': []}
+    started = time.perf_counter()
+    for target in spec['sheets']:
+        table_name = target['table'].format(file=stem)
+        sheet = {'sheet': target.get('sheet'), 'table': table_name}
+        try:
+            result = perform_sync(db_config, path, table_name,
+                                  target['columns'],
+                                  target.get('primary_key'),
+                                  sheet_name=target.get('sheet'),
+                                  **options)
+            sheet.update({
+                name: result.get(name, 0)
+                for name in ('total_rows', 'inserted', 'updated',
+                             'unchanged', 'duplicates', 'errors')
+            })
+            sheet['rows_per_second'] = result['metrics']['rows_per_second']
+            sheet['truncated'] = result.get('truncated', {})
+            sheet['error_codes'] = result.get('error_codes', {})
+            sheet['reject_file'] = result.get('reject_file')
+        except Exception as e:
+            logger.error(f"{path} [{table_name}]: {str(e)}")
+            sheet['error'] = str(e)
+            report['status'] = 'failed'
+        report['sheets'].append(sheet)
+
+    elapsed = time.perf_counter() - started
+    rows = sum(sheet.get('total_rows', 0) for sheet in report['sheets'])
+    report['rows'] = rows
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(rows / elapsed, 1) if elapsed else 0
+    return report
+
+
+def _print_report(report):
+    errors = sum(sheet.get('errors', 0) for sheet in report['sheets'])
+    print(f"{report['status']:<6} {report['rows']:>10} rows "
+          f"{report['elapsed_seconds']:>9.1f} s "
+          f"{report['rows_per_second']:>10.1f} rows/s "
+          f"{errors:>7} errors  {report['file']}")
+    for sheet in report['sheets']:
+        if 'error' in sheet:
+            print(f"       {sheet['table']}: {sheet['error']}")
+        elif sheet.get('reject_file'):
+            print(f"       {sheet['table']}: rejected rows in {sheet['reject_file']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0])
+    parser.add_argument('paths', nargs='*',
+                        help='workbooks, directories or glob patterns '
+                        '(default: the files entry of the spec)')
+    parser.add_argument('--spec', required=True,
+                        help='mapping spec (.json, .yaml or .yml)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='files synced at the same time')
+    parser.add_argument('--connections', type=int, default=8,
+                        help='database connections shared by all workers')
+    parser.add_argument('--report', help='write the per-file results as JSON')
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    parser.add_argument('--database')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log the progress of every sync')
+    args = parser.parse_args(argv)
+
+    log_level = logging.INFO if args.verbose else logging.WARNING
+    logging.basicConfig(level=log_level)
+
+    try:
+        if args.workers < 1:
+            raise SpecError("--workers must be positive")
+        if args.connections < CONNECTIONS_PER_WORKER:
+            raise SpecError(
+                f"--connections must be at least {CONNECTIONS_PER_WORKER}")
+        spec = load_spec(args.spec)
+        db_config = db_config_from(spec, args)
+        patterns = args.paths or ([spec['files']] if isinstance(
+            spec.get('files'), str) else spec.get('files') or [])
+        files = find_files(patterns)
+        if not files:
+            raise SpecError("No .xls or .xlsx files found")
+    except SpecError as e:
+        print(f"error: {str(e)}", file=sys.stderr)
+        return EXIT_USAGE
+
+    # Every worker gets at least CONNECTIONS_PER_WORKER connections;
+    # extra ones go to parallel writers
+    workers = min(args.workers, args.connections // CONNECTIONS_PER_WORKER,
+                  len(files))
+    pool_size = args.connections // workers
+    print(f"Syncing {len(files)} files with {workers} workers, "
+          f"{pool_size} connections each")
+
+    started = time.perf_counter()
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(pool_size, log_level)) as executor:
+        futures = {executor.submit(sync_file, path, spec, db_config): path
+                   for path in files}
+        for future in as_completed(futures):
+            try:
+                report = future.result()
+            except Exception as e:
+                # The worker process itself died
+                report = {'file': futures[future], 'status': 'failed',
+                          'rows': 0, 'elapsed_seconds': 0,
+                          'rows_per_second': 0,
+                          'sheets': [{'table': '-', 'error': str(e)}]}
+            reports.append(report)
+            _print_report(report)
+
+    elapsed = time.perf_counter() - started
+    rows = sum(report['rows'] for report in reports)
+    failed = [r for r in reports if r['status'] == 'failed']
+    row_errors = sum(sheet.get('errors', 0) for report in reports
+                     for sheet in report['sheets'])
+    print(f"{len(reports) - len(failed)} of {len(reports)} files synced, "
+          f"{rows} rows in {elapsed:.1f} s "
+          f"({rows / elapsed if elapsed else 0:.1f} rows/s), "
+          f"{row_errors} rows rejected")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'elapsed_seconds': round(elapsed, 3), 'rows': rows,
+                       'files': reports}, f, indent=2, default=str)
+
+    if failed:
+        return EXIT_FILE_FAILED
+    if row_errors:
+        return EXIT_ROW_ERRORS
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,43 @@
+import os
+import re
+import csv
+import sys
+import time
+import queue
+import hashlib
 import logging
+import tempfile
+import threading
+from datetime import datetime
 import mysql.connector
 from mysql.connector import errorcode
+import numpy as np
 import pandas as pd
+from excel_operations import (count_workbook_rows, iter_workbook_chunks,
+                              parse_boolean_strings, parse_date_strings)
+from metrics_operations import SyncMetrics, SampledLogger, record_sync, timed
 
 logger = logging.getLogger(__name__)
 
+# The only directory LOAD DATA LOCAL INFILE may read client files from
+BULK_LOAD_DIR = os.path.join(tempfile.gettempdir(), 'xls2mysql_bulk')
+
+# CSV files of the rows a sync could not write, for download
+REJECT_DIR = os.environ.get(
+    'REJECT_DIR', os.path.join(tempfile.gettempdir(), 'xls2mysql_rejects'))
+
 
 def get_connection(db_config):
     """Establish and return a MySQL database connection."""
     try:
-        connection = mysql.connector.connect(host=db_config['host'],
-                                             port=db_config['port'],
-                                             user=db_config['user'],
-                                             password=db_config['password'],
-                                             database=db_config['database'])
+        os.makedirs(BULK_LOAD_DIR, exist_ok=True)
+        connection = mysql.connector.connect(
+            host=db_config['host'],
+            port=db_config['port'],
+            user=db_config['user'],
+            password=db_config['password'],
+            database=db_config['database'],
+            allow_local_infile_in_path=BULK_LOAD_DIR)
         return connection
     except mysql.connector.Error as err:
         if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
@@ -26,88 +50,307 @@ def get_connection(db_config):
         raise Exception(f"Connection error: {str(e)}")
 
 
+# Connection pool limits, per distinct db_config. The default leaves each
+# of SYNC_WORKERS syncs its own connection and four parallel writers
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_IDLE_TIMEOUT = int(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300))
+# Idle connections older than this are pinged before being handed out
+DB_POOL_HEALTH_CHECK_AFTER = int(os.environ.get('DB_POOL_HEALTH_CHECK_AFTER', 30))
+
+# Number of syncs allowed to run at the same time in this process; each
+# one keeps its parallel writers within its share of the pool
+SYNC_WORKERS = int(os.environ.get('SYNC_WORKERS', 2))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class _PooledConnection:
+    """Connection wrapper whose close() hands the connection back to its pool."""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        if self._connection is not None:
+            self._pool.release(self._connection)
+            self._connection = None
+
+
+class _ConnectionPool:
+    """Bounded pool of connections for one db_config."""
+
+    def __init__(self, db_config, size):
+        self.db_config = dict(db_config)
+        self.size = size
+        self.idle = []  # (connection, returned_at), most recent last
+        self.in_use = 0
+        self.condition = threading.Condition()
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self, now):
+        expired = [c for c, t in self.idle if now - t > DB_POOL_IDLE_TIMEOUT]
+        self.idle = [(c, t) for c, t in self.idle
+                     if now - t <= DB_POOL_IDLE_TIMEOUT]
+        return expired
+
+    def acquire(self, block=True):
+        """
+        Hand out an idle or new connection, waiting up to DB_POOL_TIMEOUT
+        for one to be released. Without block, None is returned at once
+        when every connection is in use.
+        """
+        deadline = time.monotonic() + DB_POOL_TIMEOUT
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                expired = self._evict_idle(now)
+                candidate = None
+                if self.idle:
+                    candidate = self.idle.pop()
+                    self.in_use += 1
+                elif self.in_use < self.size:
+                    self.in_use += 1
+                elif not block:
+                    return None
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise Exception(
+                            "Timed out waiting for a free database connection")
+                    self.condition.wait(remaining)
+                    continue
+
+            for connection in expired:
+                self._discard(connection)
+
+            try:
+                if candidate is None:
+                    return get_connection(self.db_config)
+                connection, returned_at = candidate
+                if time.monotonic() - returned_at > DB_POOL_HEALTH_CHECK_AFTER:
+                    connection.ping(reconnect=False)
+                return connection
+            except Exception:
+                with self.condition:
+                    self.in_use -= 1
+                    self.condition.notify()
+                if candidate is None:
+                    raise
+                # Stale pooled connection: drop it and try again
+                self._discard(candidate[0])
+
+    def release(self, connection):
+        healthy = True
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            healthy = False
+
+        with self.condition:
+            self.in_use -= 1
+            if healthy:
+                self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+        if not healthy:
+            self._discard(connection)
+
+
+def _pool_key(db_config):
+    return (db_config['host'], db_config['port'], db_config['user'],
+            db_config['password'], db_config['database'])
+
+
+def get_pooled_connection(db_config, block=True):
+    """
+    Borrow a connection from the pool for this db_config.
+    Calling close() on the returned connection gives it back to the pool.
+    Without block, None is returned when the pool has no free connection.
+    """
+    key = _pool_key(db_config)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = _ConnectionPool(db_config, DB_POOL_SIZE)
+    connection = pool.acquire(block)
+    return _PooledConnection(pool, connection) if connection is not None else None
+
+
+def _borrow_free_connections(db_config, count):
+    """
+    Borrow up to count pooled connections without waiting for busy ones.
+    Returns the connections obtained, possibly none.
+    """
+    connections = []
+    try:
+        while len(connections) < count:
+            conn = get_pooled_connection(db_config, block=False)
+            if conn is None:
+                break
+            connections.append(conn)
+    except Exception as e:
+        logger.warning(f"Could not open another database connection: {str(e)}")
+    return connections
+
+
+def max_sync_writers():
+    """
+    Parallel writers one sync can get: its share of the pool when
+    SYNC_WORKERS syncs run at once, less the sync's own connection.
+    """
+    share = max(DB_POOL_SIZE // max(SYNC_WORKERS, 1), 1)
+    return max(share - 1, 1)
+
+
 def test_connection(db_config):
     """Test the database connection."""
-    conn = get_connection(db_config)
+    conn = get_pooled_connection(db_config)
     conn.close()
     return True
 
 
-def get_tables(db_config):
-    """Get a list of tables in the database."""
-    conn = get_connection(db_config)
+# Seconds a database's table and column listing is reused before reloading
+SCHEMA_CACHE_TTL = int(os.environ.get('SCHEMA_CACHE_TTL', 60))
+
+# (host, port, user, database) -> (loaded_at, {table: metadata})
+_schema_cache = {}
+_schema_cache_lock = threading.Lock()
+
+
+def _schema_key(db_config):
+    return (db_config['host'], db_config['port'], db_config['user'],
+            db_config['database'])
+
+
+def _load_schema(db_config):
+    """
+    Read the columns and primary keys of every table in the database with
+    a single INFORMATION_SCHEMA query.
+    Returns {table: {'columns': [...], 'primary_key': [...]}}.
+    """
+    conn = get_pooled_connection(db_config)
     cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, c.COLUMN_KEY,
+                   c.IS_NULLABLE, c.EXTRA, k.ORDINAL_POSITION
+            FROM INFORMATION_SCHEMA.COLUMNS c
+            LEFT JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE k
+              ON k.TABLE_SCHEMA = c.TABLE_SCHEMA
+             AND k.TABLE_NAME = c.TABLE_NAME
+             AND k.COLUMN_NAME = c.COLUMN_NAME
+             AND k.CONSTRAINT_NAME = 'PRIMARY'
+            WHERE c.TABLE_SCHEMA = %s
+            ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+        """, (db_config['database'], ))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    schema = {}
+    key_positions = {}
+    for (table, column, column_type, column_key, nullable, extra,
+         key_position) in rows:
+        entry = schema.setdefault(table, {'columns': [], 'primary_key': []})
+        entry['columns'].append({
+            'name': column,
+            'type': column_type,
+            'primary_key': column_key == 'PRI',
+            'nullable': nullable == 'YES',
+            'auto_increment': 'auto_increment' in (extra or '').lower()
+        })
+        if key_position is not None:
+            key_positions.setdefault(table, []).append((key_position, column))
+    for table, positions in key_positions.items():
+        schema[table]['primary_key'] = [column for _, column in sorted(positions)]
+    return schema
+
+
+def _get_schema(db_config, refresh=False):
+    """Return the cached schema of the database, reloading it when stale."""
+    key = _schema_key(db_config)
+    now = time.monotonic()
+    with _schema_cache_lock:
+        entry = _schema_cache.get(key)
+    if entry is not None and not refresh and now - entry[0] < SCHEMA_CACHE_TTL:
+        return entry[1]
+
+    schema = _load_schema(db_config)
+    with _schema_cache_lock:
+        _schema_cache[key] = (now, schema)
+    return schema
+
+
+def _get_table_schema(db_config, table_name):
+    """Cached metadata of one table; a miss reloads once in case it is new."""
+    table = _get_schema(db_config).get(table_name)
+    if table is None:
+        table = _get_schema(db_config, refresh=True).get(table_name)
+    if table is None:
+        raise Exception(f"Table '{table_name}' doesn't exist")
+    return table
 
+
+def invalidate_schema_cache(db_config=None):
+    """Forget cached table metadata for one database, or for all of them."""
+    with _schema_cache_lock:
+        if db_config is None:
+            _schema_cache.clear()
+        else:
+            _schema_cache.pop(_schema_key(db_config), None)
+
+
+def get_tables(db_config, refresh=False):
+    """
+    Get a list of tables in the database.
+    refresh bypasses the metadata cache, e.g. before checking that a name
+    is free.
+    """
     try:
-        cursor.execute("SHOW TABLES")
-        tables = [table[0] for table in cursor.fetchall()]
-        return tables
+        return [
+            table for table in _get_schema(db_config, refresh)
+            if table != FINGERPRINT_TABLE
+        ]
     except mysql.connector.Error as err:
         logger.error(f"Error fetching tables: {err}")
         raise Exception(f"Error fetching tables: {err}")
-    finally:
-        cursor.close()
-        conn.close()
 
 
 def get_table_columns(db_config, table_name):
     """Get columns and their details for a specified table."""
-    conn = get_connection(db_config)
-    cursor = conn.cursor(dictionary=True)
-
     try:
-        # Get column information
-        cursor.execute(f"DESCRIBE `{table_name}`")
-        columns = cursor.fetchall()
-
-        # Format the response
-        result = []
-        for col in columns:
-            result.append({
-                'name': col['Field'],
-                'type': col['Type'],
-                'primary_key': col['Key'] == 'PRI',
-                'nullable': col['Null'] == 'YES'
-            })
-
-        return result
+        return [dict(col) for col in
+                _get_table_schema(db_config, table_name)['columns']]
     except mysql.connector.Error as err:
         logger.error(f"Error fetching table columns: {err}")
         raise Exception(f"Error fetching table columns: {err}")
-    finally:
-        cursor.close()
-        conn.close()
 
 
 def get_primary_key(db_config, table_name):
     """Get the primary key column(s) for a table."""
-    conn = get_connection(db_config)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute(
-            f"""
-            SELECT COLUMN_NAME
-            FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-            WHERE TABLE_SCHEMA = %s
-              AND TABLE_NAME = %s
-              AND CONSTRAINT_NAME = 'PRIMARY'
-            ORDER BY ORDINAL_POSITION
-        """, (db_config['database'], table_name))
-
-        primary_keys = [row[0] for row in cursor.fetchall()]
-        return primary_keys
+        return list(_get_table_schema(db_config, table_name)['primary_key'])
     except mysql.connector.Error as err:
         logger.error(f"Error fetching primary keys: {err}")
         raise Exception(f"Error fetching primary keys: {err}")
-    finally:
-        cursor.close()
-        conn.close()
 
 
 def create_table(db_config, table_name, column_defs, primary_key=None):
     """Create a new table in the database based on provided column definitions."""
-    conn = get_connection(db_config)
+    conn = get_pooled_connection(db_config)
     cursor = conn.cursor()
 
     try:
@@ -125,6 +368,7 @@ def create_table(db_config, table_name, column_defs, primary_key=None):
         logger.debug(f"Creating table with SQL: {create_sql}")
         cursor.execute(create_sql)
         conn.commit()
+        invalidate_schema_cache(db_config)
 
         return True
     except mysql.connector.Error as err:
@@ -135,205 +379,1413 @@ def create_table(db_config, table_name, column_defs, primary_key=None):
         conn.close()
 
 
+# Number of rows sent per multi-row statement and committed together
+DEFAULT_BATCH_SIZE = 500
+
+# Rows per temporary file when bulk loading with LOAD DATA LOCAL INFILE
+BULK_LOAD_CHUNK_SIZE = int(os.environ.get('BULK_LOAD_CHUNK_SIZE', 50000))
+
+# Existing-key prefetch limits: tables up to KEY_SCAN_MAX_ROWS rows with
+# integer keys are scanned into memory, within KEY_INDEX_MAX_BYTES
+KEY_SCAN_MAX_ROWS = int(os.environ.get('KEY_SCAN_MAX_ROWS', 2000000))
+KEY_INDEX_MAX_BYTES = int(
+    os.environ.get('KEY_INDEX_MAX_BYTES', 64 * 1024 * 1024))
+KEY_LOOKUP_CHUNK_SIZE = 1000
+_INT_KEY_RE = re.compile(r'^-?\d+$')
+
+# Sidecar table holding per-row content hashes for incremental syncs
+FINGERPRINT_TABLE = '_xls2mysql_fingerprints'
+
+# Converted chunks a writer may have queued before the reader blocks
+WRITE_QUEUE_DEPTH = int(os.environ.get('WRITE_QUEUE_DEPTH', 4))
+
+# Error messages kept in a sync result; every reject is in the reject file
+ERROR_SAMPLE_SIZE = int(os.environ.get('ERROR_SAMPLE_SIZE', 20))
+
+# Deadlocks and lock wait timeouts say nothing about the rows: a batch
+# hitting one is retried this many times, pausing WRITE_RETRY_DELAY
+# seconds longer each time, before its rows are rejected
+WRITE_RETRIES = int(os.environ.get('WRITE_RETRIES', 3))
+WRITE_RETRY_DELAY = float(os.environ.get('WRITE_RETRY_DELAY', 0.2))
+_TRANSIENT_ERRORS = {errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT}
+
+# Server/client errors meaning LOAD DATA LOCAL INFILE is not permitted
+_LOCAL_INFILE_REJECTED = {
+    errorcode.ER_NOT_ALLOWED_COMMAND,
+    errorcode.ER_CLIENT_LOCAL_FILES_DISABLED,
+    errorcode.CR_LOAD_DATA_LOCAL_INFILE_REJECTED,
+}
+
+
+_INTEGER_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'integer',
+                  'bigint')
+_CHAR_LENGTH_RE = re.compile(r'^(?:var)?char\((\d+)\)', re.IGNORECASE)
+
+
+def _column_length(db_type):
+    """Return the character limit of a CHAR/VARCHAR column type, else None."""
+    match = _CHAR_LENGTH_RE.match(db_type or '')
+    return int(match.group(1)) if match else None
+
+
+def _is_integer_type(db_type):
+    if not db_type:
+        return False
+    return db_type.split('(')[0].split()[0].lower() in _INTEGER_TYPES
+
+
+def _prepare_column(series, db_type=None, truncated=None):
+    """
+    Convert one mapped column into an object array of bindable values.
+    NaN/NaT become None, integral floats bound for integer columns become
+    ints and strings are cut to the target column's declared length.
+    truncated, if given, counts the cut values under the column's name.
+    """
+    null_mask = series.isna().to_numpy()
+
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(
+            series):
+        if (_is_integer_type(db_type)
+                and pd.api.types.is_float_dtype(series)
+                and not null_mask.all()):
+            values = np.where(null_mask, 0, series.to_numpy())
+            integral = (~null_mask & (np.mod(values, 1) == 0) &
+                        (np.abs(values) < 2**63))
+            out = series.to_numpy(dtype=object, copy=True)
+            out[integral] = values[integral].astype(np.int64).astype(object)
+        else:
+            out = series.to_numpy(dtype=object, copy=True)
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        out = np.array(series.dt.to_pydatetime(), dtype=object)
+    else:
+        length = _column_length(db_type)
+        cut = 0
+        if pd.api.types.infer_dtype(series, skipna=True) == 'string':
+            if length:
+                cut = int((series.str.len() > length).sum())
+                series = series.str.slice(0, length)
+            out = series.to_numpy(dtype=object, copy=True)
+        else:
+            # Mixed object column: numbers pass through, anything else is
+            # bound as its string form
+            out = series.to_numpy(dtype=object, copy=True)
+            for i in np.flatnonzero(~null_mask):
+                v = out[i]
+                if not isinstance(v, (int, float)):
+                    v = str(v)
+                    if length and len(v) > length:
+                        v = v[:length]
+                        cut += 1
+                    out[i] = v
+        if cut and truncated is not None:
+            truncated[series.name] = truncated.get(series.name, 0) + cut
+
+    out[null_mask] = None
+    return out
+
+
+_INTEGER_BITS = {'tinyint': 8, 'smallint': 16, 'mediumint': 24, 'int': 32,
+                 'integer': 32, 'bigint': 64}
+_DECIMAL_RE = re.compile(r'^(?:decimal|numeric)\((\d+)(?:,\s*(\d+))?\)',
+                         re.IGNORECASE)
+_FLOAT_TYPES = ('float', 'double', 'real')
+_DATE_TYPES = ('date', 'datetime', 'timestamp')
+
+
+def _column_check(column):
+    """
+    Compile the pre-write check of one table column from its metadata.
+    Returns a dict with the value kind to check ('integer', 'number',
+    'datetime' or None), its inclusive range, whether NULL is allowed and
+    whether yes/no strings are read as 1/0, or None when the column needs
+    no check. Strings are not checked: they are cut to the column length
+    when converted.
+    """
+    db_type = (column.get('type') or '').lower()
+    base = db_type.split('(')[0].split()[0] if db_type else ''
+    unsigned = 'unsigned' in db_type
+    check = {
+        'kind': None,
+        'low': None,
+        'high': None,
+        'scale': 0,
+        # NULL in an auto-increment column asks the server for the next id
+        'nullable': column.get('nullable', True) or
+                    column.get('auto_increment', False),
+    }
+    if base in _INTEGER_BITS:
+        bits = _INTEGER_BITS[base]
+        check.update(kind='integer',
+                     low=0 if unsigned else -2**(bits - 1),
+                     high=2**bits - 1 if unsigned else 2**(bits - 1) - 1,
+                     # BOOLEAN columns are TINYINT(1)
+                     boolean=db_type.startswith('tinyint(1)'))
+    elif base in ('decimal', 'numeric'):
+        match = _DECIMAL_RE.match(db_type)
+        precision, scale = ((int(match.group(1)), int(match.group(2) or 0))
+                            if match else (10, 0))
+        high = 10**(precision - scale) - 10**-scale
+        check.update(kind='number', low=0 if unsigned else -high, high=high,
+                     scale=scale)
+    elif base in _FLOAT_TYPES:
+        check.update(kind='number', low=0 if unsigned else None)
+    elif base in _DATE_TYPES:
+        check['kind'] = 'datetime'
+    elif check['nullable']:
+        return None
+    return check
+
+
+def _validate_frame(df, checks):
+    """
+    Run the compiled column checks over a mapped chunk before any write.
+    Date strings bound for date columns are parsed on the way, all with
+    one format per column: the first chunk that settles it stores it in
+    the column's check for the following chunks. Strings whose day and
+    month order cannot be told apart are rejected rather than guessed.
+    Yes/no and true/false strings bound for BOOLEAN columns become 1/0.
+    Returns (df, valid, reasons): the coerced chunk, a boolean mask of the
+    rows that passed, and {position: (error code, message)} naming the
+    first bad value of every other row. Codes are the ones the server
+    would have answered with.
+    """
+    valid = np.ones(len(df), dtype=bool)
+    reasons = {}
+    coerced = {}
+
+    def reject(mask, code, describe):
+        for pos in np.flatnonzero(mask & valid):
+            reasons[pos] = (str(code), describe(pos))
+        valid[mask] = False
+
+    for col, check in checks.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        null_mask = series.isna().to_numpy()
+        if not check['nullable']:
+            reject(null_mask, errorcode.ER_BAD_NULL_ERROR,
+                   lambda pos, col=col: f"Column '{col}' cannot be null")
+
+        if check['kind'] in ('integer', 'number'):
+            if check.get('boolean') and not pd.api.types.is_numeric_dtype(
+                    series):
+                text = series.map(lambda v: isinstance(v, str)).to_numpy(
+                    dtype=bool)
+                flags = parse_boolean_strings(series[text]).to_numpy()
+                known = ~np.isnan(flags)
+                if known.any():
+                    values = series.to_numpy(dtype=object, copy=True)
+                    values[np.flatnonzero(text)[known]] = [
+                        int(flag) for flag in flags[known]
+                    ]
+                    series = pd.Series(values, index=series.index,
+                                       name=col).infer_objects()
+                    coerced[col] = series
+            if pd.api.types.is_numeric_dtype(series):
+                numeric = series.astype(float)
+            else:
+                numeric = pd.to_numeric(series, errors='coerce')
+            values = numeric.to_numpy(dtype=float, na_value=np.nan)
+            parsed = ~np.isnan(values)
+            reject(~null_mask & ~parsed,
+                   errorcode.ER_TRUNCATED_WRONG_VALUE_FOR_FIELD,
+                   lambda pos, col=col, kind=check['kind']:
+                   f"Incorrect {'integer' if kind == 'integer' else 'decimal'} value: "
+                   f"'{series.iloc[pos]}' for column '{col}'")
+            # The server rounds to the column's scale before the range check
+            rounded = np.round(np.where(parsed, values, 0), check['scale'])
+            tolerance = 10**-check['scale'] / 2 if check['scale'] else 0
+            out_of_range = np.zeros(len(df), dtype=bool)
+            if check['low'] is not None:
+                out_of_range |= rounded < check['low'] - tolerance
+            if check['high'] is not None:
+                out_of_range |= rounded > check['high'] + tolerance
+            reject(parsed & out_of_range,
+                   errorcode.ER_WARN_DATA_OUT_OF_RANGE,
+                   lambda pos, col=col:
+                   f"Out of range value for column '{col}': {series.iloc[pos]}")
+
+        elif (check['kind'] == 'datetime'
+              and not pd.api.types.is_datetime64_any_dtype(series)
+              and not pd.api.types.is_numeric_dtype(series)):
+            text = series.map(lambda v: isinstance(v, str)).to_numpy(
+                dtype=bool)
+            try:
+                parsed = pd.to_datetime(series.where(~text), errors='coerce')
+                if text.any():
+                    dates, date_format = parse_date_strings(
+                        series[text], check.get('date_format'))
+                    if date_format is None:
+                        reject(text, errorcode.ER_TRUNCATED_WRONG_VALUE,
+                               lambda pos, col=col:
+                               f"Ambiguous date value: '{series.iloc[pos]}' for column '{col}' "
+                               f"(day and month order unknown)")
+                    else:
+                        check['date_format'] = date_format
+                        parsed[text] = dates
+            except (TypeError, ValueError) as e:
+                # e.g. mixed time zones; the server gets the raw values
+                logger.debug(f"Dates in column {col} left unparsed: {str(e)}")
+                continue
+            reject(~null_mask & parsed.isna().to_numpy(),
+                   errorcode.ER_TRUNCATED_WRONG_VALUE,
+                   lambda pos, col=col:
+                   f"Incorrect datetime value: '{series.iloc[pos]}' for column '{col}'")
+            coerced[col] = parsed
+
+    if coerced:
+        df = df.assign(**coerced)
+    return df, valid, reasons
+
+
+def _frame_keys(df, key_columns):
+    """The key of every row of a mapped frame, None where part is missing."""
+    complete = df[key_columns].notna().all(axis=1).to_numpy()
+    keys = zip(*(df[col].tolist() for col in key_columns))
+    return [key if ok else None for key, ok in zip(keys, complete)]
+
+
+def _collapse_duplicates(df, key_columns, keep, seen=None):
+    """
+    Find the rows of a mapped chunk to write when it repeats a key: the
+    'first' or 'last' row of each key. Rows with an incomplete key are
+    kept. seen, if given, holds the keys of earlier chunks; rows repeating
+    one are dropped as well, and the chunk's keys are added to it.
+    Returns a boolean mask of the rows to keep.
+    """
+    incomplete = df[key_columns].isna().any(axis=1).to_numpy()
+    keep_mask = incomplete | ~df.duplicated(subset=key_columns,
+                                            keep=keep).to_numpy()
+    if seen is not None:
+        candidates = np.flatnonzero(keep_mask & ~incomplete)
+        keys = _frame_keys(df.iloc[candidates], key_columns)
+        repeated = np.fromiter((key in seen for key in keys), dtype=bool,
+                               count=len(keys))
+        keep_mask[candidates[repeated]] = False
+        seen.update(keys)
+    return keep_mask
+
+
+def _prepare_rows(df, column_types=None, truncated=None):
+    """
+    Turn a mapped DataFrame into a list of parameter tuples in one
+    column-wise pass. column_types maps column names to their MySQL types;
+    truncated, if given, counts the strings cut to fit per column.
+    """
+    column_types = column_types or {}
+    arrays = [
+        _prepare_column(df[col], column_types.get(col), truncated)
+        for col in df.columns
+    ]
+    return list(zip(*arrays))
+
+
+def _build_insert_sql(table_name, columns, row_count, update_columns=None):
+    """Build a multi-row INSERT, optionally with ON DUPLICATE KEY UPDATE."""
+    placeholders = f"({', '.join(['%s'] * len(columns))})"
+    insert_sql = (f"INSERT INTO `{table_name}` (`{'`, `'.join(columns)}`) "
+                  f"VALUES {', '.join([placeholders] * row_count)}")
+    if update_columns is not None:
+        set_parts = [f"`{col}` = VALUES(`{col}`)" for col in update_columns]
+        insert_sql += f" ON DUPLICATE KEY UPDATE {', '.join(set_parts)}"
+    return insert_sql
+
+
+def _table_is_empty(cursor, table_name):
+    cursor.execute(f"SELECT 1 FROM `{table_name}` LIMIT 1")
+    return not cursor.fetchall()
+
+
+def _key_columns(primary_key):
+    """The key as a list of columns; composite keys are already lists."""
+    if not primary_key:
+        return []
+    return list(primary_key) if isinstance(primary_key, (list, tuple)) else [
+        primary_key
+    ]
+
+
+def _key_positions(columns, primary_key):
+    """Positions of the key column(s) in columns, or None if one is unmapped."""
+    key_columns = _key_columns(primary_key)
+    if not key_columns or any(col not in columns for col in key_columns):
+        return None
+    return [columns.index(col) for col in key_columns]
+
+
+def _row_key(row, positions):
+    """
+    The key of a row: its value for a single-column key, a tuple for a
+    composite one. None when any part of the key is missing.
+    """
+    if len(positions) == 1:
+        return row[positions[0]]
+    key = tuple(row[pos] for pos in positions)
+    return None if None in key else key
+
+
+class _KeyLookup:
+    """Finds existing keys with chunked IN (...) queries against the table."""
+
+    mode = 'lookup'
+    nbytes = 0
+
+    def __init__(self, cursor, table_name, primary_key):
+        self.cursor = cursor
+        self.table_name = table_name
+        self.primary_key = primary_key
+
+    def __len__(self):
+        return 0
+
+    def existing(self, keys):
+        """
+        Return the subset of keys that already exist in the table.
+        Composite keys are tuples, matched with row constructors.
+        """
+        keys = list(set(keys))
+        key_columns = _key_columns(self.primary_key)
+        column_list = ', '.join(f"`{col}`" for col in key_columns)
+        found = set()
+        for start in range(0, len(keys), KEY_LOOKUP_CHUNK_SIZE):
+            chunk = keys[start:start + KEY_LOOKUP_CHUNK_SIZE]
+            if len(key_columns) == 1:
+                placeholders = ', '.join(['%s'] * len(chunk))
+                self.cursor.execute(
+                    f"SELECT {column_list} FROM `{self.table_name}` "
+                    f"WHERE {column_list} IN ({placeholders})", chunk)
+                found.update(row[0] for row in self.cursor.fetchall())
+            else:
+                row_placeholder = f"({', '.join(['%s'] * len(key_columns))})"
+                self.cursor.execute(
+                    f"SELECT {column_list} FROM `{self.table_name}` "
+                    f"WHERE ({column_list}) IN "
+                    f"({', '.join([row_placeholder] * len(chunk))})",
+                    [v for key in chunk for v in key])
+                found.update(tuple(row) for row in self.cursor.fetchall())
+        return found
+
+    def add(self, keys):
+        # Newly written keys are found by the next query
+        pass
+
+
+class _KeyIndex:
+    """Integer key values of the target table, as a sorted int64 array."""
+
+    mode = 'scan'
+
+    def __init__(self, keys):
+        self.keys = np.unique(keys)
+        self.added = set()
+
+    def __len__(self):
+        return len(self.keys) + len(self.added)
+
+    @property
+    def nbytes(self):
+        return int(self.keys.nbytes) + sys.getsizeof(self.added)
+
+    def existing(self, keys):
+        """Return the subset of keys that already exist in the table."""
+        found = set()
+        candidates, originals = [], []
+        for key in set(keys):
+            if key in self.added:
+                found.add(key)
+                continue
+            int_key = _as_int_key(key)
+            if int_key is not None:
+                candidates.append(int_key)
+                originals.append(key)
+        if candidates and len(self.keys):
+            values = np.array(candidates, dtype=np.int64)
+            positions = np.searchsorted(self.keys, values)
+            positions[positions == len(self.keys)] = 0
+            hits = self.keys[positions] == values
+            found.update(key for key, hit in zip(originals, hits) if hit)
+        return found
+
+    def add(self, keys):
+        self.added.update(keys)
+
+
+def _as_int_key(key):
+    """Return key as an int if it represents an integer value, else None."""
+    if isinstance(key, bool):
+        return None
+    if isinstance(key, int):
+        return key if -2**63 <= key < 2**63 else None
+    if isinstance(key, float):
+        return int(key) if key.is_integer() and abs(key) < 2**63 else None
+    if isinstance(key, str) and _INT_KEY_RE.match(key.strip()):
+        return _as_int_key(int(key.strip()))
+    return None
+
+
+def _build_key_index(cursor, table_name, primary_key, key_type):
+    """
+    Prefetch the table's existing keys when they fit the memory cap.
+    Integer keys of tables up to KEY_SCAN_MAX_ROWS rows are loaded with a
+    full key scan; anything else is looked up per batch with IN queries.
+    """
+    lookup = _KeyLookup(cursor, table_name, primary_key)
+    if not _is_integer_type(key_type):
+        return lookup
+
+    cursor.execute(
+        "SELECT TABLE_ROWS FROM INFORMATION_SCHEMA.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table_name, ))
+    row = cursor.fetchone()
+    estimated_rows = int(row[0] or 0) if row else 0
+    max_keys = KEY_INDEX_MAX_BYTES // 8
+    if estimated_rows > min(KEY_SCAN_MAX_ROWS, max_keys):
+        return lookup
+
+    chunks = []
+    loaded = 0
+    too_large = False
+    cursor.execute(f"SELECT `{primary_key}` FROM `{table_name}` "
+                   f"WHERE `{primary_key}` IS NOT NULL")
+    while True:
+        rows = cursor.fetchmany(50000)
+        if not rows:
+            break
+        if too_large:
+            continue  # drain the result set
+        loaded += len(rows)
+        try:
+            if loaded > max_keys:
+                raise OverflowError
+            chunks.append(np.fromiter((r[0] for r in rows), dtype=np.int64,
+                                      count=len(rows)))
+        except OverflowError:
+            # Too many keys, or unsigned values beyond int64
+            too_large = True
+            chunks = []
+
+    if too_large:
+        logger.info(
+            f"Key index for {table_name} does not fit in {KEY_INDEX_MAX_BYTES} bytes, using chunked lookups"
+        )
+        return lookup
+    return _KeyIndex(
+        np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64))
+
+
+def _write_batch(cursor, table_name, columns, rows, primary_key=None,
+                 upsert=False, key_index=None, metrics=None):
+    """
+    Write a batch of rows without committing.
+    primary_key is a column name, or a list of columns for a composite key.
+    Returns a tuple of (inserted, updated, inserted_keys).
+    """
+    key_pos = _key_positions(columns, primary_key)
+    if key_pos is None:
+        cursor.execute(_build_insert_sql(table_name, columns, len(rows)),
+                       [v for row in rows for v in row])
+        return len(rows), 0, []
+
+    if key_index is None:
+        key_index = _KeyLookup(cursor, table_name, primary_key)
+    keys = [_row_key(row, key_pos) for row in rows]
+    with timed(metrics, 'key_lookup'):
+        existing = key_index.existing([key for key in keys if key is not None])
+
+    # Classify rows; a key repeated within the batch is an update after
+    # its first occurrence, same as when rows were written one by one
+    seen = set(existing)
+    insert_rows, update_rows, inserted_keys = [], [], []
+    for row, key in zip(rows, keys):
+        if key is not None and key in seen:
+            update_rows.append(row)
+        else:
+            insert_rows.append(row)
+            if key is not None:
+                seen.add(key)
+                inserted_keys.append(key)
+
+    if upsert:
+        # The key is the table's primary key, so the whole batch can go
+        # through a single INSERT ... ON DUPLICATE KEY UPDATE statement
+        key_columns = _key_columns(primary_key)
+        update_columns = [c for c in columns
+                          if c not in key_columns] or key_columns[:1]
+        cursor.execute(
+            _build_insert_sql(table_name, columns, len(rows), update_columns),
+            [v for row in rows for v in row])
+        return len(insert_rows), len(update_rows), inserted_keys
+
+    # The key column is not unique in the table: update matches explicitly
+    if insert_rows:
+        cursor.execute(
+            _build_insert_sql(table_name, columns, len(insert_rows)),
+            [v for row in insert_rows for v in row])
+    if update_rows:
+        key_columns = _key_columns(primary_key)
+        set_columns = [c for c in columns if c not in key_columns]
+        if set_columns:
+            set_idx = [columns.index(c) for c in set_columns]
+            update_sql = (f"UPDATE `{table_name}` SET "
+                          f"{', '.join(f'`{c}` = %s' for c in set_columns)} "
+                          f"WHERE {' AND '.join(f'`{c}` = %s' for c in key_columns)}")
+            cursor.executemany(
+                update_sql,
+                [tuple(row[i] for i in set_idx) +
+                 tuple(row[i] for i in key_pos) for row in update_rows])
+    return len(insert_rows), len(update_rows), inserted_keys
+
+
+def _error_code(err):
+    """MySQL error number of err, or the exception type for other errors."""
+    errno = getattr(err, 'errno', None)
+    return str(errno) if errno else type(err).__name__
+
+
+def _record_error(result, code, message, count=1):
+    """Count failures by error code, keeping only a sample of messages."""
+    result['errors'] += count
+    result['error_codes'][code] = result['error_codes'].get(code, 0) + count
+    if len(result['error_messages']) < ERROR_SAMPLE_SIZE:
+        result['error_messages'].append(message)
+
+
+def _merge_errors(result, other):
+    """Add the error counts and message sample of other to result."""
+    result['errors'] += other['errors']
+    for code, count in other['error_codes'].items():
+        result['error_codes'][code] = result['error_codes'].get(code, 0) + count
+    room = max(ERROR_SAMPLE_SIZE - len(result['error_messages']), 0)
+    result['error_messages'].extend(other['error_messages'][:room])
+
+
+class _RejectFile:
+    """
+    CSV of the rows a sync could not write, with the error of each.
+    The file is created on the first reject; writers on several threads
+    may share it.
+    """
+
+    def __init__(self, table_name):
+        self.prefix = re.sub(r'[^\w-]', '_', table_name)[:40]
+        self.path = None
+        self._file = None
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def add(self, row_number, columns, row, code, message):
+        with self._lock:
+            if self._file is None:
+                os.makedirs(REJECT_DIR, exist_ok=True)
+                fd, self.path = tempfile.mkstemp(prefix=f"{self.prefix}_",
+                                                 suffix='.rejects.csv',
+                                                 dir=REJECT_DIR)
+                self._file = os.fdopen(fd, 'w', encoding='utf-8', newline='')
+                self._writer = csv.writer(self._file)
+                self._writer.writerow(['row', 'error_code', 'error'] +
+                                      list(columns))
+            self._writer.writerow([row_number + 1, code, message] +
+                                  ['' if v is None else v for v in row])
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _write_chunk(conn, cursor, table_name, columns, rows, primary_key,
+                 upsert, result, first_row, key_index=None, row_numbers=None,
+                 metrics=None, rejects=None):
+    """
+    Write and commit one chunk, updating the result counts in place.
+    A failing chunk is split in halves that are retried in turn, down to
+    single rows, so good rows still land in multi-row transactions and
+    only the offending rows are rejected (and added to rejects, if given).
+    Deadlocks and lock wait timeouts are retried as they are instead, up
+    to WRITE_RETRIES times, and then reject the rows involved.
+    row_numbers gives each row's 0-based sheet position when the chunk is
+    not a contiguous run starting at first_row.
+    Returns the offsets of the rows that could not be written.
+    """
+    if row_numbers is None:
+        row_numbers = range(first_row, first_row + len(rows))
+
+    failed = []
+    # Ranges still to write; the first half is popped first to keep order
+    pending = [(0, len(rows))]
+    retries = 0
+    while pending:
+        start, end = pending.pop()
+        try:
+            with timed(metrics, 'write'):
+                inserted, updated, new_keys = _write_batch(
+                    cursor, table_name, columns, rows[start:end], primary_key,
+                    upsert, key_index, metrics)
+                conn.commit()
+        except Exception as e:
+            conn.rollback()
+            transient = getattr(e, 'errno', None) in _TRANSIENT_ERRORS
+            if transient and retries < WRITE_RETRIES:
+                retries += 1
+                logger.warning(
+                    f"Batch starting at row {row_numbers[start] + 1} failed ({str(e)}), retry {retries} of {WRITE_RETRIES}"
+                )
+                time.sleep(WRITE_RETRY_DELAY * retries)
+                pending.append((start, end))
+                continue
+            if end - start > 1 and not transient:
+                if end - start == len(rows):
+                    logger.warning(
+                        f"Batch starting at row {row_numbers[0] + 1} failed ({str(e)}), bisecting to find the bad rows"
+                    )
+                middle = (start + end) // 2
+                pending.append((middle, end))
+                pending.append((start, middle))
+                continue
+            code = _error_code(e)
+            for offset in range(start, end):
+                row_number = row_numbers[offset]
+                logger.error(f"Error processing row {row_number + 1}: {str(e)}")
+                _record_error(result, code, f"Row {row_number + 1}: {str(e)}")
+                if rejects is not None:
+                    rejects.add(row_number, columns, rows[offset], code,
+                                str(e))
+                failed.append(offset)
+            retries = 0
+            continue
+
+        retries = 0
+        result['inserted'] += inserted
+        result['updated'] += updated
+        if key_index is not None:
+            key_index.add(new_keys)
+    return failed
+
+
+def _row_fingerprint(columns, row):
+    """Content hash of one prepared row, including the mapped column names."""
+    return hashlib.blake2b(repr((columns, row)).encode('utf-8'),
+                           digest_size=16).digest()
+
+
+def _fingerprint_key(key):
+    int_key = _as_int_key(key)
+    return str(int_key) if int_key is not None else str(key)[:255]
+
+
+def _ensure_fingerprint_table(cursor):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS `{FINGERPRINT_TABLE}` ("
+        f"`table_name` VARCHAR(64) NOT NULL, "
+        f"`row_key` VARCHAR(255) NOT NULL, "
+        f"`fingerprint` BINARY(16) NOT NULL, "
+        f"PRIMARY KEY (`table_name`, `row_key`))")
+
+
+def _split_unchanged(cursor, table_name, columns, rows, pk_idx):
+    """
+    Compare rows against their stored fingerprints.
+    Returns (changed positions, fingerprints of changed rows, unchanged
+    count); rows without a key are always treated as changed.
+    """
+    fingerprints = [_row_fingerprint(columns, row) for row in rows]
+    row_keys = [
+        _fingerprint_key(row[pk_idx]) if row[pk_idx] is not None else None
+        for row in rows
+    ]
+
+    stored = {}
+    lookup = list({k for k in row_keys if k is not None})
+    for start in range(0, len(lookup), KEY_LOOKUP_CHUNK_SIZE):
+        chunk = lookup[start:start + KEY_LOOKUP_CHUNK_SIZE]
+        cursor.execute(
+            f"SELECT `row_key`, `fingerprint` FROM `{FINGERPRINT_TABLE}` "
+            f"WHERE `table_name` = %s AND `row_key` IN "
+            f"({', '.join(['%s'] * len(chunk))})", [table_name] + chunk)
+        stored.update((k, bytes(fp)) for k, fp in cursor.fetchall())
+
+    changed, changed_fingerprints = [], []
+    for pos, (row_key, fingerprint) in enumerate(zip(row_keys, fingerprints)):
+        if row_key is not None and stored.get(row_key) == fingerprint:
+            continue
+        changed.append(pos)
+        changed_fingerprints.append((row_key, fingerprint))
+    return changed, changed_fingerprints, len(rows) - len(changed)
+
+
+def _store_fingerprints(conn, cursor, table_name, entries):
+    """Save (row_key, fingerprint) pairs for rows that were written."""
+    entries = [(k, fp) for k, fp in entries if k is not None]
+    if not entries:
+        return
+    # A key repeated in the sheet keeps the fingerprint of its last row
+    entries = list(dict(entries).items())
+    cursor.execute(
+        f"INSERT INTO `{FINGERPRINT_TABLE}` "
+        f"(`table_name`, `row_key`, `fingerprint`) VALUES "
+        f"{', '.join(['(%s, %s, %s)'] * len(entries))} "
+        f"ON DUPLICATE KEY UPDATE `fingerprint` = VALUES(`fingerprint`)",
+        [v for k, fp in entries for v in (table_name, k, fp)])
+    conn.commit()
+
+
+def _clear_fingerprints(conn, cursor, table_name):
+    """Forget the fingerprints stored for a table, if any were ever stored."""
+    try:
+        cursor.execute(
+            f"DELETE FROM `{FINGERPRINT_TABLE}` WHERE `table_name` = %s",
+            (table_name, ))
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_NO_SUCH_TABLE:
+            raise
+        return
+    conn.commit()
+
+
+class _ParallelWriter:
+    """
+    Writes batches concurrently, one worker per borrowed pooled connection.
+    Rows are partitioned by a hash of the key, so a key always goes to the
+    same worker: workers never contend on a row and later sheet rows still
+    win. Rows without a key are spread round-robin.
+    Each worker's queue is bounded, so a reader that gets ahead of the
+    database blocks instead of buffering the sheet. With a single worker
+    this pipelines reading and converting with the writes.
+    """
+
+    def __init__(self, connections, table_name, primary_key, upsert,
+                 key_index, metrics=None, rejects=None):
+        # Connections are borrowed up front, so a busy pool means fewer
+        # workers rather than workers blocked waiting for one
+        self.connections = connections
+        workers = len(connections)
+        self.metrics = metrics
+        self.rejects = rejects
+        self.table_name = table_name
+        self.primary_key = primary_key
+        self.upsert = upsert
+        # A lookup holds a cursor, so only the in-memory index is shared
+        self.key_index = key_index if isinstance(key_index, _KeyIndex) else None
+        self.results = [{'inserted': 0, 'updated': 0, 'errors': 0,
+                         'error_codes': {}, 'error_messages': []}
+                        for _ in range(workers)]
+        self.queues = [queue.Queue(maxsize=WRITE_QUEUE_DEPTH)
+                       for _ in range(workers)]
+        self.failure = None
+        self.threads = [
+            threading.Thread(target=self._run, args=(idx, ),
+                             name=f"sync-writer-{idx}", daemon=True)
+            for idx in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self, idx):
+        work = self.queues[idx]
+        conn = self.connections[idx]
+        cursor = None
+        try:
+            if self.metrics is not None:
+                conn = self.metrics.instrument(conn)
+            cursor = conn.cursor()
+            while True:
+                item = work.get()
+                if item is None:
+                    return
+                columns, rows, row_numbers = item
+                _write_chunk(conn, cursor, self.table_name, columns, rows,
+                             self.primary_key, self.upsert, self.results[idx],
+                             row_numbers[0], self.key_index, row_numbers,
+                             self.metrics, self.rejects)
+        except Exception as e:
+            logger.error(f"Sync writer {idx} failed: {str(e)}")
+            self.failure = e
+            # Keep consuming so the reader never blocks on a full queue
+            while work.get() is not None:
+                pass
+        finally:
+            if cursor is not None:
+                cursor.close()
+            conn.close()
+
+    def submit(self, columns, rows, row_numbers):
+        """
+        Partition one chunk of rows and queue each part for its worker.
+        row_numbers gives each row's 0-based sheet position.
+        """
+        if self.failure is not None:
+            raise self.failure
+        workers = len(self.queues)
+        parts = [([], []) for _ in range(workers)]
+        key_pos = _key_positions(columns, self.primary_key)
+        for row, row_number in zip(rows, row_numbers):
+            key = _row_key(row, key_pos) if key_pos is not None else None
+            target = (hash(key) if key is not None else row_number) % workers
+            parts[target][0].append(row)
+            parts[target][1].append(row_number)
+        for work, (part_rows, row_numbers) in zip(self.queues, parts):
+            if part_rows:
+                work.put((columns, part_rows, row_numbers))
+
+    def merged(self, result):
+        """Return result with the workers' counts added to it."""
+        merged = dict(result,
+                      error_codes=dict(result['error_codes']),
+                      error_messages=list(result['error_messages']))
+        for worker_result in self.results:
+            merged['inserted'] += worker_result['inserted']
+            merged['updated'] += worker_result['updated']
+            _merge_errors(merged, worker_result)
+        return merged
+
+    def close(self):
+        """Wait for all queued batches to be written."""
+        for work in self.queues:
+            work.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.failure is not None:
+            raise self.failure
+
+
+def _tsv_value(value):
+    """Render one value in LOAD DATA's default tab-separated format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    text = str(value)
+    if any(c in text for c in '\\\t\n\r\0'):
+        text = (text.replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r')
+                .replace('\0', '\\0'))
+    return text
+
+
+def _bulk_load_chunk(conn, cursor, table_name, columns, rows, result,
+                     replace=False):
+    """
+    Load one chunk with LOAD DATA LOCAL INFILE and commit it.
+    Rows the server skips are counted as errors with a sample of warnings.
+    The server does not say which rows it skipped, so they are not in the
+    reject file. With replace, a row whose key is already in the table
+    replaces it and is counted as an update.
+    """
+    os.makedirs(BULK_LOAD_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.tsv', dir=BULK_LOAD_DIR)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='\n') as f:
+            for row in rows:
+                f.write('\t'.join(_tsv_value(v) for v in row))
+                f.write('\n')
+
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s {'REPLACE ' if replace else ''}"
+            f"INTO TABLE `{table_name}` "
+            f"CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+            f"LINES TERMINATED BY '\\n' "
+            f"(`{'`, `'.join(columns)}`)", (path, ))
+        loaded = max(cursor.rowcount, 0)
+        # A replaced row is reported twice: deleted, then inserted
+        replaced = max(loaded - len(rows), 0) if replace else 0
+        loaded -= replaced
+
+        skipped = len(rows) - loaded
+        if skipped:
+            cursor.execute("SHOW WARNINGS LIMIT 1")
+            warnings = cursor.fetchall()
+            code, message = ((str(warnings[0][1]), str(warnings[0][2]))
+                             if warnings else ('LOAD DATA', 'Rows skipped'))
+            _record_error(
+                result, code,
+                f"{skipped} rows skipped by LOAD DATA: {message}", skipped)
+        conn.commit()
+        result['inserted'] += loaded - replaced
+        result['updated'] += replaced
+    finally:
+        os.remove(path)
+
+
+# Ordering column added to staging tables so later sheet rows win
+_STAGING_ROW_COLUMN = '_xls2mysql_row'
+
+
+def _create_staging_table(cursor, table_name, columns, primary_key):
+    """
+    Create a session-scoped staging table with the target's column types
+    for the mapped columns, and return its name.
+    """
+    staging_table = f"_stg_{table_name}"[:64]
+    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS `{staging_table}`")
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE `{staging_table}` ("
+        f"`{_STAGING_ROW_COLUMN}` BIGINT AUTO_INCREMENT PRIMARY KEY, "
+        f"KEY (`{primary_key}`)) "
+        f"SELECT `{'`, `'.join(columns)}` FROM `{table_name}` LIMIT 0")
+    return staging_table
+
+
+def _merge_staging_table(conn, cursor, table_name, staging_table, columns,
+                         primary_key):
+    """
+    Upsert the staged rows into the target in one transaction.
+    Returns (inserted, updated) counted the same way the row-by-row path
+    counts them: the first occurrence of a new key is an insert, every
+    other staged row is an update.
+    """
+    cursor.execute(
+        f"SELECT COUNT(*), "
+        f"COUNT(DISTINCT CASE WHEN t.`{primary_key}` IS NULL "
+        f"THEN s.`{primary_key}` END), "
+        f"COALESCE(SUM(s.`{primary_key}` IS NULL), 0) "
+        f"FROM `{staging_table}` s LEFT JOIN `{table_name}` t "
+        f"ON t.`{primary_key}` = s.`{primary_key}`")
+    staged, new_keys, null_keys = cursor.fetchone()
+    inserted = int(new_keys) + int(null_keys)
+    updated = int(staged) - inserted
+
+    update_columns = [c for c in columns if c != primary_key] or [primary_key]
+    set_parts = [f"`{col}` = s.`{col}`" for col in update_columns]
+    cursor.execute(
+        f"INSERT INTO `{table_name}` (`{'`, `'.join(columns)}`) "
+        f"SELECT s.`{'`, s.`'.join(columns)}` FROM `{staging_table}` s "
+        f"ORDER BY s.`{_STAGING_ROW_COLUMN}` "
+        f"ON DUPLICATE KEY UPDATE {', '.join(set_parts)}")
+    conn.commit()
+    return inserted, updated
+
+
 def perform_sync(db_config,
                  excel_file,
                  table_name,
                  column_mapping,
                  primary_key=None,
-                 row_limit=None):
+                 row_limit=None,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 progress_callback=None,
+                 bulk_load=False,
+                 staging_merge=False,
+                 concurrency=1,
+                 incremental=False,
+                 sheet_name=None,
+                 pipeline=False,
+                 duplicates='last'):
+    """
+    Sync the mapped Excel columns into the table and return the counts.
+    progress_callback, if given, is called with (result, rows_processed)
+    after every batch. bulk_load enables LOAD DATA LOCAL INFILE for
+    insert-only syncs (no primary key, or an empty target table).
+    staging_merge loads the sheet into a temporary staging table first and
+    upserts it into the target with one set-based statement.
+    concurrency > 1 writes batches in parallel over up to that many
+    connections, within the sync's share of the pool ('writers' reports
+    how many it got).
+    incremental skips rows whose content fingerprint matches the one
+    stored by the previous sync; they are counted as unchanged. Any other
+    sync of the table drops its stored fingerprints.
+    sheet_name selects the worksheet to read (the first by default).
+    pipeline writes batched rows on a second connection while the next
+    chunk is read and converted; it applies when concurrency is 1. That
+    writer still has one statement in flight at a time, so it only pays
+    off when reading is as slow as writing; concurrency > 1 keeps several
+    batches in flight.
+    duplicates picks the row written when the sheet repeats a key: the
+    'last' (the default) or 'first' of its rows that pass validation; the
+    others are counted as 'duplicates'. With last-wins, a key repeated in
+    a later chunk is written again and counted as an update instead.
+    When the table's primary key spans several columns and all of them
+    are mapped, rows are matched on the whole key.
+    Strings longer than their column are cut to fit and counted per
+    column in 'truncated'. The result's 'metrics' entry holds the phase
+    timings, rows/sec, bytes read and database round trips of the run.
+    Rows that fail are counted per error code in 'error_codes', with a
+    sample in 'error_messages', and written with their errors to the CSV
+    named by 'reject_file'.
+    """
     if row_limit and row_limit <= 0:
         raise Exception("Row limit must be a positive integer")
+    if batch_size <= 0:
+        raise Exception("Batch size must be a positive integer")
+    if concurrency < 1:
+        raise Exception("Concurrency must be a positive integer")
+    if duplicates not in ('first', 'last'):
+        raise Exception("Duplicate policy must be 'first' or 'last'")
 
     logger.info(
-        f"perform_sync started for table: {table_name}, primary_key: {primary_key}, row_limit: {row_limit}"
+        f"perform_sync started for table: {table_name}, sheet: {sheet_name}, primary_key: {primary_key}, row_limit: {row_limit}, batch_size: {batch_size}"
     )
 
-    # Verify database connection before starting
-    logger.info("Testing database connection before starting sync...")
-    test_connection(db_config)
-    logger.info("Database connection successful, proceeding with sync")
-
-    conn = get_connection(db_config)
-    cursor = conn.cursor(dictionary=True)
+    metrics = SyncMetrics()
+    progress_log = SampledLogger(logger)
+    conn = cursor = None
+    staging_table = None
+    parallel_writer = None
+    rejects = _RejectFile(table_name)
 
     result = {
         'total_rows': 0,
         'inserted': 0,
         'updated': 0,
         'errors': 0,
+        'unchanged': 0,
+        'duplicates': 0,
+        'truncated': {},
+        'error_codes': {},
         'error_messages': []
     }
 
     try:
-        # Read Excel data
-        logger.info(f"Reading Excel file: {excel_file}")
-        df = pd.read_excel(excel_file)
-        orig_row_count = len(df)
-        result['total_rows'] = orig_row_count
+        # Rows are streamed from the workbook in chunks, so the total is
+        # taken from the sheet dimensions rather than a full parse
+        orig_row_count = count_workbook_rows(excel_file, sheet_name)
+        result['total_rows'] = orig_row_count or 0
         logger.info(f"Excel file contains {orig_row_count} rows")
 
         # Apply row limit if specified
-        if row_limit and len(df) > row_limit:
+        if row_limit and orig_row_count and orig_row_count > row_limit:
             logger.info(
-                f"Limiting process to first {row_limit} rows out of {len(df)} based on user settings"
+                f"Limiting process to first {row_limit} rows out of {orig_row_count} based on user settings"
             )
-            df = df.head(row_limit)
-            result['total_rows'] = len(df)
+            result['total_rows'] = row_limit
 
-        # Map Excel columns to DB columns
-        df_mapped = pd.DataFrame()
-        for excel_col, db_col in column_mapping.items():
-            if excel_col in df.columns:
-                df_mapped[db_col] = df[excel_col]
+        # Table metadata is read before this sync borrows its connection:
+        # loading it takes a pooled connection of its own
+        table_pk = get_primary_key(db_config, table_name)
+        if not primary_key and table_pk:
+            primary_key = table_pk[0]
+        mapped_columns = set(column_mapping.values())
 
-        # Get primary key if not provided but exists in table
-        if not primary_key:
-            try:
-                pk = get_primary_key(db_config, table_name)
-                if pk:
-                    primary_key = pk[0]
-            except:
-                pass
+        # A composite primary key is matched on all of its columns when
+        # the selected key is one of them and every part is mapped
+        if (len(table_pk) > 1 and primary_key in table_pk
+                and set(table_pk) <= mapped_columns):
+            logger.info(f"Matching rows on the composite key {table_pk}")
+            primary_key = list(table_pk)
+        composite = isinstance(primary_key, list)
+
+        # Target column types drive value coercion and string truncation,
+        # and the column metadata the checks run before each write
+        column_types = {}
+        checks = {}
+        for col in get_table_columns(db_config, table_name):
+            column_types[col['name']] = col['type']
+            check = _column_check(col)
+            if check is not None and col['name'] in mapped_columns:
+                checks[col['name']] = check
+
+        conn = metrics.instrument(get_pooled_connection(db_config))
+        cursor = conn.cursor()
+
+        # Multi-row upserts are only safe when the key is the table's own
+        # primary key; otherwise existing rows are updated by explicit match
+        upsert = bool(primary_key) and table_pk == _key_columns(primary_key)
+
+        # The fingerprint store and the staging merge join on one column
+        if composite and (incremental or staging_merge):
+            logger.info(
+                "Incremental sync and staging merge are not used with a composite key"
+            )
+            incremental = staging_merge = False
+
+        # Incremental syncs compare fingerprints row by row on the serial
+        # batched path, so they need a key and exclude the bulk strategies
+        if incremental and not primary_key:
+            logger.info("Incremental sync skipped: no primary key")
+            incremental = False
+        if incremental:
+            if bulk_load or staging_merge or concurrency > 1:
+                logger.info(
+                    "Incremental sync uses serial batched writes; bulk load, staging merge and parallel writes are disabled"
+                )
+            bulk_load = staging_merge = False
+            concurrency = 1
+            _ensure_fingerprint_table(cursor)
+            conn.commit()
+        else:
+            # Other write paths do not record fingerprints, so those of an
+            # earlier incremental sync would hide the rows changed here
+            _clear_fingerprints(conn, cursor, table_name)
+
+        # The set-based merge relies on ON DUPLICATE KEY UPDATE
+        if staging_merge and not upsert:
+            logger.info(
+                "Staging merge skipped: the key is not the table's primary key"
+            )
+            staging_merge = False
+        staged = {'inserted': 0, 'updated': 0, 'errors': 0,
+                  'error_codes': {}, 'error_messages': []}
+        counts = staged if staging_merge else result
+
+        # Bulk loading only inserts, so it is used when no row can match
+        # an existing key (rows loaded into a staging table never do)
+        if bulk_load and primary_key and not staging_merge and not _table_is_empty(
+                cursor, table_name):
+            logger.info(
+                "Bulk load skipped: table has rows and a primary key is used for updates"
+            )
+            bulk_load = False
+        chunk_size = BULK_LOAD_CHUNK_SIZE if bulk_load else batch_size
+
+        # Existing keys are prefetched once instead of queried per batch
+        key_index = None
+        if composite and not bulk_load:
+            key_index = _KeyLookup(cursor, table_name, primary_key)
+        elif primary_key and not staging_merge and not bulk_load:
+            with metrics.phase('key_lookup'):
+                key_index = _build_key_index(cursor, table_name, primary_key,
+                                             column_types.get(primary_key))
+        if key_index is not None:
+            result['key_index'] = {
+                'mode': key_index.mode,
+                'keys': len(key_index),
+                'bytes': key_index.nbytes
+            }
+            logger.info(
+                f"Key index for {table_name}: mode={key_index.mode}, keys={len(key_index)}, bytes={key_index.nbytes}"
+            )
+
+        # Parallel writers each hold a pooled connection next to this one.
+        # A single writer still overlaps the database round trips with
+        # reading and converting the following chunks. The pool is shared
+        # by up to SYNC_WORKERS syncs, so each takes at most its share and
+        # only connections that are free right now
+        if (concurrency > 1 or pipeline
+            ) and not staging_merge and not bulk_load and not incremental:
+            share = max(DB_POOL_SIZE // max(SYNC_WORKERS, 1), 1)
+            requested = concurrency if concurrency > 1 else 1
+            writer_conns = _borrow_free_connections(
+                db_config, min(requested, share - 1))
+            result['writers'] = {'requested': requested,
+                                 'effective': len(writer_conns)}
+            if len(writer_conns) < requested:
+                logger.warning(
+                    f"Sync of {table_name} got {len(writer_conns)} of {requested} requested writer connection(s); DB_POOL_SIZE={DB_POOL_SIZE} is shared by SYNC_WORKERS={SYNC_WORKERS} syncs"
+                )
+            if writer_conns:
+                logger.info(
+                    f"Writing with {len(writer_conns)} background connection(s) of {concurrency} requested"
+                )
+                parallel_writer = _ParallelWriter(writer_conns, table_name,
+                                                  primary_key, upsert,
+                                                  key_index, metrics, rejects)
+                chunk_size = batch_size * len(writer_conns)
+            else:
+                logger.info("No spare connection for background writes, writing serially")
 
-        # Process one row at a time - safer in Replit
         rows_processed = 0
+        read_stats = {}
+
+        # Keys repeated within a chunk are collapsed to one row. Across
+        # chunks first-wins remembers the keys already written, while
+        # last-wins relies on later chunks overwriting earlier ones
+        key_columns = _key_columns(primary_key)
+        seen_keys = set() if duplicates == 'first' else None
 
-        # Use a much smaller batch size for Replit
-        batch_size = 1
+        logger.info(f"Reading Excel file: {excel_file}")
+        chunks = iter_workbook_chunks(excel_file, list(column_mapping.keys()),
+                                      chunk_size, row_limit, read_stats,
+                                      sheet_name)
+        for batch_df in metrics.timed_iter(chunks, 'read'):
+            # Map Excel columns to DB columns
+            with metrics.phase('map'):
+                df_mapped = pd.DataFrame({
+                    db_col: batch_df[excel_col]
+                    for excel_col, db_col in column_mapping.items()
+                    if excel_col in batch_df.columns
+                })
+            columns = list(df_mapped.columns)
+            batch_idx = rows_processed
+            chunk_rows = len(df_mapped)
+            row_numbers = list(range(batch_idx, batch_idx + chunk_rows))
 
-        for batch_idx in range(0, len(df_mapped), batch_size):
-            batch_df = df_mapped.iloc[batch_idx:batch_idx + batch_size]
+            # Rows the server would refuse are rejected without a round trip
+            if checks:
+                with metrics.phase('validate'):
+                    checked, valid, reasons = _validate_frame(
+                        df_mapped, checks)
+                if reasons:
+                    # Rejected rows keep their values as read, not coerced
+                    invalid = sorted(reasons)
+                    with metrics.phase('convert'):
+                        invalid_rows = _prepare_rows(
+                            df_mapped.iloc[invalid], column_types)
+                    for pos, row in zip(invalid, invalid_rows):
+                        code, message = reasons[pos]
+                        _record_error(result, code,
+                                      f"Row {row_numbers[pos] + 1}: {message}")
+                        rejects.add(row_numbers[pos], columns, row, code,
+                                    message)
+                    checked = checked[valid]
+                    row_numbers = [row_numbers[pos]
+                                   for pos in np.flatnonzero(valid)]
+                df_mapped = checked
 
-            for _, row in batch_df.iterrows():
-                try:
-                    # Convert NaN values to None and convert data types safely
-                    row_dict = {}
-                    row_values_debug = []
-                    for k, v in row.items():
-                        if pd.isna(v):
-                            row_dict[k] = None
-                            row_values_debug.append(f"{k}=NULL")
-                        elif isinstance(v, (int, float)):
-                            row_dict[k] = v
-                            row_values_debug.append(f"{k}={v}")
-                        else:
-                            # Convert to string and truncate if needed (prevent oversized data)
-                            val_str = str(v)
-                            if len(val_str
-                                   ) > 250:  # Keep under VARCHAR(255) limit
-                                val_str = val_str[:250]
-                            row_dict[k] = val_str
-                            row_values_debug.append(f"{k}={val_str[:20]}...")
-
-                    logger.info(
-                        f"Processing row {rows_processed + 1}: {', '.join(row_values_debug[:3])}..."
-                    )
+            # After validation, so a rejected row never displaces a valid
+            # occurrence of its key
+            if key_columns and set(key_columns) <= set(columns):
+                with metrics.phase('validate'):
+                    keep = _collapse_duplicates(df_mapped, key_columns,
+                                                duplicates, seen_keys)
+                collapsed = len(keep) - int(keep.sum())
+                if collapsed:
+                    result['duplicates'] += collapsed
+                    df_mapped = df_mapped[keep]
+                    row_numbers = [row_numbers[pos]
+                                   for pos in np.flatnonzero(keep)]
 
-                    # If we have a primary key, check if record exists
-                    if primary_key and primary_key in row_dict and row_dict[
-                            primary_key] is not None:
-                        # Check if record exists (safe query)
-                        check_sql = f"SELECT 1 FROM `{table_name}` WHERE `{primary_key}` = %s LIMIT 1"
-                        cursor.execute(check_sql, (row_dict[primary_key], ))
-                        record_exists = cursor.fetchone() is not None
-
-                        if record_exists:
-                            # Perform UPDATE with timeout prevention
-                            set_parts = []
-                            values = []
-
-                            for col, val in row_dict.items():
-                                if col != primary_key:
-                                    set_parts.append(f"`{col}` = %s")
-                                    values.append(val)
-
-                            values.append(
-                                row_dict[primary_key])  # For WHERE clause
-
-                            # Simplified UPDATE
-                            update_sql = f"UPDATE `{table_name}` SET {', '.join(set_parts)} WHERE `{primary_key}` = %s"
-
-                            logger.info(
-                                f"Executing UPDATE query: {update_sql} with primary key: {row_dict[primary_key]}"
-                            )
-                            cursor.execute(update_sql, values)
-                            result['updated'] += 1
-                            logger.info(
-                                f"UPDATE successful for record with primary key: {row_dict[primary_key]}"
-                            )
-                        else:
-                            # Perform INSERT
-                            columns = list(row_dict.keys())
-                            placeholders = ["%s"] * len(columns)
-
-                            # Simplified INSERT
-                            insert_sql = f"INSERT INTO `{table_name}` (`{'`, `'.join(columns)}`) VALUES ({', '.join(placeholders)})"
-
-                            logger.info(
-                                f"Executing INSERT query: {insert_sql} with {len(columns)} columns"
-                            )
-                            values_list = list(row_dict.values())
-                            cursor.execute(insert_sql, values_list)
-                            result['inserted'] += 1
-                            logger.info(f"INSERT successful, new record added")
-                    else:
-                        # No primary key, just INSERT
-                        columns = list(row_dict.keys())
-                        placeholders = ["%s"] * len(columns)
+            # rows is None from here on once there is nothing left to write
+            with metrics.phase('convert'):
+                rows = _prepare_rows(df_mapped, column_types,
+                                     result['truncated']) or None
 
-                        # Simplified INSERT
-                        insert_sql = f"INSERT INTO `{table_name}` (`{'`, `'.join(columns)}`) VALUES ({', '.join(placeholders)})"
+            # Staged rows are plain inserts; keys are matched at merge time
+            write_table, write_key, write_upsert = (table_name, primary_key,
+                                                    upsert)
+            if staging_merge and primary_key not in columns:
+                logger.info(
+                    "Staging merge skipped: the primary key column is not mapped"
+                )
+                staging_merge = False
+                counts = result
+            if staging_merge:
+                if staging_table is None:
+                    staging_table = _create_staging_table(
+                        cursor, table_name, columns, primary_key)
+                write_table, write_key, write_upsert = (staging_table, None,
+                                                        False)
 
-                        logger.info(
-                            f"Executing INSERT query (no PK): {insert_sql} with {len(columns)} columns"
+            if rows is not None and bulk_load:
+                try:
+                    with metrics.phase('write'):
+                        # Keys repeated in later chunks overwrite the
+                        # loaded ones, as an upsert would
+                        _bulk_load_chunk(
+                            conn, cursor, write_table, columns, rows, counts,
+                            replace=(write_upsert and duplicates == 'last'))
+                    rows = None
+                except mysql.connector.Error as err:
+                    conn.rollback()
+                    if err.errno in _LOCAL_INFILE_REJECTED:
+                        logger.warning(
+                            f"Server rejected LOAD DATA LOCAL INFILE ({err}), falling back to batched INSERTs"
                         )
-                        values_list = list(row_dict.values())
-                        cursor.execute(insert_sql, values_list)
-                        result['inserted'] += 1
-                        logger.info(
-                            f"INSERT successful, new record added (no PK match)"
+                        bulk_load = False
+                    else:
+                        logger.warning(
+                            f"Bulk load of rows starting at {row_numbers[0] + 1} failed ({err}), retrying with INSERTs"
                         )
 
-                    rows_processed += 1
+            if rows is not None and incremental and primary_key in columns:
+                with metrics.phase('key_lookup'):
+                    changed, fingerprints, unchanged = _split_unchanged(
+                        cursor, table_name, columns, rows,
+                        columns.index(primary_key))
+                result['unchanged'] += unchanged
+                for start in range(0, len(changed), batch_size):
+                    positions = changed[start:start + batch_size]
+                    failed = set(
+                        _write_chunk(conn, cursor, write_table, columns,
+                                     [rows[p] for p in positions], write_key,
+                                     write_upsert, counts, row_numbers[0],
+                                     key_index,
+                                     [row_numbers[p] for p in positions],
+                                     metrics, rejects))
+                    with metrics.phase('write'):
+                        _store_fingerprints(conn, cursor, table_name, [
+                            fp for offset, fp in enumerate(
+                                fingerprints[start:start + batch_size])
+                            if offset not in failed
+                        ])
+            elif rows is not None and parallel_writer is not None:
+                parallel_writer.submit(columns, rows, row_numbers)
+            elif rows is not None:
+                for start in range(0, len(rows), batch_size):
+                    _write_chunk(conn, cursor, write_table, columns,
+                                 rows[start:start + batch_size], write_key,
+                                 write_upsert, counts, row_numbers[start],
+                                 key_index if write_key else None,
+                                 row_numbers[start:start + batch_size],
+                                 metrics, rejects)
 
-                    # Commit after EVERY row in Replit environment
-                    conn.commit()
+            rows_processed += chunk_rows
+            progress = (parallel_writer.merged(result)
+                        if parallel_writer is not None else result)
+            if progress_callback:
+                progress_callback(progress, rows_processed)
+            progress_log.info(
+                f"Processed {rows_processed} of {result['total_rows']} rows (inserted: {progress['inserted']}, updated: {progress['updated']}, errors: {progress['errors']})"
+            )
 
-                    # Более безопасный вывод сообщения о результате
-                    operation_type = "Inserted"
-                    if 'record_exists' in locals() and record_exists:
-                        operation_type = "Updated"
-                    logger.info(
-                        f"Row {rows_processed} processed successfully: {operation_type}"
-                    )
+        if parallel_writer is not None:
+            writer, parallel_writer = parallel_writer, None
+            writer.close()
+            result.update(writer.merged(result))
+
+        if staging_table is not None:
+            logger.info(
+                f"Merging {staged['inserted']} staged rows into {table_name}")
+            with metrics.phase('write'):
+                inserted, updated = _merge_staging_table(
+                    conn, cursor, table_name, staging_table, columns,
+                    primary_key)
+            result['inserted'] += inserted
+            result['updated'] += updated
+        _merge_errors(result, staged)
+
+        if result['truncated']:
+            logger.warning(
+                f"Values cut to the column length in {table_name}: {result['truncated']}")
+
+        rejects.close()
+        if rejects.path:
+            result['reject_file'] = rejects.path
+            logger.info(f"Rows that could not be written saved to {rejects.path}")
 
-                except Exception as e:
-                    conn.rollback()  # Rollback on error
-                    logger.error(
-                        f"Error processing row {rows_processed}: {str(e)}")
-                    result['errors'] += 1
-                    result['error_messages'].append(str(e))
+        result['total_rows'] = rows_processed
+        metrics.bytes_read = read_stats.get('bytes_read', 0)
+        result['metrics'] = metrics.summary(rows_processed)
+        record_sync('done', result, result['metrics'])
 
         # Log completion statistics
         logger.info(
-            f"Sync completed. Processed {rows_processed} rows out of {orig_row_count}. Inserted: {result['inserted']}, Updated: {result['updated']}, Errors: {result['errors']}"
+            f"Sync completed. Processed {rows_processed} rows out of {orig_row_count}. Inserted: {result['inserted']}, Updated: {result['updated']}, Unchanged: {result['unchanged']}, Duplicates: {result['duplicates']}, Errors: {result['errors']}"
         )
+        logger.info(f"Sync metrics for {table_name}: {result['metrics']}")
 
         # Add note about partial processing
-        if orig_row_count > result['total_rows']:
-            if row_limit:
-                result[
-                    'note'] = f"Ограничение: Обработано {result['total_rows']} строк из {orig_row_count} согласно заданному лимиту ({row_limit})"
-            else:
-                result[
-                    'note'] = f"Внимание: Обработано только {result['total_rows']} строк из {orig_row_count} для предотвращения тайм-аутов в Replit"
+        if row_limit and orig_row_count and orig_row_count > result['total_rows']:
+            result[
+                'note'] = f"Ограничение: Обработано {result['total_rows']} строк из {orig_row_count} согласно заданному лимиту ({row_limit})"
 
         return result
 
     except Exception as e:
-        conn.rollback()
+        if conn is not None:
+            conn.rollback()
+        record_sync('failed')
         logger.error(f"Sync error: {str(e)}")
         raise Exception(f"Error during synchronization: {str(e)}")
     finally:
-        cursor.close()
-        conn.close()
+        if parallel_writer is not None:
+            try:
+                parallel_writer.close()
+            except Exception:
+                pass
+        if staging_table is not None:
+            try:
+                cursor.execute(
+                    f"DROP TEMPORARY TABLE IF EXISTS `{staging_table}`")
+            except Exception:
+                pass
+        rejects.close()
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
@@ -1,56 +1,611 @@
-import pandas as pd
+import os
+import pickle
+import shutil
+import tempfile
+import hashlib
 import logging
+import warnings
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from metrics_operations import timed_operation
 
 logger = logging.getLogger(__name__)
 
-def validate_excel_file(file_path):
+# Memory budget for parsed workbooks kept in this process
+WORKBOOK_CACHE_BYTES = int(
+    os.environ.get('WORKBOOK_CACHE_BYTES', 256 * 1024 * 1024))
+
+# Bumped whenever parsing changes, so copies stored by older code are redone
+_PARSE_VERSION = 2
+
+# Rows per record batch when a sheet is streamed into its Arrow copy
+_CONVERT_CHUNK_ROWS = 10000
+
+# Parsed DataFrames keyed by (path, mtime, size, sheet, parse version),
+# least recently used first
+_workbook_cache = OrderedDict()
+_workbook_cache_bytes = 0
+_workbook_cache_lock = threading.Lock()
+
+
+def _workbook_cache_key(file_path, sheet_name=None):
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size,
+            sheet_name, _PARSE_VERSION)
+
+
+def _copy_stamp(key):
+    """What an Arrow copy must record to be current: file version and parse."""
+    return repr(key[1:3] + key[4:]).encode('ascii')
+
+
+def _workbook_sidecar_path(file_path, sheet_name=None, suffix='parsed.pkl'):
+    if sheet_name is None:
+        return f"{file_path}.{suffix}"
+    digest = hashlib.md5(str(sheet_name).encode('utf-8')).hexdigest()[:12]
+    return f"{file_path}.{digest}.{suffix}"
+
+
+def _columnar_path(file_path, sheet_name=None):
+    return _workbook_sidecar_path(file_path, sheet_name, 'arrow')
+
+
+def _open_columnar(file_path, key):
+    """
+    Memory-map the Arrow copy of a sheet and return it as a pyarrow Table,
+    or None if there is no current copy (or pyarrow is not installed).
+    Columns are read straight from the mapped file without copying.
+    """
+    path = _columnar_path(file_path, key[3])
+    if not os.path.exists(path):
+        return None
+    try:
+        import pyarrow as pa
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    except ImportError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable columnar copy {path}: {str(e)}")
+        return None
+    metadata = table.schema.metadata or {}
+    if metadata.get(b'xls2mysql_key') != _copy_stamp(key):
+        return None
+    return table
+
+
+def _common_type(pa, types):
+    """
+    Return the Arrow type that holds every chunk's values of a column
+    without loss: chunks with no values take any type and integers widen
+    to floats, as when the whole sheet is parsed. None if there is none.
+    """
+    types = {t for t in types if not pa.types.is_null(t)}
+    if not types:
+        return pa.null()
+    if len(types) == 1:
+        return types.pop()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        return pa.float64()
+    return None
+
+
+def _convert_columnar(file_path, key):
+    """
+    Stream a sheet into an uncompressed Arrow IPC (Feather) copy that
+    later reads can memory-map, one record batch per chunk of
+    _CONVERT_CHUNK_ROWS rows, so the sheet is never held whole. Chunks
+    are spilled next to the copy until the column types that fit all of
+    them are known. Returns False when pyarrow is missing or a column
+    cannot be stored losslessly (mixed-type or non-string column names);
+    the caller then parses the sheet whole and pickles it instead.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return False
+    columns = read_excel_header(file_path, key[3])
+    if not all(isinstance(col, str) for col in columns):
+        return False
+
+    path = _columnar_path(file_path, key[3])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    spill_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(path)}.",
+                                 dir=os.path.dirname(path))
+    try:
+        spills, types = [], []
+        for chunk in iter_workbook_chunks(file_path,
+                                          chunk_size=_CONVERT_CHUNK_ROWS,
+                                          sheet_name=key[3]):
+            batch = pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+            spill = os.path.join(spill_dir, f"{len(spills)}.arrow")
+            with pa.OSFile(spill, 'wb') as sink:
+                with pa.ipc.new_file(sink, batch.schema) as writer:
+                    writer.write_batch(batch)
+            spills.append(spill)
+            types.append(batch.schema.types)
+
+        fields = []
+        for pos, col in enumerate(columns):
+            common = _common_type(pa, [chunk_types[pos]
+                                       for chunk_types in types])
+            if common is None:
+                raise TypeError(f"column {col} mixes value types")
+            fields.append(pa.field(col, common))
+        schema = pa.schema(fields,
+                           metadata={b'xls2mysql_key': _copy_stamp(key)})
+
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                for spill in spills:
+                    with pa.memory_map(spill) as source:
+                        table = pa.ipc.open_file(source).read_all()
+                        writer.write_table(table.cast(schema))
+        os.replace(tmp_path, path)
+        return True
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        logger.info(f"Keeping a pickled copy of {file_path}: no columnar copy ({str(e)})")
+        return False
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _load_workbook_sidecar(file_path, key):
+    """Load a parse stored next to the upload by another worker, if fresh."""
+    sidecar = _workbook_sidecar_path(file_path, key[3])
+    try:
+        with open(sidecar, 'rb') as f:
+            stored_key, df = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable workbook cache {sidecar}: {str(e)}")
+        return None
+    return df if stored_key == key else None
+
+
+def _store_workbook_sidecar(file_path, key, df):
+    sidecar = _workbook_sidecar_path(file_path, key[3])
+    tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((key, df), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, sidecar)
+    except Exception as e:
+        logger.warning(f"Could not write workbook cache {sidecar}: {str(e)}")
+
+
+def _remember_workbook(key, df):
+    """Add a parsed workbook to the in-memory LRU, evicting to stay in budget."""
+    global _workbook_cache_bytes
+    size = int(df.memory_usage(index=True, deep=True).sum())
+    with _workbook_cache_lock:
+        if key in _workbook_cache:
+            _workbook_cache_bytes -= _workbook_cache.pop(key)[1]
+        if size > WORKBOOK_CACHE_BYTES:
+            return
+        _workbook_cache[key] = (df, size)
+        _workbook_cache_bytes += size
+        while _workbook_cache_bytes > WORKBOOK_CACHE_BYTES:
+            _, (_, evicted_size) = _workbook_cache.popitem(last=False)
+            _workbook_cache_bytes -= evicted_size
+
+
+def _drop_blank_rows(df):
+    """
+    Make a full parse match what iter_workbook_chunks streams: rows with
+    no values are dropped, and number columns left as floats only by
+    those rows are whole numbers again.
+    """
+    blank = df.isna().all(axis=1).to_numpy()
+    if not blank.any():
+        return df
+    df = df[~blank].reset_index(drop=True)
+    for col in df.columns:
+        series = df[col]
+        if (pd.api.types.is_float_dtype(series) and len(series)
+                and series.notna().all()
+                and (np.mod(series.to_numpy(), 1) == 0).all()):
+            df[col] = series.astype(np.int64)
+    return df
+
+
+def read_workbook(file_path, sheet_name=None):
+    """
+    Return a parsed sheet of the Excel file as a DataFrame (the first
+    sheet unless sheet_name is given).
+    Each sheet is parsed once per file version, by streaming it into the
+    Arrow copy stored next to the upload (or, failing that, a pickled
+    copy of a full parse); later calls are served from the in-memory LRU
+    or from that copy. Rows with no values are dropped, as
+    when the sheet is streamed. The returned DataFrame is shared and must
+    not be modified in place.
+    """
+    key = _workbook_cache_key(file_path, sheet_name)
+    with _workbook_cache_lock:
+        entry = _workbook_cache.get(key)
+        if entry is not None:
+            _workbook_cache.move_to_end(key)
+            return entry[0]
+
+    table = _open_columnar(file_path, key)
+    df = table.to_pandas() if table is not None else _load_workbook_sidecar(
+        file_path, key)
+    if df is None:
+        logger.info(f"Parsing Excel file: {file_path}")
+        if _convert_columnar(file_path, key):
+            df = _open_columnar(file_path, key).to_pandas()
+        else:
+            df = _drop_blank_rows(
+                pd.read_excel(file_path,
+                              sheet_name=0 if sheet_name is None else sheet_name))
+            _store_workbook_sidecar(file_path, key, df)
+
+    _remember_workbook(key, df)
+    return df
+
+
+def clear_workbook_cache(file_path=None):
+    """Drop cached parses for one file (including its sidecars), or all files."""
+    global _workbook_cache_bytes
+    with _workbook_cache_lock:
+        if file_path is None:
+            _workbook_cache.clear()
+            _workbook_cache_bytes = 0
+            return
+        path = os.path.abspath(file_path)
+        for key in [k for k in _workbook_cache if k[0] == path]:
+            _workbook_cache_bytes -= _workbook_cache.pop(key)[1]
+    directory, name = os.path.split(path)
+    for entry in os.listdir(directory):
+        if entry.startswith(f"{name}.") and entry.endswith(
+            ('.parsed.pkl', '.arrow')):
+            try:
+                os.remove(os.path.join(directory, entry))
+            except FileNotFoundError:
+                pass
+
+
+def _cached_workbook(file_path, sheet_name=None):
+    """Return the in-memory parse of the sheet if there is one, else None."""
+    key = _workbook_cache_key(file_path, sheet_name)
+    with _workbook_cache_lock:
+        entry = _workbook_cache.get(key)
+        return entry[0] if entry is not None else None
+
+
+def _columnar_workbook(file_path, sheet_name=None):
+    """Return the memory-mapped Arrow copy of the sheet if there is one."""
+    return _open_columnar(file_path,
+                          _workbook_cache_key(file_path, sheet_name))
+
+
+def convert_workbook(file_path, sheet_names=None):
+    """
+    Stream the given sheets (all of them by default) into their columnar
+    copies without loading them, so later reads skip the Excel parser
+    entirely. Returns the names of the sheets that were converted.
+    """
+    all_sheets = get_sheet_names(file_path)
+    converted = []
+    for sheet_name in all_sheets if sheet_names is None else sheet_names:
+        try:
+            key = _workbook_cache_key(file_path, sheet_name)
+            if (_open_columnar(file_path, key) is None
+                    and not _convert_columnar(file_path, key)):
+                # Not storable as Arrow: parse it whole for the pickled copy
+                read_workbook(file_path, sheet_name)
+            converted.append(sheet_name)
+        except Exception as e:
+            logger.warning(f"Could not convert sheet {sheet_name} of {file_path}: {str(e)}")
+
+    # Readers that ask for the default sheet find the first sheet's copy
+    first_copy = _columnar_path(file_path, all_sheets[0]) if all_sheets else None
+    if first_copy and all_sheets[0] in converted and os.path.exists(first_copy):
+        default_copy = _columnar_path(file_path)
+        tmp_path = f"{default_copy}.{os.getpid()}.tmp"
+        os.link(first_copy, tmp_path)
+        os.replace(tmp_path, default_copy)
+    return converted
+
+
+def _normalize_header(values):
+    """Name header cells the same way pd.read_excel does."""
+    columns = []
+    counts = {}
+    for idx, value in enumerate(values):
+        name = f"Unnamed: {idx}" if value is None or value == '' else value
+        if name in counts:
+            counts[name] += 1
+            deduped = f"{name}.{counts[name]}"
+            while deduped in counts:
+                counts[name] += 1
+                deduped = f"{name}.{counts[name]}"
+            counts[deduped] = 0
+            name = deduped
+        else:
+            counts[name] = 0
+        columns.append(name)
+    return columns
+
+
+class _CountingFile:
+    """Binary file wrapper that counts the bytes read through it."""
+
+    def __init__(self, file):
+        self._file = file
+        self.bytes_read = 0
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def _iter_xlsx_rows(file_path, stats=None, sheet_name=None):
+    """Yield a sheet's rows as tuples using openpyxl's read-only mode."""
+    from openpyxl import load_workbook
+
+    source = _CountingFile(open(file_path, 'rb'))
+    try:
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            sheet = (workbook.worksheets[0]
+                     if sheet_name is None else workbook[sheet_name])
+            for row in sheet.iter_rows(values_only=True):
+                yield row
+        finally:
+            workbook.close()
+    finally:
+        source.close()
+        if stats is not None:
+            stats['bytes_read'] = stats.get('bytes_read', 0) + source.bytes_read
+
+
+def _iter_xls_rows(file_path, stats=None, sheet_name=None):
+    """Yield a sheet's rows as tuples using xlrd's on-demand mode."""
+    import xlrd
+
+    workbook = xlrd.open_workbook(file_path, on_demand=True)
+    if stats is not None:
+        # xlrd maps the whole file up front
+        stats['bytes_read'] = (stats.get('bytes_read', 0) +
+                               os.path.getsize(file_path))
+    try:
+        sheet = (workbook.sheet_by_index(0)
+                 if sheet_name is None else workbook.sheet_by_name(sheet_name))
+        for row_idx in range(sheet.nrows):
+            values = []
+            for cell in sheet.row(row_idx):
+                if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK,
+                                  xlrd.XL_CELL_ERROR):
+                    values.append(None)
+                elif cell.ctype == xlrd.XL_CELL_DATE:
+                    values.append(
+                        xlrd.xldate.xldate_as_datetime(cell.value,
+                                                       workbook.datemode))
+                elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                    values.append(bool(cell.value))
+                elif cell.ctype == xlrd.XL_CELL_NUMBER and cell.value.is_integer():
+                    values.append(int(cell.value))
+                else:
+                    values.append(cell.value)
+            yield tuple(values)
+    finally:
+        workbook.release_resources()
+
+
+def _iter_raw_rows(file_path, stats=None, sheet_name=None):
+    if file_path.lower().endswith('.xls'):
+        return _iter_xls_rows(file_path, stats, sheet_name)
+    return _iter_xlsx_rows(file_path, stats, sheet_name)
+
+
+def get_sheet_names(file_path):
+    """Return the names of the workbook's sheets in order."""
+    if file_path.lower().endswith('.xls'):
+        import xlrd
+        workbook = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            return workbook.sheet_names()
+        finally:
+            workbook.release_resources()
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+@timed_operation('count_workbook_rows')
+def count_workbook_rows(file_path, sheet_name=None):
+    """
+    Return the number of data rows in a sheet (the first by default)
+    without parsing it.
+    For .xlsx this relies on the sheet dimensions, so it is an estimate.
+    """
+    df = _cached_workbook(file_path, sheet_name)
+    if df is not None:
+        return len(df)
+    table = _columnar_workbook(file_path, sheet_name)
+    if table is not None:
+        return table.num_rows
+    try:
+        if file_path.lower().endswith('.xls'):
+            import xlrd
+            workbook = xlrd.open_workbook(file_path, on_demand=True)
+            try:
+                sheet = (workbook.sheet_by_index(0) if sheet_name is None
+                         else workbook.sheet_by_name(sheet_name))
+                return max(sheet.nrows - 1, 0)
+            finally:
+                workbook.release_resources()
+
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            sheet = (workbook.worksheets[0]
+                     if sheet_name is None else workbook[sheet_name])
+            max_row = sheet.max_row
+            return max(max_row - 1, 0) if max_row else None
+        finally:
+            workbook.close()
+    except Exception as e:
+        logger.warning(f"Could not count rows in {file_path}: {str(e)}")
+        return None
+
+
+def iter_workbook_chunks(file_path, columns=None, chunk_size=1000,
+                         row_limit=None, stats=None, sheet_name=None):
+    """
+    Yield a sheet (the first by default) as DataFrames of at most
+    chunk_size rows.
+    Only the requested columns are kept. Rows are read lazily, so memory
+    stays bounded by the chunk size unless the workbook is already cached.
+    If a stats dict is given, the bytes read from disk are added to its
+    'bytes_read' entry once the file is closed.
+    A columnar copy, when present, is read instead of the workbook with
+    only the requested columns converted, one chunk at a time.
+    """
+    df = _cached_workbook(file_path, sheet_name)
+    if df is not None:
+        if columns is not None:
+            df = df[[col for col in columns if col in df.columns]]
+        if row_limit:
+            df = df.head(row_limit)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+        return
+
+    table = _columnar_workbook(file_path, sheet_name)
+    if table is not None:
+        if columns is not None:
+            table = table.select(
+                [col for col in columns if col in table.column_names])
+        if row_limit:
+            table = table.slice(0, row_limit)
+        if stats is not None:
+            stats['bytes_read'] = stats.get('bytes_read', 0) + table.nbytes
+        for start in range(0, table.num_rows, chunk_size):
+            yield table.slice(start, chunk_size).to_pandas()
+        return
+
+    rows = _iter_raw_rows(file_path, stats, sheet_name)
+    try:
+        header = next(rows, None)
+        if header is None:
+            return
+        header = _normalize_header(header)
+        wanted = header if columns is None else [
+            c for c in columns if c in header
+        ]
+        positions = [header.index(col) for col in wanted]
+
+        chunk = []
+        emitted = 0
+        for row in rows:
+            if all(value is None or value == '' for value in row):
+                continue
+            chunk.append(tuple(row[i] if i < len(row) else None
+                               for i in positions))
+            if row_limit and emitted + len(chunk) >= row_limit:
+                break
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame.from_records(chunk, columns=wanted)
+                emitted += len(chunk)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame.from_records(chunk, columns=wanted)
+    finally:
+        rows.close()
+
+
+def read_excel_header(file_path, sheet_name=None):
+    """Return the column names of a sheet, reading only its header."""
+    df = _cached_workbook(file_path, sheet_name)
+    if df is not None:
+        return list(df.columns)
+    table = _columnar_workbook(file_path, sheet_name)
+    if table is not None:
+        return table.column_names
+    rows = _iter_raw_rows(file_path, sheet_name=sheet_name)
+    try:
+        header = next(rows, None)
+    finally:
+        rows.close()
+    return _normalize_header(header) if header is not None else []
+
+
+@timed_operation('validate_excel_file')
+def validate_excel_file(file_path, sheet_name=None):
     """
     Validate that the file is a valid Excel file that can be processed.
+    Only the header and the first data row of the sheet (the first one
+    by default) are read.
     Raises an exception if the file is invalid.
     """
     try:
-        # Attempt to read the file
-        df = pd.read_excel(file_path)
-        
-        # Check if there's data
-        if len(df) == 0:
-            raise Exception("Excel file contains no data")
-        
+        rows = _iter_raw_rows(file_path, sheet_name=sheet_name)
+        try:
+            header = next(rows, None)
+            has_data = any(
+                any(value is not None and value != '' for value in row)
+                for row in rows)
+        finally:
+            rows.close()
+
+        if header is None:
+            raise Exception("Excel file is empty")
+
         # Check if there are columns
-        if len(df.columns) == 0:
+        if all(value is None or value == '' for value in header):
             raise Exception("Excel file contains no columns")
+
+        # Check if there's data
+        if not has_data:
+            raise Exception("Excel file contains no data")
             
         return True
-    except pd.errors.EmptyDataError:
-        raise Exception("Excel file is empty")
-    except pd.errors.ParserError:
-        raise Exception("File is not a valid Excel file")
     except Exception as e:
         logger.error(f"Excel validation error: {str(e)}")
         raise Exception(f"Error validating Excel file: {str(e)}")
 
-def get_excel_columns(file_path):
+@timed_operation('get_excel_columns')
+def get_excel_columns(file_path, sheet_name=None):
     """
-    Get a list of column names from the Excel file.
+    Get a list of column names from a sheet of the Excel file.
     """
     try:
-        df = pd.read_excel(file_path)
-        return list(df.columns)
+        return read_excel_header(file_path, sheet_name)
     except Exception as e:
         logger.error(f"Error reading Excel columns: {str(e)}")
         raise Exception(f"Error reading Excel columns: {str(e)}")
 
-def get_excel_preview(file_path, rows=5):
+@timed_operation('get_excel_preview')
+def get_excel_preview(file_path, rows=5, sheet_name=None):
     """
-    Get a preview of the Excel data (first few rows).
+    Get a preview of the Excel data (first few rows of a sheet).
+    Only the header and the previewed rows are read from the file.
     """
     try:
-        df = pd.read_excel(file_path)
-        preview = df.head(rows)
+        columns = read_excel_header(file_path, sheet_name)
+        chunks = iter_workbook_chunks(file_path, chunk_size=rows,
+                                      row_limit=rows, sheet_name=sheet_name)
+        try:
+            preview = next(chunks, pd.DataFrame(columns=columns))
+        finally:
+            chunks.close()
         
         # Convert the preview to a list of dictionaries for easier template rendering
         preview_dict = preview.to_dict(orient="records")
-        columns = list(df.columns)
         
         return {
             'columns': columns,
@@ -60,76 +615,260 @@ def get_excel_preview(file_path, rows=5):
         logger.error(f"Error generating Excel preview: {str(e)}")
         raise Exception(f"Error generating Excel preview: {str(e)}")
 
-def infer_column_types(file_path):
+
+# Distinct values a column's date format is guessed from
+_DATE_GUESS_VALUES = 10
+
+
+def _date_format_candidates(text):
+    """
+    ISO 8601 plus the formats pandas guesses for the first distinct
+    values, in month-first and day-first order.
+    """
+    from pandas.tseries.api import guess_datetime_format
+
+    formats = ['ISO8601']
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for value in text.drop_duplicates().head(_DATE_GUESS_VALUES):
+            for dayfirst in (False, True):
+                fmt = guess_datetime_format(value, dayfirst=dayfirst)
+                # Nobody writes the year first and then the day
+                if fmt and fmt not in formats and not (
+                        dayfirst and fmt.startswith('%Y')):
+                    formats.append(fmt)
+    return formats
+
+
+def parse_date_strings(values, date_format=None):
+    """
+    Parse a Series of date strings with one format for all of them: ISO
+    8601 or a format guessed from the values. The format that reads the
+    most values wins; values it cannot read become NaT. When day-first and
+    month-first read the values equally well but disagree (e.g. only
+    '05/03/2025'), the dates cannot be told apart and parsed is None.
+    date_format, if given, is used instead of guessing.
+    Returns (parsed, date_format).
+    """
+    text = values.astype(str).str.strip()
+    if date_format is not None:
+        return pd.to_datetime(text, format=date_format,
+                              errors='coerce'), date_format
+
+    best, best_count = [], -1
+    for fmt in _date_format_candidates(text):
+        try:
+            parsed = pd.to_datetime(text, format=fmt, errors='coerce')
+        except (TypeError, ValueError):
+            # e.g. mixed time zones
+            continue
+        count = int(parsed.notna().sum())
+        if count > best_count:
+            best, best_count = [(fmt, parsed)], count
+        elif count == best_count:
+            best.append((fmt, parsed))
+    if not best:
+        raise ValueError("No date format reads these values")
+
+    fmt, parsed = best[0]
+    if best_count and any(not other.equals(parsed) for _, other in best[1:]):
+        return None, None
+    return parsed, fmt
+
+
+# (type, min, max) from narrowest to widest
+_UNSIGNED_INT_TYPES = [
+    ('TINYINT UNSIGNED', 0, 255),
+    ('SMALLINT UNSIGNED', 0, 65535),
+    ('MEDIUMINT UNSIGNED', 0, 16777215),
+    ('INT UNSIGNED', 0, 4294967295),
+    ('BIGINT UNSIGNED', 0, 18446744073709551615),
+]
+_SIGNED_INT_TYPES = [
+    ('TINYINT', -128, 127),
+    ('SMALLINT', -32768, 32767),
+    ('MEDIUMINT', -8388608, 8388607),
+    ('INT', -2147483648, 2147483647),
+    ('BIGINT', -9223372036854775808, 9223372036854775807),
+]
+_BOOLEAN_VALUES = {'true': 1, 'yes': 1, 'y': 1, 'false': 0, 'no': 0, 'n': 0}
+# Sampled text columns are sized for values this many times longer than
+# the longest one seen
+_SAMPLED_LENGTH_FACTOR = 2
+# Largest number of decimal places detected as a DECIMAL column
+_MAX_DECIMAL_SCALE = 6
+
+
+def parse_boolean_strings(values):
+    """
+    Map yes/no, true/false and y/n strings (in any case) to 1 and 0, the
+    values a BOOLEAN column stores; anything else becomes NaN.
+    """
+    return values.astype(str).str.strip().str.lower().map(_BOOLEAN_VALUES)
+
+
+def _integer_type(min_val, max_val):
+    types = _UNSIGNED_INT_TYPES if min_val >= 0 else _SIGNED_INT_TYPES
+    for name, low, high in types:
+        if min_val >= low and max_val <= high:
+            return name
+    return 'BIGINT'
+
+
+def _decimal_type(values):
+    """Return DECIMAL(p,s) if the floats have few decimal places, else None."""
+    for scale in range(1, _MAX_DECIMAL_SCALE + 1):
+        scaled = values * 10**scale
+        if np.all(np.abs(scaled - np.round(scaled)) < 1e-6):
+            integer_digits = len(str(int(np.max(np.abs(values)))))
+            precision = integer_digits + scale
+            return f'DECIMAL({precision},{scale})' if precision <= 65 else None
+    return None
+
+
+def _text_type(max_length):
+    if max_length <= 255:
+        return f'VARCHAR({max(max_length, 1)})'
+    elif max_length <= 65535:
+        return 'TEXT'
+    elif max_length <= 16777215:
+        return 'MEDIUMTEXT'
+    return 'LONGTEXT'
+
+
+def _profile_column(series, sampled=False):
+    """
+    Infer a MySQL type and basic statistics for one column. A sampled
+    column may hold longer text than was seen, so VARCHARs get headroom.
+    """
+    total = len(series)
+    values = series.dropna()
+    stats = {
+        'null_ratio': round(1 - len(values) / total, 4) if total else 1.0,
+        'max_length': None,
+        'min': None,
+        'max': None,
+    }
+    if len(values) == 0:
+        stats['type'] = 'VARCHAR(255)'
+        return stats
+
+    if pd.api.types.is_bool_dtype(values):
+        stats['type'] = 'BOOLEAN'
+        return stats
+
+    if pd.api.types.is_numeric_dtype(values):
+        array = values.to_numpy(dtype=np.float64)
+        stats['min'], stats['max'] = array.min().item(), array.max().item()
+        if pd.api.types.is_integer_dtype(values) or np.all(
+                np.mod(array, 1) == 0):
+            stats['min'], stats['max'] = int(stats['min']), int(stats['max'])
+            stats['type'] = _integer_type(stats['min'], stats['max'])
+        else:
+            stats['type'] = _decimal_type(array) or 'DOUBLE'
+        return stats
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        stats['min'], stats['max'] = str(values.min()), str(values.max())
+        stats['type'] = 'DATE' if (values == values.dt.normalize()).all() \
+            else 'DATETIME'
+        return stats
+
+    strings = values.astype(str) if pd.api.types.infer_dtype(
+        values, skipna=True) != 'string' else values
+    lengths = strings.str.len()
+    stats['max_length'] = int(lengths.max())
+
+    # Synced as 1 and 0
+    if parse_boolean_strings(strings).notna().all():
+        stats['type'] = 'BOOLEAN'
+        return stats
+
+    # Text that is entirely parseable as dates in one format; the length
+    # check keeps short codes and plain numbers from being read as dates
+    if lengths.min() >= 8:
+        try:
+            parsed, _ = parse_date_strings(strings)
+        except ValueError:
+            parsed = None
+        if parsed is not None and parsed.notna().all():
+            stats['min'], stats['max'] = str(parsed.min()), str(parsed.max())
+            stats['type'] = 'DATE' if (parsed == parsed.dt.normalize()).all() \
+                else 'DATETIME'
+            return stats
+
+    stats['type'] = _text_type(stats['max_length'] * _SAMPLED_LENGTH_FACTOR
+                               if sampled else stats['max_length'])
+    return stats
+
+
+@timed_operation('profile_columns')
+def _sample_workbook(file_path, sample_size, sheet_name=None):
+    """
+    Return (rows, sampled) with at most sample_size rows of a sheet.
+    A sheet that is already parsed or has a columnar copy gives an evenly
+    spread sample without touching the workbook; otherwise only its first
+    sample_size rows are streamed from the file.
+    """
+    df = _cached_workbook(file_path, sheet_name)
+    table = None if df is not None else _columnar_workbook(
+        file_path, sheet_name)
+    if df is not None or table is not None:
+        total = len(df) if df is not None else table.num_rows
+        if total <= sample_size:
+            return (df if df is not None else table.to_pandas()), False
+        # Systematic sample: every part of the sheet is represented
+        positions = np.unique(
+            np.linspace(0, total - 1, sample_size).astype(int))
+        if df is not None:
+            return df.iloc[positions], True
+        return table.take(positions).to_pandas(), True
+
+    # One row past the sample tells whether the sheet has more
+    chunks = iter_workbook_chunks(file_path, chunk_size=sample_size + 1,
+                                  row_limit=sample_size + 1,
+                                  sheet_name=sheet_name)
+    try:
+        df = next(chunks, None)
+    finally:
+        chunks.close()
+    if df is None:
+        return pd.DataFrame(
+            columns=read_excel_header(file_path, sheet_name)), False
+    return df.head(sample_size), len(df) > sample_size
+
+
+def profile_columns(file_path, sample_size=None, sheet_name=None):
+    """
+    Infer a MySQL type for every Excel column along with its statistics:
+    null_ratio, max_length, min and max. With sample_size, at most that
+    many rows are read (see _sample_workbook); when the sheet has more,
+    confidence is 'estimated' and text columns are sized with room for
+    longer values.
+    """
+    if sample_size:
+        df, sampled = _sample_workbook(file_path, sample_size, sheet_name)
+    else:
+        df, sampled = read_workbook(file_path, sheet_name), False
+
+    profiles = {}
+    for col in df.columns:
+        profile = _profile_column(df[col], sampled)
+        profile['confidence'] = 'estimated' if sampled else 'exact'
+        profiles[col] = profile
+    return profiles
+
+
+def infer_column_types(file_path, sample_size=None, sheet_name=None):
     """
     Infer MySQL column types from Excel data.
     """
     try:
-        df = pd.read_excel(file_path)
-        column_types = {}
-        
-        for col in df.columns:
-            # Check for numeric columns
-            if pd.api.types.is_numeric_dtype(df[col]):
-                # Check if it's integer-like
-                if df[col].dropna().apply(lambda x: x.is_integer() if hasattr(x, 'is_integer') else True).all():
-                    # Check for size
-                    max_val = df[col].max()
-                    min_val = df[col].min()
-                    
-                    if pd.isna(max_val) or pd.isna(min_val):
-                        column_types[col] = 'INT'
-                    elif min_val >= 0:
-                        if max_val <= 255:
-                            column_types[col] = 'TINYINT UNSIGNED'
-                        elif max_val <= 65535:
-                            column_types[col] = 'SMALLINT UNSIGNED'
-                        elif max_val <= 16777215:
-                            column_types[col] = 'MEDIUMINT UNSIGNED'
-                        elif max_val <= 4294967295:
-                            column_types[col] = 'INT UNSIGNED'
-                        else:
-                            column_types[col] = 'BIGINT UNSIGNED'
-                    else:
-                        if min_val >= -128 and max_val <= 127:
-                            column_types[col] = 'TINYINT'
-                        elif min_val >= -32768 and max_val <= 32767:
-                            column_types[col] = 'SMALLINT'
-                        elif min_val >= -8388608 and max_val <= 8388607:
-                            column_types[col] = 'MEDIUMINT'
-                        elif min_val >= -2147483648 and max_val <= 2147483647:
-                            column_types[col] = 'INT'
-                        else:
-                            column_types[col] = 'BIGINT'
-                else:
-                    # It's a float/double
-                    column_types[col] = 'DOUBLE'
-            
-            # Check for datetime
-            elif pd.api.types.is_datetime64_dtype(df[col]):
-                column_types[col] = 'DATETIME'
-            
-            # Check for date
-            elif pd.api.types.is_period_dtype(df[col]):
-                column_types[col] = 'DATE'
-            
-            # Default to VARCHAR
-            else:
-                # Calculate max length
-                max_length = df[col].astype(str).str.len().max()
-                if pd.isna(max_length) or max_length <= 0:
-                    max_length = 255
-                
-                if max_length <= 255:
-                    column_types[col] = f'VARCHAR({max_length})'
-                elif max_length <= 65535:
-                    column_types[col] = 'TEXT'
-                elif max_length <= 16777215:
-                    column_types[col] = 'MEDIUMTEXT'
-                else:
-                    column_types[col] = 'LONGTEXT'
-        
-        return column_types
+        profiles = profile_columns(file_path, sample_size, sheet_name)
+        return {col: profile['type'] for col, profile in profiles.items()}
     except Exception as e:
         logger.error(f"Error inferring column types: {str(e)}")
-        return {col: 'VARCHAR(255)' for col in get_excel_columns(file_path)}
+        return {
+            col: 'VARCHAR(255)'
+            for col in get_excel_columns(file_path, sheet_name)
+        }
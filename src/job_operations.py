@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from db_operations import SYNC_WORKERS, perform_sync
+
+logger = logging.getLogger(__name__)
+
+# SQLite file shared by all worker processes so any of them can answer polls
+JOB_DB_PATH = os.environ.get(
+    'JOB_DB_PATH', os.path.join(tempfile.gettempdir(), 'xls2mysql_jobs.db'))
+
+# Background thread pools of this process, by name
+_executors = {}
+_executor_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    pid INTEGER,
+    table_name TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    total_rows INTEGER DEFAULT 0,
+    rows_processed INTEGER DEFAULT 0,
+    inserted INTEGER DEFAULT 0,
+    updated INTEGER DEFAULT 0,
+    errors INTEGER DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    group_id TEXT,
+    sheet_name TEXT
+)
+"""
+
+# Columns added after the first release, for job stores created before them
+_ADDED_COLUMNS = ['group_id TEXT', 'sheet_name TEXT']
+
+
+def _connect():
+    conn = sqlite3.connect(JOB_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute(_SCHEMA)
+    existing = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for column in _ADDED_COLUMNS:
+        if column.split()[0] not in existing:
+            conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+    return conn
+
+
+def _update_job(job_id, **fields):
+    assignments = ', '.join(f"{name} = ?" for name in fields)
+    with _connect() as conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?",
+                     list(fields.values()) + [job_id])
+
+
+def _get_executor(name='sync-job', max_workers=SYNC_WORKERS):
+    """Return this process's thread pool called name, creating it once."""
+    with _executor_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=max_workers,
+                                                  thread_name_prefix=name)
+        return _executors[name]
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _run_sync_job(job_id, sync_args, sync_kwargs):
+    started_at = time.time()
+    _update_job(job_id, status='running', started_at=started_at)
+    last_update = 0.0
+
+    def report_progress(result, rows_processed):
+        # Throttle writes to the job store; the final state is always saved
+        nonlocal last_update
+        now = time.time()
+        if now - last_update < 0.5:
+            return
+        last_update = now
+        _update_job(job_id,
+                    total_rows=result['total_rows'],
+                    rows_processed=rows_processed,
+                    inserted=result['inserted'],
+                    updated=result['updated'],
+                    errors=result['errors'])
+
+    try:
+        result = perform_sync(*sync_args,
+                              progress_callback=report_progress,
+                              **sync_kwargs)
+        _update_job(job_id,
+                    status='done',
+                    finished_at=time.time(),
+                    total_rows=result['total_rows'],
+                    rows_processed=result['total_rows'],
+                    inserted=result['inserted'],
+                    updated=result['updated'],
+                    errors=result['errors'],
+                    result=json.dumps(result, default=str))
+        logger.info(f"Sync job {job_id} finished")
+    except Exception as e:
+        logger.error(f"Sync job {job_id} failed: {str(e)}")
+        _update_job(job_id,
+                    status='failed',
+                    finished_at=time.time(),
+                    error=str(e))
+
+
+def submit_sync_job(db_config,
+                    excel_file,
+                    table_name,
+                    column_mapping,
+                    primary_key=None,
+                    row_limit=None,
+                    group_id=None,
+                    **sync_kwargs):
+    """
+    Queue a perform_sync run in the background and return its job id.
+    Jobs submitted with the same group_id (one per sheet of a workbook)
+    run concurrently, up to SYNC_WORKERS at a time.
+    """
+    job_id = uuid.uuid4().hex
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, status, pid, table_name, created_at, "
+            "group_id, sheet_name) VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, os.getpid(), table_name, time.time(), group_id,
+             sync_kwargs.get('sheet_name')))
+
+    sync_args = (db_config, excel_file, table_name, column_mapping,
+                 primary_key, row_limit)
+    _get_executor().submit(_run_sync_job, job_id, sync_args, sync_kwargs)
+    logger.info(f"Queued sync job {job_id} for table '{table_name}'")
+    return job_id
+
+
+def get_job(job_id):
+    """
+    Return the state of a sync job as a dictionary, or None if unknown.
+    Jobs whose worker process has died are reported as failed.
+    """
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?",
+                           (job_id, )).fetchone()
+    if row is None:
+        return None
+
+    job = dict(row)
+    job['result'] = json.loads(job['result']) if job['result'] else None
+
+    if job['status'] in ('queued', 'running') and not _process_alive(
+            job['pid']):
+        job['status'] = 'failed'
+        job['error'] = 'Sync was interrupted because the server restarted'
+        _update_job(job_id, status='failed', error=job['error'])
+
+    elapsed = None
+    if job['started_at']:
+        elapsed = (job['finished_at'] or time.time()) - job['started_at']
+    job['elapsed_seconds'] = round(elapsed, 2) if elapsed else 0
+    job['rows_per_second'] = (round(job['rows_processed'] / elapsed, 1)
+                              if elapsed else 0)
+    return job
+
+
+def get_job_group(group_id):
+    """Return the jobs submitted with group_id, oldest first."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT id FROM jobs WHERE group_id = ? ORDER BY created_at, rowid",
+            (group_id, )).fetchall()
+    return [job for job in (get_job(row['id']) for row in rows) if job]
@@ -0,0 +1,210 @@
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# Phases a sync's wall time is broken down into, in pipeline order
+SYNC_PHASES = ('read', 'map', 'validate', 'key_lookup', 'convert', 'write',
+               'commit')
+
+# Process-wide totals exposed on /metrics; each worker process keeps its own
+_registry_lock = threading.Lock()
+_counters = {}
+
+
+def _increment(name, labels=(), amount=1):
+    with _registry_lock:
+        key = (name, tuple(labels))
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+class SyncMetrics:
+    """
+    Timings and counters for one sync.
+    Phase times are exclusive: time spent in a nested phase (a commit
+    inside a write) is only counted once. With parallel writers the phase
+    times of all threads are added up, so they can exceed the wall time.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = dict.fromkeys(SYNC_PHASES, 0.0)
+        self.round_trips = 0
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def phase(self, name):
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                self.timings[name] = (self.timings.get(name, 0.0) + elapsed -
+                                      nested)
+
+    def timed_iter(self, iterable, name):
+        """Yield from iterable, timing each step under the given phase."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count_round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+
+    def instrument(self, conn):
+        """Wrap a connection so its cursors and commits are measured."""
+        return _InstrumentedConnection(conn, self)
+
+    def summary(self, rows):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(rows / elapsed, 1) if elapsed else 0,
+            'bytes_read': self.bytes_read,
+            'round_trips': self.round_trips,
+            'phases': {name: round(seconds, 3)
+                       for name, seconds in self.timings.items()},
+        }
+
+
+def timed(metrics, name):
+    """metrics.phase(name), or a no-op when no metrics are collected."""
+    return metrics.phase(name) if metrics is not None else nullcontext()
+
+
+class _InstrumentedCursor:
+    """Counts every statement sent to the server."""
+
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, *args, **kwargs):
+        self._metrics.count_round_trip()
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._metrics.count_round_trip()
+        return self._cursor.executemany(*args, **kwargs)
+
+
+class _InstrumentedConnection:
+    """Hands out counting cursors and times commits."""
+
+    def __init__(self, conn, metrics):
+        self._conn = conn
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return _InstrumentedCursor(self._conn.cursor(*args, **kwargs),
+                                   self._metrics)
+
+    def commit(self):
+        self._metrics.count_round_trip()
+        with self._metrics.phase('commit'):
+            return self._conn.commit()
+
+    def rollback(self):
+        self._metrics.count_round_trip()
+        return self._conn.rollback()
+
+    def close(self):
+        return self._conn.close()
+
+
+def record_sync(status, result=None, summary=None):
+    """Add a finished sync to the process-wide totals."""
+    _increment('xls2mysql_syncs_total', [('status', status)])
+    if result:
+        for outcome in ('inserted', 'updated', 'unchanged', 'duplicates',
+                        'errors'):
+            _increment('xls2mysql_sync_rows_total', [('outcome', outcome)],
+                       result.get(outcome, 0))
+    if summary:
+        for name, seconds in summary['phases'].items():
+            _increment('xls2mysql_sync_phase_seconds_total',
+                       [('phase', name)], seconds)
+        _increment('xls2mysql_sync_round_trips_total', amount=summary['round_trips'])
+        _increment('xls2mysql_sync_bytes_read_total', amount=summary['bytes_read'])
+
+
+def timed_operation(name):
+    """Decorator recording call counts and total seconds of a helper."""
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _increment('xls2mysql_operation_calls_total',
+                           [('operation', name)])
+                _increment('xls2mysql_operation_seconds_total',
+                           [('operation', name)],
+                           time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def render_metrics():
+    """Return the process-wide totals in the Prometheus text format."""
+    with _registry_lock:
+        counters = sorted(_counters.items())
+    lines = []
+    declared = set()
+    for (name, labels), value in counters:
+        if name not in declared:
+            lines.append(f"# TYPE {name} counter")
+            declared.add(name)
+        label_text = ','.join(f'{key}="{val}"' for key, val in labels)
+        if label_text:
+            label_text = '{' + label_text + '}'
+        if isinstance(value, float):
+            value = round(value, 6)
+        lines.append(f"{name}{label_text} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+class SampledLogger:
+    """
+    Logs a progress message at most once per interval, so per-batch
+    logging stays cheap on large syncs. The last message can be forced.
+    """
+
+    def __init__(self, log, interval=5.0):
+        self.log = log
+        self.interval = interval
+        self.last = 0.0
+
+    def info(self, message, force=False):
+        now = time.monotonic()
+        if force or now - self.last >= self.interval:
+            self.last = now
+            self.log.info(message)
@@ -0,0 +1,315 @@
+import os
+import time
+import base64
+import pickle
+import sqlite3
+import secrets
+import logging
+import tempfile
+from flask import session
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+# Where wizard state is kept: 'sqlite' (default) or 'file' on the server,
+# or 'cookie' for Flask's signed cookie session
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'sqlite')
+
+# SQLite file shared by all worker processes, in a directory of its own
+# so that it can be private to the owner
+SESSION_DB_PATH = os.environ.get(
+    'SESSION_DB_PATH',
+    os.path.join(tempfile.gettempdir(), 'xls2mysql_session_db',
+                 'sessions.db'))
+
+# Directory of the 'file' backend, one file per session
+SESSION_DIR = os.environ.get(
+    'SESSION_DIR', os.path.join(tempfile.gettempdir(), 'xls2mysql_sessions'))
+
+# Sessions not written for this long are removed
+SESSION_LIFETIME = int(os.environ.get('SESSION_LIFETIME', 24 * 3600))
+
+_SID_BYTES = 32
+
+# The database password is never stored as is: the store keeps it XORed
+# with a random pad of the same length and the pad travels in this cookie
+# (suffixed to the session cookie name), so neither side alone reveals it
+_PAD_COOKIE_SUFFIX = '_pad'
+_MASKED_PASSWORD = '_masked_password'
+
+
+def _valid_sid(sid):
+    return len(sid) == _SID_BYTES * 2 and all(c in '0123456789abcdef'
+                                              for c in sid)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data held on the server under an opaque id."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid or secrets.token_hex(_SID_BYTES)
+        self.new = new
+        self.modified = False
+
+
+class SQLiteSessionStore:
+    """Sessions pickled into one SQLite table, readable by the owner only."""
+
+    def __init__(self, path):
+        self.path = path
+        self._prepared = False
+
+    def _prepare(self):
+        """Create the database file 0600 before SQLite does (it would use
+        the umask, usually 0644); its journals inherit the file's mode."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o600)
+        os.close(fd)
+        # Files left by earlier versions were created world-readable
+        os.chmod(self.path, 0o600)
+        self._prepared = True
+
+    def _connect(self):
+        if not self._prepared:
+            self._prepare()
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        return conn
+
+    def load(self, sid):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND expires_at > ?",
+                (sid, time.time())).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def save(self, sid, data):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at) "
+                "VALUES (?, ?, ?)",
+                (sid, pickle.dumps(data), time.time() + SESSION_LIFETIME))
+
+    def delete(self, sid):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (sid, ))
+
+    def remove_expired(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?",
+                         (time.time(), ))
+
+
+class FileSessionStore:
+    """Sessions pickled into one file each, readable by the owner only."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        path = self._path(sid)
+        try:
+            if os.path.getmtime(path) + SESSION_LIFETIME <= time.time():
+                return None
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def save(self, sid, data):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = self._path(sid)
+        fd = os.open(f"{path}.tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                     0o600)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(data, f)
+        os.replace(f"{path}.tmp", path)
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def remove_expired(self):
+        if not os.path.isdir(self.directory):
+            return
+        cutoff = time.time() - SESSION_LIFETIME
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) <= cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Keeps the session in a server-side store; the cookie only carries the
+    session id. Any store with load, save, delete and remove_expired can
+    be plugged in.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        name = self.get_cookie_name(app)
+        sid = request.cookies.get(name)
+        if sid and _valid_sid(sid):
+            data = self.store.load(sid)
+            if data is not None:
+                _unmask_password(
+                    data, request.cookies.get(name + _PAD_COOKIE_SUFFIX))
+                return ServerSession(data, sid)
+        return ServerSession(new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+                response.delete_cookie(name + _PAD_COOKIE_SUFFIX,
+                                       domain=domain,
+                                       path=path)
+            return
+        if not session.modified:
+            return
+
+        if session.new:
+            # New sessions are rare enough to sweep the expired ones
+            self.store.remove_expired()
+        data, pad = _mask_password(dict(session))
+        self.store.save(session.sid, data)
+        response.vary.add('Cookie')
+        cookies = [(name, session.sid)]
+        if pad is not None:
+            cookies.append((name + _PAD_COOKIE_SUFFIX, pad))
+        for cookie_name, value in cookies:
+            response.set_cookie(cookie_name,
+                                value,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=domain,
+                                path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+
+def _xor(data, pad):
+    return bytes(a ^ b for a, b in zip(data, pad))
+
+
+def _mask_password(data):
+    """
+    Return data with the database password replaced by its XOR with a
+    fresh random pad, and the pad (base64) for the client's cookie, or
+    None when there is no password to hide.
+    """
+    db_config = data.get('db_config')
+    if not db_config or not db_config.get('password'):
+        return data, None
+    password = db_config['password'].encode('utf-8')
+    pad = secrets.token_bytes(len(password))
+    data['db_config'] = {k: v for k, v in db_config.items() if k != 'password'}
+    data[_MASKED_PASSWORD] = _xor(password, pad)
+    return data, base64.urlsafe_b64encode(pad).decode('ascii')
+
+
+def _unmask_password(data, pad):
+    """
+    Put the password back into data['db_config'] using the cookie's pad.
+    Without a matching pad the connection settings are dropped, which
+    sends the user back to the connection page.
+    """
+    masked = data.pop(_MASKED_PASSWORD, None)
+    if masked is None or 'db_config' not in data:
+        return
+    try:
+        pad = base64.urlsafe_b64decode(pad or '')
+        if len(pad) != len(masked):
+            raise ValueError("pad does not match the password")
+        password = _xor(masked, pad).decode('utf-8')
+    except ValueError:
+        del data['db_config']
+        return
+    data['db_config'] = dict(data['db_config'], password=password)
+
+
+def init_session(app):
+    """Install the session backend selected by SESSION_BACKEND."""
+    if SESSION_BACKEND == 'cookie':
+        return
+    if SESSION_BACKEND == 'sqlite':
+        store = SQLiteSessionStore(SESSION_DB_PATH)
+    elif SESSION_BACKEND == 'file':
+        store = FileSessionStore(SESSION_DIR)
+    else:
+        raise Exception(f"Unknown session backend: {SESSION_BACKEND}")
+    app.session_interface = ServerSessionInterface(store)
+    logger.info(f"Keeping sessions server-side ({SESSION_BACKEND})")
+
+
+def _upload_identity():
+    """The uploaded file and its version, so a re-upload is told apart."""
+    excel_file = session.get('excel_file')
+    try:
+        stat = os.stat(excel_file)
+        return (excel_file, stat.st_mtime_ns, stat.st_size)
+    except (OSError, TypeError):
+        return (excel_file, None, None)
+
+
+def session_artifact(name, compute, *key):
+    """
+    Return what was derived from the current upload under name and key
+    (e.g. the preview of a sheet), computing and keeping it in the session
+    on first use. Artifacts are dropped when another file is uploaded.
+    With cookie sessions nothing is kept and compute runs every time.
+    """
+    if not isinstance(session, ServerSession):
+        return compute()
+
+    artifacts = session.get('artifacts')
+    identity = _upload_identity()
+    if artifacts is None or artifacts['upload'] != identity:
+        artifacts = {'upload': identity, 'items': {}}
+        session['artifacts'] = artifacts
+
+    item_key = (name, ) + key
+    if item_key not in artifacts['items']:
+        artifacts['items'][item_key] = compute()
+        session.modified = True
+    return artifacts['items'][item_key]
+
+
+def drop_session_artifacts(name, *key):
+    """Forget the artifacts stored under name (and key, if given)."""
+    artifacts = session.get('artifacts')
+    if not artifacts:
+        return
+    for item_key in list(artifacts['items']):
+        if item_key[0] == name and item_key[1:len(key) + 1] == key:
+            del artifacts['items'][item_key]
+            session.modified = True
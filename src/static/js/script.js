@@ -57,10 +57,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     return;
                 }
                 
-                // Check file size (max 16MB)
-                const maxSize = 16 * 1024 * 1024; // 16MB in bytes
+                // Check file size against the server-side upload limit
+                const maxSizeMb = parseInt(fileInput.dataset.maxSizeMb, 10) || 16;
+                const maxSize = maxSizeMb * 1024 * 1024; // in bytes
                 if (file.size > maxSize) {
-                    showAlert('error', 'File size exceeds the maximum limit of 16MB.');
+                    showAlert('error', `File size exceeds the maximum limit of ${maxSizeMb}MB.`);
                     fileInput.value = '';
                     return;
                 }
@@ -68,6 +69,28 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Upload large workbooks in resumable chunks instead of one request
+    const uploadForm = document.getElementById('uploadForm');
+    if (uploadForm && window.fetch && window.Blob && Blob.prototype.slice) {
+        uploadForm.addEventListener('submit', function(event) {
+            if (!fileInput || fileInput.files.length === 0) {
+                return;
+            }
+            event.preventDefault();
+            const submitButton = uploadForm.querySelector('button[type="submit"]');
+            submitButton.disabled = true;
+            uploadInChunks(uploadForm.dataset.uploadUrl, fileInput.files[0])
+                .then(upload => {
+                    window.location = `${uploadForm.dataset.uploadUrl}/${upload.id}/select`;
+                })
+                .catch(error => {
+                    submitButton.disabled = false;
+                    setUploadProgress(null, '');
+                    showAlert('error', error.message);
+                });
+        });
+    }
+    
     // Show auto-generated DB column name when typing in new table creation
     const newTableInputs = document.querySelectorAll('input[name^="mapping_"]');
     if (newTableInputs.length > 0) {
@@ -164,3 +187,121 @@ function showAlert(type, message) {
         }, 5000);
     }
 }
+
+// Upload progress bar under the file input; a null percent hides it
+function setUploadProgress(percent, message) {
+    const container = document.getElementById('uploadProgressContainer');
+    if (!container) {
+        return;
+    }
+    container.classList.toggle('d-none', percent === null);
+    document.getElementById('uploadProgress').style.width = (percent || 0) + '%';
+    document.getElementById('uploadStatus').textContent = message;
+}
+
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+async function readJson(response) {
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok && response.status !== 409 && response.status !== 460) {
+        const error = new Error(data.error || `Upload failed (${response.status})`);
+        error.retryable = response.status >= 500;
+        throw error;
+    }
+    return {status: response.status, data: data};
+}
+
+// SHA-256 of a chunk as base64, when the browser allows it (HTTPS or localhost)
+async function chunkChecksum(chunk) {
+    if (!window.crypto || !crypto.subtle) {
+        return null;
+    }
+    const digest = await crypto.subtle.digest('SHA-256', await chunk.arrayBuffer());
+    return 'sha256 ' + btoa(String.fromCharCode(...new Uint8Array(digest)));
+}
+
+// Send the file in chunks, resuming an earlier attempt of the same file,
+// then wait until the server has parsed it
+async function uploadInChunks(baseUrl, file) {
+    const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    let upload = null;
+    
+    const previousId = localStorage.getItem(resumeKey);
+    if (previousId) {
+        const response = await fetch(`${baseUrl}/${previousId}`);
+        if (response.ok) {
+            upload = await response.json();
+            if (upload.status === 'invalid') {
+                upload = null;
+            }
+        }
+    }
+    if (!upload) {
+        const response = await fetch(baseUrl, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({filename: file.name, size: file.size}),
+        });
+        upload = (await readJson(response)).data;
+        localStorage.setItem(resumeKey, upload.id);
+    }
+    
+    let offset = upload.offset;
+    let failures = 0;
+    while (upload.status === 'uploading' && offset < file.size) {
+        const percent = Math.floor(offset * 100 / file.size);
+        setUploadProgress(percent, `Uploading... ${percent}%`);
+        const chunk = file.slice(offset, offset + upload.chunk_size);
+        const headers = {
+            'Content-Type': 'application/offset+octet-stream',
+            'Upload-Offset': String(offset),
+        };
+        const checksum = await chunkChecksum(chunk);
+        if (checksum) {
+            headers['Upload-Checksum'] = checksum;
+        }
+        try {
+            const result = await readJson(await fetch(`${baseUrl}/${upload.id}`, {
+                method: 'PATCH',
+                headers: headers,
+                body: chunk,
+            }));
+            if (result.status === 409 || result.status === 460) {
+                // Out of sync with the server or corrupted in transit: resume
+                // from the offset the server has
+                offset = result.data.offset;
+                failures += 1;
+            } else {
+                upload = result.data;
+                offset = upload.offset;
+                failures = 0;
+            }
+        } catch (error) {
+            if (error.retryable === false) {
+                throw error;
+            }
+            failures += 1;
+            setUploadProgress(percent, 'Connection lost, retrying...');
+        }
+        if (failures > 5) {
+            throw new Error('Upload failed repeatedly. Select the file again to resume.');
+        }
+        if (failures > 0) {
+            await sleep(1000 * failures);
+        }
+    }
+    
+    setUploadProgress(100, 'Reading the workbook...');
+    while (upload.status === 'uploading' || upload.status === 'processing') {
+        await sleep(1000);
+        const response = await fetch(`${baseUrl}/${upload.id}`);
+        upload = (await readJson(response)).data;
+    }
+    localStorage.removeItem(resumeKey);
+    if (upload.status !== 'ready') {
+        throw new Error(`Invalid Excel file: ${upload.error || upload.status}`);
+    }
+    return upload;
+}
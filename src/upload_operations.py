@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import fcntl
+import base64
+import shutil
+import hashlib
+import logging
+import tempfile
+from werkzeug.utils import secure_filename
+from excel_operations import (get_sheet_names, validate_excel_file,
+                              get_excel_columns, convert_workbook,
+                              clear_workbook_cache)
+from job_operations import _get_executor, _process_alive
+
+logger = logging.getLogger(__name__)
+
+# Partial and finished uploads, one directory per upload so any worker
+# process can append to or inspect it
+UPLOAD_DIR = os.environ.get(
+    'UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'xls2mysql_uploads'))
+
+# Largest body accepted for one chunk
+UPLOAD_CHUNK_BYTES = int(
+    os.environ.get('UPLOAD_CHUNK_BYTES', 8 * 1024 * 1024))
+
+# Unfinished uploads untouched for this long are removed, and so are
+# finished ones (with their parsed copies) this long after processing
+UPLOAD_EXPIRY_SECONDS = int(
+    os.environ.get('UPLOAD_EXPIRY_SECONDS', 24 * 3600))
+
+# Uploads parsed and profiled at the same time in this process
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 2))
+
+_COPY_BUFFER = 1024 * 1024
+
+
+class UploadError(Exception):
+    """A chunk was rejected; status is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def _upload_path(upload_id, name):
+    if not upload_id or not upload_id.isalnum():
+        raise UploadError('Unknown upload', 404)
+    return os.path.join(UPLOAD_DIR, upload_id, name)
+
+
+def _read_state(upload_id):
+    try:
+        with open(_upload_path(upload_id, 'state.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadError('Unknown upload', 404)
+
+
+def _write_state(state):
+    path = _upload_path(state['id'], 'state.json')
+    state['updated_at'] = time.time()
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+class _StateLock:
+    """Exclusive lock on one upload across threads and worker processes."""
+
+    def __init__(self, upload_id):
+        self.path = _upload_path(upload_id, 'lock')
+
+    def __enter__(self):
+        try:
+            self.file = open(self.path, 'a')
+        except FileNotFoundError:
+            raise UploadError('Unknown upload', 404)
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+def _remove_expired_uploads():
+    if not os.path.isdir(UPLOAD_DIR):
+        return
+    cutoff = time.time() - UPLOAD_EXPIRY_SECONDS
+    for upload_id in os.listdir(UPLOAD_DIR):
+        state_path = os.path.join(UPLOAD_DIR, upload_id, 'state.json')
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+        # A processing upload is finished (or restarted) by get_upload
+        if state['status'] == 'processing' or state['updated_at'] >= cutoff:
+            continue
+        logger.info(f"Removing expired {state['status']} upload {upload_id}")
+        if state.get('path'):
+            clear_workbook_cache(state['path'])
+        shutil.rmtree(os.path.join(UPLOAD_DIR, upload_id), ignore_errors=True)
+
+
+def create_upload(filename, size, max_size):
+    """Start a chunked upload of size bytes and return its state."""
+    filename = secure_filename(filename or '')
+    if not filename:
+        raise UploadError('Missing file name')
+    if size <= 0:
+        raise UploadError('File is empty')
+    if size > max_size:
+        raise UploadError(
+            f'File too large. Maximum size is {max_size // (1024 * 1024)}MB.',
+            413)
+
+    _remove_expired_uploads()
+    upload_id = uuid.uuid4().hex
+    os.makedirs(os.path.join(UPLOAD_DIR, upload_id))
+    open(_upload_path(upload_id, 'data.part'), 'wb').close()
+    state = {
+        'id': upload_id,
+        'filename': filename,
+        'size': size,
+        'offset': 0,
+        'crc32': 0,
+        'status': 'uploading',
+        'chunk_size': UPLOAD_CHUNK_BYTES,
+        'created_at': time.time(),
+    }
+    _write_state(state)
+    logger.info(f"Started upload {upload_id} of {filename} ({size} bytes)")
+    return state
+
+
+def _parse_checksum(checksum):
+    """Return the expected digest of an 'Upload-Checksum: sha256 <base64>' header."""
+    algorithm, _, expected = checksum.partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise UploadError(f'Unsupported checksum algorithm {algorithm}')
+    try:
+        return base64.b64decode(expected.strip(), validate=True)
+    except ValueError:
+        raise UploadError('Malformed checksum')
+
+
+def append_chunk(upload_id, offset, stream, length, checksum=None):
+    """
+    Write one chunk read from stream at offset and return the new state.
+    A chunk for the wrong offset is rejected with the current offset so
+    the client can resume from there. The file is finished once the last
+    byte arrives and is then parsed in the background.
+    """
+    if length is None or length <= 0:
+        raise UploadError('Empty chunk')
+    if length > UPLOAD_CHUNK_BYTES:
+        raise UploadError(
+            f'Chunk larger than {UPLOAD_CHUNK_BYTES} bytes', 413)
+    expected_digest = _parse_checksum(checksum) if checksum else None
+
+    with _StateLock(upload_id):
+        state = _read_state(upload_id)
+        if state['status'] != 'uploading':
+            raise UploadError('Upload already finished', 409, state['offset'])
+        if offset != state['offset']:
+            raise UploadError('Offset does not match', 409, state['offset'])
+        if offset + length > state['size']:
+            raise UploadError('Chunk goes past the declared size')
+
+        part_path = _upload_path(upload_id, 'data.part')
+        crc = state['crc32']
+        digest = hashlib.sha256() if expected_digest is not None else None
+        written = 0
+        with open(part_path, 'r+b') as f:
+            f.seek(offset)
+            while written < length:
+                data = stream.read(min(_COPY_BUFFER, length - written))
+                if not data:
+                    break
+                f.write(data)
+                crc = zlib.crc32(data, crc)
+                if digest is not None:
+                    digest.update(data)
+                written += len(data)
+            # A rejected chunk leaves the file at the last accepted offset
+            if written != length:
+                f.truncate(offset)
+                raise UploadError('Chunk ended early', 400, offset)
+            if digest is not None and digest.digest() != expected_digest:
+                f.truncate(offset)
+                raise UploadError('Chunk checksum mismatch', 460, offset)
+            f.truncate(offset + written)
+
+        state['offset'] = offset + written
+        state['crc32'] = crc
+        if state['offset'] == state['size']:
+            final_path = _upload_path(upload_id, state['filename'])
+            os.replace(part_path, final_path)
+            state['path'] = final_path
+            state['status'] = 'processing'
+            state['pid'] = os.getpid()
+            _write_state(state)
+            logger.info(
+                f"Upload {upload_id} complete, crc32 {crc:08x}; parsing in the background"
+            )
+            _get_executor('upload', UPLOAD_WORKERS).submit(
+                _prepare_upload, upload_id)
+        else:
+            _write_state(state)
+        return state
+
+
+def _prepare_upload(upload_id):
+    """
+    Validate the finished file, pick its first sheet with data and store
+    that sheet's columnar copy, so the wizard's later steps (profiling
+    included) do not parse the file again. The other sheets are converted
+    after the upload is ready.
+    """
+    state = _read_state(upload_id)
+    path = state['path']
+    try:
+        sheet_names = get_sheet_names(path)
+        first_error = None
+        for sheet_name in sheet_names:
+            try:
+                validate_excel_file(path, sheet_name)
+                break
+            except Exception as e:
+                first_error = first_error or e
+        else:
+            raise first_error or Exception("Excel file has no sheets")
+        convert_workbook(path, [sheet_name])
+        columns = get_excel_columns(path, sheet_name)
+        updates = {'status': 'ready', 'sheet_names': sheet_names,
+                   'sheet_name': sheet_name, 'columns': columns}
+    except Exception as e:
+        logger.error(f"Upload {upload_id} could not be processed: {str(e)}")
+        updates = {'status': 'invalid', 'error': str(e)}
+
+    with _StateLock(upload_id):
+        state = _read_state(upload_id)
+        state.update(updates)
+        _write_state(state)
+
+    if updates['status'] == 'ready':
+        convert_workbook(path, [name for name in updates['sheet_names']
+                                if name != updates['sheet_name']])
+
+
+def get_upload(upload_id):
+    """
+    Return the state of an upload. Processing left unfinished by a worker
+    process that has since died is restarted here.
+    """
+    state = _read_state(upload_id)
+    if state['status'] == 'processing' and not _process_alive(state['pid']):
+        with _StateLock(upload_id):
+            state = _read_state(upload_id)
+            if state['status'] == 'processing' and not _process_alive(
+                    state['pid']):
+                state['pid'] = os.getpid()
+                _write_state(state)
+                _get_executor('upload', UPLOAD_WORKERS).submit(
+                _prepare_upload, upload_id)
+    state['checksum'] = f"{state['crc32']:08x}"
+    return state
+
@@ -0,0 +1,259 @@
+import os
+import re
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import mysql.connector  # noqa: E402
+import db_operations  # noqa: E402
+import excel_operations  # noqa: E402
+
+DB_CONFIG = {
+    'host': 'db.test',
+    'port': 3306,
+    'user': 'excel_user',
+    'password': 'secret',
+    'database': 'excel_sync_db'
+}
+
+# Excel header -> column of the fake 'items' table
+MAPPING = {'ID': 'id', 'Name': 'name', 'Qty': 'qty'}
+
+
+class FakeDatabase:
+    """
+    Stands in for the MySQL server: answers the schema queries and keeps
+    the committed rows of every table as tuples in insert column order.
+    INSERT ... ON DUPLICATE KEY UPDATE replaces the row with the same key.
+    Values in fail_values make a statement fail the way the server
+    refuses a bad value; transient_errors is a list of error numbers the
+    next INSERTs fail with before anything else is checked.
+    """
+
+    def __init__(self):
+        # (table, column, type, key, nullable, extra, key position)
+        self.schema = [
+            ('items', 'id', 'int', 'PRI', 'NO', '', 1),
+            ('items', 'name', 'varchar(10)', '', 'YES', '', None),
+            ('items', 'qty', 'int', '', 'YES', '', None),
+        ]
+        self.tables = {'items': []}
+        # Positions of the key columns of the tables that have one
+        self.keys = {'items': [0], db_operations.FINGERPRINT_TABLE: [0, 1]}
+        self.statements = []
+        self.fail_values = set()
+        self.transient_errors = []
+        self.connections = 0
+        # Contents of the files sent with LOAD DATA LOCAL INFILE, and how
+        # many of their lines the server should report as skipped
+        self.loaded_files = []
+        self.load_skips = 0
+        self.lock = threading.Lock()
+
+    @property
+    def rows(self):
+        return self.tables['items']
+
+    def write(self, table, rows, upsert):
+        with self.lock:
+            stored = self.tables.setdefault(table, [])
+            key = self.keys.get(table)
+            for row in rows:
+                if upsert and key:
+                    stored[:] = [old for old in stored if [old[i] for i in key]
+                                 != [row[i] for i in key]]
+                stored.append(row)
+
+
+class FakeCursor:
+
+    def __init__(self, database, connection):
+        self.database = database
+        self.connection = connection
+        self.results = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        database = self.database
+        database.statements.append(sql)
+        self.results = []
+        tables = re.findall(r'`(\w+)`', sql)
+        if 'INFORMATION_SCHEMA.COLUMNS' in sql:
+            self.results = list(database.schema)
+        elif 'TABLE_ROWS' in sql:
+            self.results = [(len(database.rows), )]
+        elif sql.startswith('SELECT `id` FROM'):
+            self.results = [(row[0], ) for row in database.rows
+                            if params is None or row[0] in params]
+        elif sql.startswith('SELECT 1 FROM'):
+            self.results = [(1, )] if database.tables.get(tables[0]) else []
+        elif sql.startswith('SELECT `row_key`, `fingerprint`'):
+            wanted = set(params[1:])
+            self.results = [
+                (key, fingerprint) for table, key, fingerprint in
+                database.tables.get(tables[2], [])
+                if table == params[0] and key in wanted
+            ]
+        elif sql.startswith('CREATE TEMPORARY TABLE'):
+            database.tables[tables[0]] = []
+        elif sql.startswith('CREATE TABLE IF NOT EXISTS'):
+            database.tables.setdefault(tables[0], [])
+        elif sql.startswith('DROP TEMPORARY TABLE'):
+            database.tables.pop(tables[0], None)
+        elif sql.startswith('DELETE FROM'):
+            if tables[0] not in database.tables:
+                raise mysql.connector.Error(msg="Table doesn't exist",
+                                            errno=1146)
+            stored = database.tables[tables[0]]
+            stored[:] = [row for row in stored if row[0] != params[0]]
+        elif sql.startswith('SELECT COUNT(*), COUNT(DISTINCT'):
+            # Staging merge statistics: staged rows, new keys, NULL keys
+            staging, target = re.search(
+                r'FROM `(\w+)` s LEFT JOIN `(\w+)`', sql).groups()
+            staged = database.tables[staging]
+            existing = {row[0] for row in database.tables[target]}
+            self.results = [(len(staged),
+                             len({row[0] for row in staged
+                                  if row[0] is not None
+                                  and row[0] not in existing}),
+                             sum(row[0] is None for row in staged))]
+        elif sql.startswith('INSERT INTO') and ' SELECT ' in sql:
+            # Staging merge: upsert the staged rows in order
+            source = sql.split(' FROM `')[1].split('`')[0]
+            self.connection.pending.append(
+                (tables[0], list(database.tables[source]), True))
+        elif sql.startswith('INSERT INTO'):
+            if database.transient_errors:
+                errno = database.transient_errors.pop(0)
+                raise mysql.connector.Error(msg='Deadlock found', errno=errno)
+            width = re.search(r'VALUES \(([^)]*)\)', sql).group(1).count('%s')
+            rows = [tuple(params[i:i + width])
+                    for i in range(0, len(params), width)]
+            for row in rows:
+                for value in row:
+                    if value in database.fail_values:
+                        raise mysql.connector.Error(
+                            msg=f"Incorrect value: '{value}'", errno=1366)
+            self.connection.pending.append(
+                (tables[0], rows, 'ON DUPLICATE KEY UPDATE' in sql))
+            self.rowcount = len(rows)
+        elif sql.startswith('LOAD DATA'):
+            with open(params[0], encoding='utf-8') as f:
+                text = f.read()
+            database.loaded_files.append(text)
+            rows = [tuple(None if value == '\\N' else value
+                          for value in line.split('\t'))
+                    for line in text.splitlines()]
+            rows = rows[:len(rows) - database.load_skips]
+            replace = ' REPLACE ' in sql
+            # REPLACE reports a replaced row twice: deleted, then inserted
+            keys = {row[0] for row in database.tables[tables[0]]}
+            replaced = 0
+            for row in rows:
+                replaced += replace and row[0] in keys
+                keys.add(row[0])
+            self.connection.pending.append((tables[0], rows, replace))
+            self.rowcount = len(rows) + replaced
+        elif sql.startswith('SHOW WARNINGS') and database.load_skips:
+            self.results = [('Warning', 1366, 'Incorrect integer value')]
+
+    def executemany(self, sql, params):
+        self.database.statements.append(sql)
+
+    def fetchone(self):
+        return self.results[0] if self.results else None
+
+    def fetchall(self):
+        results, self.results = self.results, []
+        return results
+
+    def fetchmany(self, size):
+        results, self.results = self.results[:size], self.results[size:]
+        return results
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self, database):
+        self.database = database
+        self.pending = []
+        self.closed = False
+        database.connections += 1
+
+    @property
+    def in_transaction(self):
+        return bool(self.pending)
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.database, self)
+
+    def commit(self):
+        for table, rows, upsert in self.pending:
+            self.database.write(table, rows, upsert)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_db(monkeypatch, tmp_path):
+    """A FakeDatabase behind get_connection, with fresh pools and caches."""
+    database = FakeDatabase()
+    monkeypatch.setattr(db_operations, 'get_connection',
+                        lambda db_config: FakeConnection(database))
+    monkeypatch.setattr(db_operations, '_pools', {})
+    monkeypatch.setattr(db_operations, 'DB_POOL_TIMEOUT', 1)
+    monkeypatch.setattr(db_operations, 'WRITE_RETRY_DELAY', 0)
+    monkeypatch.setattr(db_operations, 'REJECT_DIR', str(tmp_path / 'rejects'))
+    db_operations.invalidate_schema_cache()
+    yield database
+    db_operations.invalidate_schema_cache()
+
+
+@pytest.fixture
+def write_workbook(tmp_path):
+    """Write rows (header first) to an .xlsx file and return its path."""
+    from openpyxl import Workbook
+
+    def write(rows, name='sheet.xlsx'):
+        workbook = Workbook()
+        for row in rows:
+            workbook.active.append(row)
+        path = str(tmp_path / name)
+        workbook.save(path)
+        excel_operations.clear_workbook_cache(path)
+        return path
+
+    return write
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """A Flask test client connected to DB_CONFIG, with sessions and
+    uploads kept under tmp_path."""
+    import app as app_module
+    import session_operations
+    import upload_operations
+
+    monkeypatch.setattr(
+        app_module.app.session_interface, 'store',
+        session_operations.FileSessionStore(str(tmp_path / 'sessions')))
+    monkeypatch.setattr(upload_operations, 'UPLOAD_DIR',
+                        str(tmp_path / 'uploads'))
+    with app_module.app.test_client() as client:
+        with client.session_transaction() as session:
+            session['db_config'] = dict(DB_CONFIG)
+        yield client
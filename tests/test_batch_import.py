@@ -0,0 +1,71 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import batch_import
+from conftest import DB_CONFIG, MAPPING
+
+
+@pytest.fixture
+def run(monkeypatch, tmp_path, fake_db):
+    """Run the CLI with a spec for the fake 'items' table; files are synced
+    by threads so that they reach the fake database."""
+    monkeypatch.setattr(batch_import, 'ProcessPoolExecutor',
+                        ThreadPoolExecutor)
+    monkeypatch.setattr(batch_import, '_init_worker', lambda *args: None)
+
+    def run(paths, sheets=None, extra=()):
+        spec = {
+            'connection': {k: DB_CONFIG[k] for k in ('host', 'user',
+                                                     'database')},
+            'sheets': sheets if sheets is not None else [
+                {'table': 'items', 'primary_key': 'id', 'columns': MAPPING}
+            ],
+        }
+        spec_path = tmp_path / 'spec.json'
+        spec_path.write_text(json.dumps(spec))
+        return batch_import.main(['--spec', str(spec_path), *extra, *paths])
+
+    return run
+
+
+def test_all_rows_written_exits_0(run, write_workbook, fake_db):
+    path = write_workbook([['ID', 'Name', 'Qty'], [1, 'a', 1], [2, 'b', 2]])
+
+    assert run([path]) == batch_import.EXIT_OK
+    assert sorted(fake_db.rows) == [(1, 'a', 1), (2, 'b', 2)]
+
+
+def test_rejected_rows_exit_1(run, write_workbook, fake_db):
+    path = write_workbook([['ID', 'Name', 'Qty'], [1, 'a', 1], [2, 'bad', 2]])
+    fake_db.fail_values = {'bad'}
+
+    assert run([path]) == batch_import.EXIT_ROW_ERRORS
+    assert fake_db.rows == [(1, 'a', 1)]
+
+
+def test_file_that_cannot_be_synced_exits_3(run, write_workbook, tmp_path):
+    good = write_workbook([['ID', 'Name', 'Qty'], [1, 'a', 1]], 'good.xlsx')
+    bad = tmp_path / 'bad.xlsx'
+    bad.write_bytes(b'not a workbook')
+
+    assert run([good, str(bad)]) == batch_import.EXIT_FILE_FAILED
+
+
+@pytest.mark.parametrize('sheets, extra', [
+    ([], ()),
+    ([{'table': 'items'}], ()),
+    (None, ('--connections', '1')),
+    (None, ('--workers', '0')),
+])
+def test_unusable_spec_or_arguments_exit_2(run, write_workbook, sheets, extra,
+                                           capsys):
+    path = write_workbook([['ID', 'Name', 'Qty'], [1, 'a', 1]])
+
+    assert run([path], sheets, extra) == batch_import.EXIT_USAGE
+    assert capsys.readouterr().err.startswith('error: ')
+
+
+def test_no_workbooks_found_exits_2(run, tmp_path):
+    assert run([str(tmp_path / 'missing.xlsx')]) == batch_import.EXIT_USAGE
@@ -0,0 +1,62 @@
+import db_operations
+from conftest import DB_CONFIG
+
+
+def _result():
+    return {'inserted': 0, 'updated': 0, 'errors': 0, 'error_codes': {},
+            'error_messages': []}
+
+
+def _write(fake_db, rows, **kwargs):
+    conn = db_operations.get_pooled_connection(DB_CONFIG)
+    cursor = conn.cursor()
+    result = _result()
+    rejects = db_operations._RejectFile('items')
+    try:
+        failed = db_operations._write_chunk(conn, cursor, 'items',
+                                            ['id', 'name'], rows, None,
+                                            False, result, 0,
+                                            rejects=rejects, **kwargs)
+    finally:
+        rejects.close()
+        conn.close()
+    return failed, result, rejects
+
+
+def test_write_chunk_bisects_to_the_bad_rows(fake_db):
+    rows = [(i, f"n{i}") for i in range(10)]
+    fake_db.fail_values = {'n3', 'n7'}
+    failed, result, rejects = _write(fake_db, rows)
+
+    assert failed == [3, 7]
+    assert sorted(fake_db.rows) == [row for row in rows
+                                    if row[1] not in ('n3', 'n7')]
+    assert result['inserted'] == 8
+    assert result['errors'] == 2
+    assert result['error_codes'] == {'1366': 2}
+    with open(rejects.path) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == 'row,error_code,error,id,name'
+    assert [line.split(',')[0] for line in lines[1:]] == ['4', '8']
+
+
+def test_write_chunk_retries_deadlocks_without_bisecting(fake_db):
+    rows = [(i, f"n{i}") for i in range(4)]
+    fake_db.transient_errors = [1213, 1205]
+    failed, result, _ = _write(fake_db, rows)
+
+    assert failed == []
+    assert result['inserted'] == 4 and result['errors'] == 0
+    inserts = [s for s in fake_db.statements if s.startswith('INSERT')]
+    # Two failed attempts of the whole batch, then one that succeeds
+    assert len(inserts) == 3
+
+
+def test_write_chunk_rejects_the_batch_after_the_last_retry(fake_db):
+    rows = [(i, f"n{i}") for i in range(4)]
+    fake_db.transient_errors = [1213] * (db_operations.WRITE_RETRIES + 1)
+    failed, result, _ = _write(fake_db, rows)
+
+    assert failed == [0, 1, 2, 3]
+    assert result['error_codes'] == {'1213': 4}
+    assert fake_db.rows == []
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import db_operations
+from conftest import DB_CONFIG, MAPPING
+
+
+def test_tsv_value_escapes_like_load_data_expects():
+    assert db_operations._tsv_value(None) == '\\N'
+    assert db_operations._tsv_value('a\tb') == 'a\\tb'
+    assert db_operations._tsv_value('line\nbreak\r') == 'line\\nbreak\\r'
+    assert db_operations._tsv_value('back\\slash') == 'back\\\\slash'
+    assert db_operations._tsv_value('nul\0') == 'nul\\0'
+    assert db_operations._tsv_value('\\N') == '\\\\N'
+    assert db_operations._tsv_value(True) == '1'
+    assert db_operations._tsv_value(False) == '0'
+    assert db_operations._tsv_value(0.1) == '0.1'
+    assert db_operations._tsv_value(datetime(2025, 3, 5, 10, 30)) == \
+        '2025-03-05 10:30:00'
+
+
+def test_bulk_load_sends_one_escaped_line_per_row(fake_db, write_workbook):
+    path = write_workbook([('ID', 'Name', 'Qty'), (1, 'tab\there', 1),
+                           (2, None, 2)])
+    result = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING,
+                                        bulk_load=True)
+
+    assert fake_db.loaded_files == ['1\ttab\\there\t1\n2\t\\N\t2\n']
+    assert result['inserted'] == 2 and result['errors'] == 0
+
+
+def test_bulk_load_counts_the_rows_the_server_skipped(fake_db,
+                                                      write_workbook):
+    fake_db.load_skips = 1
+    path = write_workbook([('ID', 'Name', 'Qty'), (1, 'a', 1), (2, 'b', 2)])
+    result = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING,
+                                        bulk_load=True)
+
+    assert result['inserted'] == 1
+    assert result['error_codes'] == {'1366': 1}
@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+
+import db_operations
+from conftest import DB_CONFIG, MAPPING
+
+
+def test_collapse_duplicates_keeps_one_row_per_key_in_a_chunk():
+    df = pd.DataFrame({'id': [1, 2, 1, None, None]})
+
+    last = db_operations._collapse_duplicates(df, ['id'], 'last')
+    first = db_operations._collapse_duplicates(df, ['id'], 'first')
+
+    assert list(last) == [False, True, True, True, True]
+    assert list(first) == [True, True, False, True, True]
+
+
+def test_collapse_duplicates_remembers_first_keys_across_chunks():
+    seen = set()
+    first = pd.DataFrame({'id': [1, 2, 1]})
+    second = pd.DataFrame({'id': [2, 3, None]})
+
+    keep_first = db_operations._collapse_duplicates(first, ['id'], 'first',
+                                                    seen)
+    keep_second = db_operations._collapse_duplicates(second, ['id'], 'first',
+                                                     seen)
+
+    assert list(keep_first) == [True, True, False]
+    assert list(keep_second) == [False, True, True]
+    assert seen == {(1, ), (2, ), (3, )}
+
+
+@pytest.mark.parametrize('policy, written, duplicates, updated', [
+    ('last', [(1, 'f', 6), (2, 'e', 5), (3, 'd', 4)], 0, 2),
+    ('first', [(1, 'a', 1), (2, 'e', 5), (3, 'd', 4)], 2, 0),
+])
+def test_sync_collapses_keys_repeated_across_batches(
+        fake_db, write_workbook, policy, written, duplicates, updated):
+    path = write_workbook([('ID', 'Name', 'Qty'), (1, 'a', 1), (2, 'b', 'x'),
+                           (1, 'c', 3), (3, 'd', 4), (2, 'e', 5),
+                           (1, 'f', 6)])
+    result = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING,
+                                        batch_size=2, duplicates=policy)
+
+    assert sorted(fake_db.rows) == written
+    # Last-wins counts a key written again by a later chunk as an update
+    assert result['duplicates'] == duplicates
+    assert (result['inserted'], result['updated']) == (3, updated)
+    # (2, 'b', 'x') is rejected and does not count as the key's row
+    assert result['errors'] == 1
+
+
+@pytest.mark.parametrize('batch_size', [1, 10])
+def test_invalid_last_row_leaves_the_valid_earlier_row(
+        fake_db, write_workbook, batch_size):
+    path = write_workbook([('ID', 'Name', 'Qty'), (1, 'a', 1), (1, 'b', 'x')])
+    result = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING,
+                                        batch_size=batch_size)
+
+    assert fake_db.rows == [(1, 'a', 1)]
+    assert result['errors'] == 1 and result['duplicates'] == 0
+
+
+def test_last_wins_reads_the_sheet_once(fake_db, write_workbook,
+                                        monkeypatch):
+    reads = []
+    iter_chunks = db_operations.iter_workbook_chunks
+
+    def counted(*args, **kwargs):
+        reads.append(args[0])
+        return iter_chunks(*args, **kwargs)
+
+    monkeypatch.setattr(db_operations, 'iter_workbook_chunks', counted)
+    path = write_workbook([('ID', 'Name', 'Qty'), (1, 'a', 1), (1, 'b', 2)])
+    db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING)
+
+    assert reads == [path]
+
+
+def test_bulk_load_replaces_keys_repeated_in_later_chunks(
+        fake_db, write_workbook, monkeypatch):
+    monkeypatch.setattr(db_operations, 'BULK_LOAD_CHUNK_SIZE', 2)
+    path = write_workbook([('ID', 'Name', 'Qty'), (1, 'a', 1), (2, 'b', 2),
+                           (1, 'c', 3)])
+    result = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING,
+                                        bulk_load=True)
+
+    assert sorted(fake_db.rows) == [('1', 'c', '3'), ('2', 'b', '2')]
+    assert (result['inserted'], result['updated']) == (2, 1)
+    assert result['errors'] == 0
@@ -0,0 +1,37 @@
+import db_operations
+from conftest import DB_CONFIG, MAPPING
+
+SHEET_A = [('ID', 'Name', 'Qty'), (1, 'a', 1), (2, 'b', 2), (3, 'c', 3)]
+SHEET_B = [('ID', 'Name', 'Qty'), (1, 'x', 9), (2, 'y', 9), (3, 'z', 9)]
+
+
+def _sync(path, **options):
+    return db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING,
+                                      'id', **options)
+
+
+def test_incremental_sync_skips_unchanged_rows(fake_db, write_workbook):
+    first = _sync(write_workbook(SHEET_A), incremental=True)
+    changed = SHEET_A[:2] + [(2, 'b', 5), (3, 'c', 3)]
+    second = _sync(write_workbook(changed, 'changed.xlsx'), incremental=True)
+
+    assert (first['inserted'], first['unchanged']) == (3, 0)
+    assert (second['updated'], second['unchanged']) == (1, 2)
+    assert sorted(fake_db.rows) == [(1, 'a', 1), (2, 'b', 5), (3, 'c', 3)]
+
+
+def test_full_sync_forgets_the_stored_fingerprints(fake_db, write_workbook):
+    sheet_a = write_workbook(SHEET_A)
+    _sync(sheet_a, incremental=True)
+    _sync(write_workbook(SHEET_B, 'b.xlsx'))
+    again = _sync(sheet_a, incremental=True)
+
+    assert again['unchanged'] == 0
+    assert sorted(fake_db.rows) == sorted(SHEET_A[1:])
+
+
+def test_full_sync_without_fingerprint_table(fake_db, write_workbook):
+    result = _sync(write_workbook(SHEET_A))
+
+    assert result['inserted'] == 3
+    assert db_operations.FINGERPRINT_TABLE not in fake_db.tables
@@ -0,0 +1,47 @@
+import numpy as np
+
+import db_operations
+from conftest import FakeConnection
+
+
+def test_as_int_key_accepts_only_integer_values():
+    assert db_operations._as_int_key(7) == 7
+    assert db_operations._as_int_key(7.0) == 7
+    assert db_operations._as_int_key(' 42 ') == 42
+    assert db_operations._as_int_key('-3') == -3
+    assert db_operations._as_int_key(7.5) is None
+    assert db_operations._as_int_key('A-7') is None
+    assert db_operations._as_int_key(True) is None
+    assert db_operations._as_int_key(2**63) is None
+
+
+def test_key_index_matches_keys_of_any_integer_form():
+    index = db_operations._KeyIndex(np.array([5, 1, 3], dtype=np.int64))
+
+    assert index.existing([1, 2.0, '3', 4, 'x', 3.5]) == {1, '3'}
+    index.add([2])
+    assert index.existing([2, 6]) == {2}
+    assert len(index) == 4
+
+
+def test_key_index_scans_integer_keys(fake_db):
+    fake_db.rows.extend([(1, 'a', 1), (2, 'b', 2)])
+    cursor = FakeConnection(fake_db).cursor()
+    index = db_operations._build_key_index(cursor, 'items', 'id', 'int')
+
+    assert index.mode == 'scan'
+    assert index.existing([1, 3]) == {1}
+
+
+def test_key_index_falls_back_to_lookups(fake_db, monkeypatch):
+    fake_db.rows.extend([(1, 'a', 1), (2, 'b', 2)])
+    cursor = FakeConnection(fake_db).cursor()
+
+    text_key = db_operations._build_key_index(cursor, 'items', 'id',
+                                              'varchar(10)')
+    monkeypatch.setattr(db_operations, 'KEY_SCAN_MAX_ROWS', 1)
+    too_many = db_operations._build_key_index(cursor, 'items', 'id', 'int')
+
+    for index in (text_key, too_many):
+        assert index.mode == 'lookup'
+        assert index.existing([2, 3]) == {2}
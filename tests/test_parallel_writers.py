@@ -0,0 +1,72 @@
+import logging
+import threading
+
+import db_operations
+from conftest import DB_CONFIG, MAPPING
+
+
+def _rows(start, count):
+    return [('ID', 'Name', 'Qty')] + [(i, f"n{i}", i)
+                                      for i in range(start, start + count)]
+
+
+def test_max_sync_writers_leaves_each_sync_its_own_connection(monkeypatch):
+    monkeypatch.setattr(db_operations, 'DB_POOL_SIZE', 10)
+    monkeypatch.setattr(db_operations, 'SYNC_WORKERS', 2)
+    assert db_operations.max_sync_writers() == 4
+
+    monkeypatch.setattr(db_operations, 'DB_POOL_SIZE', 2)
+    assert db_operations.max_sync_writers() == 1
+
+
+def test_sync_reports_writers_it_could_not_get(fake_db, write_workbook,
+                                               monkeypatch, caplog):
+    monkeypatch.setattr(db_operations, 'DB_POOL_SIZE', 5)
+    monkeypatch.setattr(db_operations, 'SYNC_WORKERS', 2)
+    path = write_workbook(_rows(0, 50))
+
+    with caplog.at_level(logging.WARNING, logger='db_operations'):
+        result = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING,
+                                            batch_size=10, concurrency=4)
+
+    assert result['writers'] == {'requested': 4, 'effective': 1}
+    assert 'got 1 of 4 requested writer' in caplog.text
+    assert result['inserted'] == 50
+
+
+def test_sync_gets_every_writer_within_its_share(fake_db, write_workbook):
+    path = write_workbook(_rows(0, 50))
+    result = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING,
+                                        batch_size=10, concurrency=4)
+
+    assert result['writers'] == {'requested': 4, 'effective': 4}
+    assert sorted(row[0] for row in fake_db.rows) == list(range(50))
+
+
+def test_concurrent_syncs_share_the_pool(fake_db, write_workbook,
+                                         monkeypatch):
+    monkeypatch.setattr(db_operations, 'DB_POOL_SIZE', 5)
+    monkeypatch.setattr(db_operations, 'SYNC_WORKERS', 2)
+    paths = [write_workbook(_rows(start, 200), f"part{start}.xlsx")
+             for start in (0, 1000)]
+    results, errors = [], []
+
+    def sync(path):
+        try:
+            results.append(db_operations.perform_sync(
+                DB_CONFIG, path, 'items', MAPPING, batch_size=10,
+                concurrency=4))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=sync, args=(path, )) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(r['inserted'] for r in results) == [200, 200]
+    assert fake_db.connections <= 5
+    assert sorted(row[0] for row in fake_db.rows) == \
+        list(range(200)) + list(range(1000, 1200))
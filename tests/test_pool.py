@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+import db_operations
+from conftest import DB_CONFIG
+
+
+def test_pool_reuses_released_connections(fake_db):
+    conn = db_operations.get_pooled_connection(DB_CONFIG)
+    conn.close()
+    conn = db_operations.get_pooled_connection(DB_CONFIG)
+    conn.close()
+    assert fake_db.connections == 1
+
+
+def test_pool_times_out_when_exhausted(fake_db, monkeypatch):
+    monkeypatch.setattr(db_operations, 'DB_POOL_SIZE', 1)
+    monkeypatch.setattr(db_operations, 'DB_POOL_TIMEOUT', 0.1)
+    held = db_operations.get_pooled_connection(DB_CONFIG)
+    with pytest.raises(Exception, match='Timed out'):
+        db_operations.get_pooled_connection(DB_CONFIG)
+    held.close()
+
+
+def test_pool_without_block_returns_none_when_exhausted(fake_db, monkeypatch):
+    monkeypatch.setattr(db_operations, 'DB_POOL_SIZE', 2)
+    held = db_operations._borrow_free_connections(DB_CONFIG, 5)
+    assert len(held) == 2
+    assert db_operations.get_pooled_connection(DB_CONFIG, block=False) is None
+    for conn in held:
+        conn.close()
+    conn = db_operations.get_pooled_connection(DB_CONFIG, block=False)
+    assert conn is not None
+    conn.close()
+
+
+def test_pool_hands_a_released_connection_to_a_waiter(fake_db, monkeypatch):
+    monkeypatch.setattr(db_operations, 'DB_POOL_SIZE', 1)
+    held = db_operations.get_pooled_connection(DB_CONFIG)
+    timer = threading.Timer(0.05, held.close)
+    timer.start()
+    conn = db_operations.get_pooled_connection(DB_CONFIG)
+    conn.close()
+    timer.join()
+    assert fake_db.connections == 1
+
+
+def test_pool_replaces_a_stale_idle_connection(fake_db, monkeypatch):
+    monkeypatch.setattr(db_operations, 'DB_POOL_HEALTH_CHECK_AFTER', -1)
+    conn = db_operations.get_pooled_connection(DB_CONFIG)
+
+    def ping(reconnect=False):
+        raise Exception('MySQL server has gone away')
+
+    conn._connection.ping = ping
+    conn.close()
+    conn = db_operations.get_pooled_connection(DB_CONFIG)
+    conn.close()
+    assert fake_db.connections == 2
+
+
+def test_pool_rolls_back_a_connection_returned_mid_transaction(fake_db):
+    conn = db_operations.get_pooled_connection(DB_CONFIG)
+    conn.cursor().execute('INSERT INTO `items` (`id`) VALUES (%s)', [1])
+    conn.close()
+    assert fake_db.rows == []
@@ -0,0 +1,42 @@
+import excel_operations
+
+
+def _rows(count):
+    return [('Code', 'Active', 'Day')] + [
+        ('abcd' if i % 2 else 'abcdefgh', 'yes' if i % 2 else 'No',
+         '05/03/2025') for i in range(count)]
+
+
+def test_profile_pads_sampled_text_and_reads_booleans(write_workbook):
+    path = write_workbook(_rows(20))
+    exact = excel_operations.profile_columns(path)
+    sampled = excel_operations.profile_columns(path, sample_size=5)
+
+    assert exact['Code']['type'] == 'VARCHAR(8)'
+    assert exact['Code']['confidence'] == 'exact'
+    assert sampled['Code']['type'] == 'VARCHAR(16)'
+    assert sampled['Code']['confidence'] == 'estimated'
+    assert exact['Active']['type'] == 'BOOLEAN'
+    # Day and month cannot be told apart, so it stays text
+    assert exact['Day']['type'] == 'VARCHAR(10)'
+
+
+def test_sampled_profile_reads_only_the_sample(write_workbook, monkeypatch):
+    path = write_workbook(_rows(20))
+    monkeypatch.setattr(excel_operations, 'read_workbook', None)
+
+    profiles = excel_operations.profile_columns(path, sample_size=5)
+    small = excel_operations.profile_columns(path, sample_size=50)
+
+    assert profiles['Code']['confidence'] == 'estimated'
+    assert small['Code']['confidence'] == 'exact'
+
+
+def test_sampled_profile_spreads_over_a_converted_sheet(write_workbook):
+    path = write_workbook([('N', )] + [(i, ) for i in range(100)])
+    excel_operations.convert_workbook(path)
+    excel_operations._workbook_cache.clear()
+
+    profiles = excel_operations.profile_columns(path, sample_size=5)
+
+    assert (profiles['N']['min'], profiles['N']['max']) == (0, 99)
@@ -0,0 +1,75 @@
+import os
+import stat
+
+import session_operations
+from conftest import DB_CONFIG
+
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    store = session_operations.SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    store.save('a' * 64, {'excel_file': 'data.xlsx'})
+
+    assert store.load('a' * 64) == {'excel_file': 'data.xlsx'}
+    store.delete('a' * 64)
+    assert store.load('a' * 64) is None
+
+
+def test_sqlite_store_drops_expired_sessions(tmp_path, monkeypatch):
+    store = session_operations.SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    monkeypatch.setattr(session_operations, 'SESSION_LIFETIME', -1)
+    store.save('a' * 64, {'excel_file': 'data.xlsx'})
+
+    assert store.load('a' * 64) is None
+    store.remove_expired()
+    with store._connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone() == (0, )
+
+
+def test_sqlite_store_is_private_to_the_owner(tmp_path):
+    path = tmp_path / 'session_db' / 'sessions.db'
+    store = session_operations.SQLiteSessionStore(str(path))
+    store.save('a' * 64, {})
+
+    assert _mode(path.parent) == 0o700
+    assert _mode(path) == 0o600
+
+
+def test_sqlite_store_tightens_an_existing_database(tmp_path):
+    path = tmp_path / 'sessions.db'
+    path.touch(mode=0o644)
+    os.chmod(path, 0o644)
+    session_operations.SQLiteSessionStore(str(path)).save('a' * 64, {})
+
+    assert _mode(path) == 0o600
+
+
+def test_file_store_is_private_to_the_owner(tmp_path):
+    directory = tmp_path / 'sessions'
+    store = session_operations.FileSessionStore(str(directory))
+    store.save('a' * 64, {'excel_file': 'data.xlsx'})
+
+    assert store.load('a' * 64) == {'excel_file': 'data.xlsx'}
+    assert _mode(directory) == 0o700
+    assert _mode(directory / ('a' * 64)) == 0o600
+
+
+def test_password_is_not_stored_on_the_server(client, tmp_path):
+    # The client fixture already saved a session holding DB_CONFIG
+    (path, ) = (tmp_path / 'sessions').iterdir()
+    stored = path.read_bytes()
+
+    assert DB_CONFIG['password'].encode() not in stored
+    with client.session_transaction() as session:
+        assert session['db_config'] == DB_CONFIG
+
+
+def test_session_without_the_pad_cookie_must_connect_again(client):
+    client.delete_cookie('session_pad')
+
+    with client.session_transaction() as session:
+        assert 'db_config' not in session
+    assert client.get('/file_upload').status_code == 302
@@ -0,0 +1,32 @@
+import db_operations
+from conftest import DB_CONFIG, MAPPING
+
+
+def test_staging_merge_counts_new_and_existing_keys(fake_db, write_workbook):
+    fake_db.rows.append((1, 'old', 0))
+    path = write_workbook([('ID', 'Name', 'Qty'), (1, 'new', 5), (2, 'b', 2),
+                           (3, 'c', 3)])
+    result = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING,
+                                        staging_merge=True)
+
+    assert (result['inserted'], result['updated']) == (2, 1)
+    assert sorted(fake_db.rows) == [(1, 'new', 5), (2, 'b', 2), (3, 'c', 3)]
+    assert '_stg_items' not in fake_db.tables
+
+
+def test_staging_merge_counts_match_the_row_by_row_path(fake_db,
+                                                        write_workbook):
+    rows = [('ID', 'Name', 'Qty'), (1, 'a', 1), (2, 'b', 2), (2, 'c', 3)]
+
+    fake_db.rows.append((1, 'old', 0))
+    path = write_workbook(rows)
+    staged = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING,
+                                        staging_merge=True)
+    staged_rows = sorted(fake_db.rows)
+
+    fake_db.rows[:] = [(1, 'old', 0)]
+    direct = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING)
+
+    for count in ('inserted', 'updated', 'duplicates'):
+        assert staged[count] == direct[count]
+    assert staged_rows == sorted(fake_db.rows) == [(1, 'a', 1), (2, 'c', 3)]
@@ -0,0 +1,40 @@
+import pytest
+
+import db_operations
+from conftest import DB_CONFIG, MAPPING
+
+
+def _rows(count):
+    return [('ID', 'Name', 'Qty')] + [(i, f"n{i}", i) for i in range(count)]
+
+
+def test_sync_fits_in_a_single_connection(fake_db, write_workbook,
+                                          monkeypatch):
+    monkeypatch.setattr(db_operations, 'DB_POOL_SIZE', 1)
+    path = write_workbook(_rows(20))
+    result = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING,
+                                        batch_size=5, concurrency=4,
+                                        pipeline=True)
+
+    assert result['inserted'] == 20 and result['errors'] == 0
+    assert result['key_index']['mode'] == 'scan'
+
+
+def test_failed_metadata_read_fails_the_sync(fake_db, write_workbook,
+                                             monkeypatch):
+    monkeypatch.setattr(db_operations, 'DB_POOL_SIZE', 1)
+
+    def unreadable(db_config, table_name):
+        raise Exception("Error fetching columns: Lost connection")
+
+    monkeypatch.setattr(db_operations, 'get_table_columns', unreadable)
+    path = write_workbook(_rows(3))
+
+    with pytest.raises(Exception, match='Lost connection'):
+        db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING)
+
+    assert fake_db.rows == []
+    # The failed sync left the only pooled connection free
+    conn = db_operations.get_pooled_connection(DB_CONFIG, block=False)
+    assert conn is not None
+    conn.close()
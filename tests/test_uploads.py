@@ -0,0 +1,81 @@
+import base64
+import hashlib
+import json
+import os
+import time
+
+import upload_operations
+
+
+def _start(client, size=8):
+    response = client.post('/uploads', json={'filename': 'data.xlsx',
+                                             'size': size})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def _send(client, upload_id, offset, data, checksum=None):
+    headers = {'Upload-Offset': str(offset)}
+    if checksum is not None:
+        headers['Upload-Checksum'] = checksum
+    return client.patch(f'/uploads/{upload_id}', data=data, headers=headers)
+
+
+def _sha256(data):
+    return 'sha256 ' + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def test_create_upload_answers_201(client):
+    response = client.post('/uploads', json={'filename': 'data.xlsx',
+                                             'size': 8})
+
+    assert response.status_code == 201
+    upload = response.get_json()
+    assert (upload['status'], upload['offset']) == ('uploading', 0)
+
+
+def test_chunk_at_wrong_offset_answers_409_with_current_offset(client):
+    upload_id = _start(client)
+    assert _send(client, upload_id, 0, b'abcd').status_code == 200
+
+    response = _send(client, upload_id, 2, b'cdef')
+
+    assert response.status_code == 409
+    assert response.get_json()['offset'] == 4
+
+
+def test_chunk_with_bad_checksum_answers_460_and_is_dropped(client):
+    upload_id = _start(client)
+
+    response = _send(client, upload_id, 0, b'abcd', _sha256(b'dcba'))
+    assert response.status_code == 460
+    assert response.get_json()['offset'] == 0
+
+    response = _send(client, upload_id, 0, b'abcd', _sha256(b'abcd'))
+    assert response.status_code == 200
+    assert response.get_json()['offset'] == 4
+
+
+def _make_upload(status, age):
+    upload_id = f"{status}{int(age)}"
+    directory = os.path.join(upload_operations.UPLOAD_DIR, upload_id)
+    os.makedirs(directory)
+    path = os.path.join(directory, 'data.xlsx')
+    for name in (path, f"{path}.arrow"):
+        open(name, 'wb').close()
+    with open(os.path.join(directory, 'state.json'), 'w') as f:
+        json.dump({'id': upload_id, 'status': status, 'path': path,
+                   'updated_at': time.time() - age}, f)
+    return directory
+
+
+def test_expired_uploads_are_removed_with_their_copies(client):
+    expiry = upload_operations.UPLOAD_EXPIRY_SECONDS
+    expired = [_make_upload(status, expiry + 60)
+               for status in ('uploading', 'ready', 'invalid')]
+    kept = [_make_upload('ready', 60), _make_upload('processing', expiry + 60)]
+
+    upload_operations._remove_expired_uploads()
+
+    assert [os.path.exists(d) for d in expired] == [False] * 3
+    assert [os.path.exists(d) for d in kept] == [True] * 2
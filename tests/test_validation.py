@@ -0,0 +1,93 @@
+import pandas as pd
+
+import db_operations
+import excel_operations
+from conftest import DB_CONFIG, MAPPING
+
+
+def _checks(*columns):
+    return {col['name']: db_operations._column_check(col) for col in columns}
+
+
+def test_validate_frame_rejects_nulls_and_out_of_range_values():
+    checks = _checks({'name': 'id', 'type': 'int', 'nullable': False},
+                     {'name': 'qty', 'type': 'tinyint unsigned',
+                      'nullable': True},
+                     {'name': 'price', 'type': 'decimal(5,2)',
+                      'nullable': True})
+    df = pd.DataFrame({'id': [1, None, 3, 4, 5],
+                       'qty': [1, 2, 256, 'x', None],
+                       'price': [1.5, 2, 3, 4, 1000]})
+    _, valid, reasons = db_operations._validate_frame(df, checks)
+
+    assert list(valid) == [True, False, False, False, False]
+    assert {pos: code for pos, (code, _) in reasons.items()} == {
+        1: '1048', 2: '1264', 3: '1366', 4: '1264'}
+
+
+def test_validate_frame_reads_one_date_format_per_column():
+    checks = _checks({'name': 'day', 'type': 'date', 'nullable': True})
+    df = pd.DataFrame({'day': ['05/03/2025', '25/03/2025', 'soon']})
+    checked, valid, reasons = db_operations._validate_frame(df, checks)
+
+    assert list(valid) == [True, True, False]
+    assert list(checked['day'][:2]) == [pd.Timestamp('2025-03-05'),
+                                        pd.Timestamp('2025-03-25')]
+    assert checks['day']['date_format'] == '%d/%m/%Y'
+
+
+def test_validate_frame_rejects_ambiguous_dates():
+    checks = _checks({'name': 'day', 'type': 'date', 'nullable': True})
+    df = pd.DataFrame({'day': ['05/03/2025', '06/03/2025']})
+    _, valid, reasons = db_operations._validate_frame(df, checks)
+
+    assert not valid.any()
+    assert 'Ambiguous' in reasons[0][1]
+
+
+def test_validate_frame_turns_yes_no_into_booleans():
+    checks = _checks({'name': 'active', 'type': 'tinyint(1)',
+                      'nullable': True})
+    df = pd.DataFrame({'active': ['Yes', 'no', 'maybe']})
+    checked, valid, _ = db_operations._validate_frame(df, checks)
+
+    assert list(valid) == [True, True, False]
+    assert list(checked['active'][:2]) == [1, 0]
+
+
+def test_parse_date_strings_settles_the_day_month_order():
+    parsed, date_format = excel_operations.parse_date_strings(
+        pd.Series(['05/03/2025', '25/03/2025']))
+    assert date_format == '%d/%m/%Y'
+    assert list(parsed) == [pd.Timestamp('2025-03-05'),
+                            pd.Timestamp('2025-03-25')]
+
+    parsed, date_format = excel_operations.parse_date_strings(
+        pd.Series(['05/03/2025', '06/03/2025']))
+    assert parsed is None and date_format is None
+
+
+def test_prepare_rows_counts_truncated_strings():
+    truncated = {}
+    rows = db_operations._prepare_rows(
+        pd.DataFrame({'name': ['short', 'much too long'], 'qty': [1.0, 2.0]}),
+        {'name': 'varchar(5)', 'qty': 'int'}, truncated)
+
+    assert rows == [('short', 1), ('much ', 2)]
+    assert truncated == {'name': 1}
+
+
+def test_sync_rejects_invalid_rows_and_reports_truncation(fake_db,
+                                                          write_workbook):
+    path = write_workbook([('ID', 'Name', 'Qty'), (1, 'a', 1),
+                           (2, 'a long name here', 2), (None, 'b', 3),
+                           (4, 'c', 'many')])
+    result = db_operations.perform_sync(DB_CONFIG, path, 'items', MAPPING)
+
+    assert sorted(fake_db.rows) == [(1, 'a', 1), (2, 'a long nam', 2)]
+    assert result['truncated'] == {'name': 1}
+    assert result['error_codes'] == {'1048': 1, '1366': 1}
+    with open(result['reject_file']) as f:
+        rejected = [line.split(',')[0] for line in f.read().splitlines()[1:]]
+    # Data rows are numbered from 1 below the header
+    assert rejected == ['3', '4']
@@ -0,0 +1,40 @@
+import app as app_module
+from conftest import MAPPING
+
+
+def _map_columns(client, **options):
+    with client.session_transaction() as session:
+        session.update({'excel_file': '/uploads/data.xlsx',
+                        'table_name': 'items',
+                        'excel_columns': list(MAPPING)})
+    form = {f'mapping_{excel}': db for excel, db in MAPPING.items()}
+    form.update(primary_key='id', **options)
+    return client.post('/column_mapping', data=form)
+
+
+def _submitted_options(client, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(
+        app_module, 'submit_sync_job',
+        lambda *args, **kwargs: submitted.append(kwargs) or 'job')
+    client.get('/sync_data')
+    return submitted[0]
+
+
+def test_pipeline_and_concurrency_reach_the_sync(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'max_sync_writers', lambda: 4)
+    _map_columns(client, pipeline='on', concurrency='20')
+
+    options = _submitted_options(client, monkeypatch)
+
+    assert options['pipeline'] is True
+    assert options['concurrency'] == 4
+
+
+def test_pipeline_is_off_unless_asked_for(client, monkeypatch):
+    _map_columns(client)
+
+    options = _submitted_options(client, monkeypatch)
+
+    assert options['pipeline'] is False
+    assert options['concurrency'] == 1
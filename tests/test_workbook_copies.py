@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+
+import excel_operations
+
+
+def _no_full_parse(*args, **kwargs):
+    raise AssertionError('pd.read_excel called')
+
+
+def test_streamed_and_converted_sheets_match(write_workbook):
+    path = write_workbook([('ID', 'Name', 'Price'), (1, 'a', 1.5),
+                           (None, None, None), (2, 'b', 2.5),
+                           (3, None, None)])
+    streamed = pd.concat(excel_operations.iter_workbook_chunks(path))
+
+    excel_operations.convert_workbook(path)
+    excel_operations._workbook_cache.clear()
+    converted = pd.concat(excel_operations.iter_workbook_chunks(path))
+    parsed = excel_operations.read_workbook(path)
+
+    assert len(streamed) == 3
+    assert streamed['ID'].dtype == 'int64'
+    pd.testing.assert_frame_equal(converted, streamed)
+    pd.testing.assert_frame_equal(parsed, streamed)
+    assert excel_operations.count_workbook_rows(path) == 3
+
+
+def test_conversion_streams_chunks_into_one_copy(write_workbook,
+                                                 monkeypatch):
+    monkeypatch.setattr(excel_operations, '_CONVERT_CHUNK_ROWS', 4)
+    monkeypatch.setattr(excel_operations.pd, 'read_excel', _no_full_parse)
+    # Qty is whole in the first chunk only, so it widens to float
+    path = write_workbook([('ID', 'Qty', 'Note')] +
+                          [(i, i if i < 4 else i + 0.5, 'x' if i > 6 else None)
+                           for i in range(10)])
+
+    assert excel_operations.convert_workbook(path) == ['Sheet']
+    assert excel_operations._cached_workbook(path, 'Sheet') is None
+    df = excel_operations.read_workbook(path, 'Sheet')
+
+    assert list(df['ID']) == list(range(10))
+    assert df['Qty'].dtype == 'float64' and df['Qty'].iloc[9] == 9.5
+    assert df['Note'].isna().sum() == 7
+    assert [name for name in os.listdir(os.path.dirname(path))
+            if name.startswith('.')] == []
+
+
+def test_mixed_type_column_falls_back_to_a_pickled_parse(write_workbook,
+                                                         monkeypatch):
+    monkeypatch.setattr(excel_operations, '_CONVERT_CHUNK_ROWS', 2)
+    path = write_workbook([('ID', 'Code'), (1, 10), (2, 11), (3, 'A-3')])
+
+    assert excel_operations.convert_workbook(path) == ['Sheet']
+    assert os.path.exists(
+        excel_operations._workbook_sidecar_path(path, 'Sheet'))
+    assert list(excel_operations.read_workbook(path, 'Sheet')['Code']) == \
+        [10, 11, 'A-3']
+
+
+def test_convert_workbook_with_no_sheets_converts_nothing(write_workbook):
+    path = write_workbook([('ID', ), (1, )])
+
+    assert excel_operations.convert_workbook(path, []) == []
+    assert not os.path.exists(excel_operations._columnar_path(path, 'Sheet'))
+